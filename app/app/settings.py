@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # from drf_spectacular.settings import SPECTACULAR_DEFAULTS
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -23,12 +25,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-yv^^%=^5tu))&ngdn2956w#qe^9uoap_om8u^zjv6l)pk5hsn9"  # noqa
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-yv^^%=^5tu))&ngdn2956w#qe^9uoap_om8u^zjv6l)pk5hsn9",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get("DEBUG", 1)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host
+    for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",")
+    if host
+]
 
 
 # Application definition
@@ -39,7 +48,10 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
+    # Serve static files with WhiteNoise under runserver too.
+    "whitenoise.runserver_nostatic",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",  # Full-text and trigram search lookups
     "core",  # Installing app: "Core"
     "rest_framework",
     "rest_framework.authtoken",  # It's another app from drf
@@ -49,7 +61,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Times everything below it (core.instrumentation).
+    "core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Static files, before anything else runs (see STATICFILES_STORAGE).
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -81,16 +97,109 @@ WSGI_APPLICATION = "app.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# Postgres with health checks and pooling (core/backends/postgresql).
+# DB_CONN_MAX_AGE: seconds a connection is kept for the next requests of
+# its thread, 0 closes it after each request. Kept connections are
+# checked on first use in a request, unless DB_CONN_HEALTH_CHECKS=0.
+# DB_POOL:
+# - "" (default): a connection per thread.
+# - "process": a pool of up to DB_POOL_MAX_SIZE connections per process,
+#   requests wait DB_POOL_TIMEOUT seconds at most for one. Needs
+#   DB_CONN_MAX_AGE=0.
+# - "pgbouncer": DB_HOST/DB_PORT is PgBouncer in transaction pooling
+#   mode. Keep connections to it (i.e: DB_CONN_MAX_AGE=600).
+DB_POOL = os.environ.get("DB_POOL", "")
+if DB_POOL not in ("", "process", "pgbouncer"):
+    raise ImproperlyConfigured(f"Unknown DB_POOL '{DB_POOL}'.")
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",  # Name of postgres engine for Django.  # noqa
+        "ENGINE": "core.backends.postgresql",  # Name of postgres engine for Django.  # noqa
         "HOST": os.environ.get("DB_HOST"),
+        "PORT": os.environ.get("DB_PORT", ""),
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": bool(
+            int(os.environ.get("DB_CONN_HEALTH_CHECKS", 1))
+        ),
+        "TRANSACTION_POOLING": DB_POOL == "pgbouncer",
+        "OPTIONS": {},
     }
 }
+if DB_POOL == "process":
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS is a comma separated list of
+# host[:port], with the primary's credentials and DB_REPLICA_NAME
+# (DB_NAME by default). Recipe, tag and ingredient lists and details
+# read from one of them, unless the user wrote in the last
+# DB_REPLICA_PIN_SECONDS (see recipe/replicas.py).
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), 1
+):
+    host, _, port = address.strip().partition(":")
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port,
+        "NAME": os.environ.get("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),  # noqa
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        # Tests read the test database through replicas.
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("DB_REPLICA_PIN_SECONDS", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local memory is per process: served by several processes (gunicorn
+# workers), the caches of core.checks.SHARED_CACHES must be shared or
+# gunicorn won't start, i.e: memcached (docker-compose-deploy.yml)
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+# CACHE_LOCATION=cache:11211, and the same for API_CACHE_*.
+LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", LOCMEM_CACHE)
+API_CACHE_BACKEND = os.environ.get("API_CACHE_BACKEND", LOCMEM_CACHE)
+
+CACHES = {
+    # Replica pins (recipe/cache.py) and recent logins
+    # (core.authentication.LoginCache).
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+        # Without it, reads are served from replicas.
+        "OPTIONS": {"ignore_exc": True} if "memcached" in CACHE_BACKEND else {},  # noqa
+    },
+    # Per-user list responses of the recipe API (recipe/cache.py).
+    # DummyCache turns response caching off.
+    "api": {
+        "BACKEND": API_CACHE_BACKEND,
+        "LOCATION": os.environ.get("API_CACHE_LOCATION", "recipe-api"),
+        "TIMEOUT": int(os.environ.get("API_CACHE_TIMEOUT", 300)),
+        # Options of memcached backends go to their client: errors (i.e:
+        # a list over its 1 MB item size) are misses, not failed requests.
+        "OPTIONS": {"ignore_exc": True}
+        if "memcached" in API_CACHE_BACKEND
+        else {
+            "MAX_ENTRIES": int(os.environ.get("API_CACHE_MAX_ENTRIES", 10000)),  # noqa
+        },
+    },
+    # Login attempts (user/throttles.py).
+    "throttle": {
+        "BACKEND": os.environ.get("THROTTLE_CACHE_BACKEND", LOCMEM_CACHE),
+        "LOCATION": os.environ.get("THROTTLE_CACHE_LOCATION", "throttle"),
+    },
+}
 
 
 # Password validation
@@ -112,6 +221,40 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# New and changed passwords are hashed with PASSWORD_HASHER: argon2
+# (default), bcrypt or pbkdf2. The others still check existing hashes,
+# which are rehashed on the next login, as are hashes with other costs
+# (see core/hashers.py). The argon2 defaults are OWASP's minimum, a few
+# times cheaper than PBKDF2's 260000 iterations and harder on GPUs.
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "argon2")
+_PASSWORD_HASHERS = {
+    "argon2": "core.hashers.Argon2PasswordHasher",
+    "bcrypt": "core.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2": "core.hashers.PBKDF2PasswordHasher",
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of {', '.join(_PASSWORD_HASHERS)}."
+    )
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher
+    for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHER
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get("PASSWORD_ARGON2_TIME_COST", 2))
+# KiB
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 19456)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get("PASSWORD_ARGON2_PARALLELISM", 1)
+)
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 260000)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -136,6 +279,29 @@ MEDIA_URL = "/static/media/"
 MEDIA_ROOT = "/vol/web/media"
 STATIC_ROOT = "/vol/web/static"
 
+# collectstatic writes gzip and brotli copies of the static files, with
+# the content hash in their names, so WhiteNoise serves them compressed
+# and cached forever. Needs collectstatic, so not in DEBUG.
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    )
+
+# Resized copies of recipe images, made in the background (recipe/images.py).  # noqa
+# Sizes are bounding boxes in pixels. WebP is skipped if Pillow lacks support.  # noqa
+RECIPE_IMAGE_SIZES = {
+    "thumbnail": 150,
+    "medium": 600,
+}
+RECIPE_IMAGE_FORMATS = ["webp", "jpeg"]
+RECIPE_IMAGE_WORKERS = int(os.environ.get("RECIPE_IMAGE_WORKERS", 2))
+# Uploads over these limits are rejected while streaming (recipe/uploads.py).  # noqa
+RECIPE_IMAGE_MAX_BYTES = int(os.environ.get("RECIPE_IMAGE_MAX_BYTES", 10 * 1024 * 1024))  # noqa
+RECIPE_IMAGE_MAX_PIXELS = int(os.environ.get("RECIPE_IMAGE_MAX_PIXELS", 40_000_000))  # noqa
+# Bulk imports over these limits get a 413, checked while parsing (recipe/bulk.py).  # noqa
+RECIPE_IMPORT_MAX_RECIPES = int(os.environ.get("RECIPE_IMPORT_MAX_RECIPES", 10000))  # noqa
+RECIPE_IMPORT_MAX_BYTES = int(os.environ.get("RECIPE_IMPORT_MAX_BYTES", 16 * 1024 * 1024))  # noqa
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -143,7 +309,56 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
 
-REST_FRAMEWORK = {"DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema"}
+_NUM_PROXIES = os.environ.get("NUM_PROXIES")
+REST_FRAMEWORK = {
+    "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # orjson backed, same bytes as DRF's JSON classes (see core.renderers).
+    # The browsable API is only served while debugging.
+    "DEFAULT_RENDERER_CLASSES": ["core.renderers.FastJSONRenderer"]
+    + (["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    # Proxies in front of the app, client IPs are read from their
+    # X-Forwarded-For (docker-compose-deploy.yml has one, see proxy/).
+    "NUM_PROXIES": int(_NUM_PROXIES) if _NUM_PROXIES else None,
+    # Login attempts per client IP and per email (user/throttles.py).
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": os.environ.get("LOGIN_RATE_IP", "60/min"),
+        "login_email": os.environ.get("LOGIN_RATE_EMAIL", "10/min"),
+    },
+}
+
+# Token -> user id lookups cached in the "default" cache by
+# core.authentication. The TTL bounds how long writes that send no
+# signal (queryset updates) go unseen.
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get("TOKEN_AUTH_CACHE_TTL", 60))
+# Tokens expire TOKEN_TTL seconds after their last use. Using one moves
+# its expiry at most every TOKEN_REFRESH_INTERVAL seconds (a write).
+# See core.tokens, and the delete_expired_tokens command.
+TOKEN_TTL = int(os.environ.get("TOKEN_TTL", 30 * 24 * 3600))
+TOKEN_REFRESH_INTERVAL = int(os.environ.get("TOKEN_REFRESH_INTERVAL", 3600))
+# Recent logins, logging in again within the TTL to get the same token
+# doesn't hash the password (core.authentication.LoginCache, in the
+# default cache).
+LOGIN_CACHE_TTL = int(os.environ.get("LOGIN_CACHE_TTL", 300))
+
+# Per-request timings (core.middleware.RequestMetricsMiddleware), sent
+# back in a Server-Timing header, and Prometheus metrics served at
+# /metrics to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+# (not served without one).
+SERVER_TIMING = bool(int(os.environ.get("SERVER_TIMING", 1)))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# For tests and staging: "log" (warnings of core.instrumentation) or
+# "raise" requests running the same SELECT QUERY_REPEAT_THRESHOLD times
+# or more (N+1 queries). Slow queries, over SLOW_QUERY_MS, are logged.
+QUERY_DETECTOR = os.environ.get("QUERY_DETECTOR", "")
+if QUERY_DETECTOR not in ("", "log", "raise"):
+    raise ImproperlyConfigured("QUERY_DETECTOR must be log or raise.")
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", 3))
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 100))
 
 # Allows to use spectacular to upload the image.
 SPECTACULAR_SETTINGS = {
@@ -17,12 +17,12 @@ from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
 )
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
-from app.settings import MEDIA_ROOT
+from core.views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -34,11 +34,11 @@ urlpatterns = [
     ),
     path("api/user/", include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
+    # Prometheus' default path, no slash.
+    path("metrics", metrics, name="metrics"),
 ]
 
-"""
-    This allows the django development server to have the static allowance behavior that a reverse proxy would have.  # noqa
-    This is only for debug or dev mode.
-"""
+# Static files are served by WhiteNoise (see settings.MIDDLEWARE), and
+# uploads by the proxy in production (proxy/), not by Django.
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)  # noqa
@@ -0,0 +1,176 @@
+"""
+Authentication classes for the APIs.
+"""
+import hashlib
+import hmac
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.tokens import refresh_token, token_expired
+
+
+class TokenCache:
+    """
+    Token key -> (user id, last use) of successful lookups, kept in a
+    cache every process shares (see core.checks.SHARED_CACHES).
+    Entries hold the version of their user: saving or deleting a user
+    gives them a new one (core.signals), which fails their entries in
+    every process, and deleting a token drops its entry. Writes that
+    send no signal are seen after the TTL.
+    No user data is kept: users come back with every field but their id
+    deferred, loaded from the database if a request reads them.
+    """
+
+    def __init__(self, alias="default", ttl=60):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        # Token keys are credentials, keep them out of the cache keys.
+        return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    def _version_key(self, user_id):
+        return f"auth:user:{user_id}"
+
+    def _version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            # add() keeps the version of a concurrent request.
+            self.cache.add(key, uuid.uuid4().hex, None)
+            version = self.cache.get(key)
+        return version
+
+    def get(self, key):
+        """Return the cached (user, token) or None."""
+        entry = self.cache.get(self._key(key))
+        if entry is None:
+            return None
+        user_id, created, version = entry
+        if version != self._version(user_id):
+            return None
+
+        user_model = get_user_model()
+        user = user_model.from_db(None, [user_model._meta.pk.attname], [user_id])  # noqa
+        token = Token(key=key, user=user, created=created)
+        return user, token
+
+    def set(self, token):
+        """Cache a successful lookup, or the new last use of a token."""
+        self.cache.set(
+            self._key(token.key),
+            (token.user_id, token.created, self._version(token.user_id)),
+            self.ttl,
+        )
+
+    def delete(self, key):
+        """Drop the entry of a token."""
+        self.cache.delete(self._key(key))
+
+    def delete_user(self, user_id):
+        """Fail every entry of a user, in every process."""
+        self.cache.set(self._version_key(user_id), uuid.uuid4().hex, None)
+
+
+class LoginCache:
+    """
+    Email -> recent login, so logging in again for the same token skips
+    hashing the password. Kept in a cache every process shares (see
+    core.checks.SHARED_CACHES). Only an HMAC is kept, of the credentials
+    and of the user's email and password hash when they logged in: after
+    a new password or email it no longer matches, in any process.
+    """
+
+    def __init__(self, alias="default", ttl=300):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, email):
+        # Any string, memcached keys can't hold spaces.
+        return f"login:{hashlib.sha256(email.encode()).hexdigest()}"
+
+    def _digest(self, password, user):
+        return salted_hmac(
+            "core.authentication.LoginCache",
+            f"{user.email}\0{password}\0{user.password}",
+            algorithm="sha256",
+        ).hexdigest()
+
+    def get(self, email):
+        """Return the (user id, digest) of a recent login, or None."""
+        return self.cache.get(self._key(email))
+
+    def matches(self, digest, password, user):
+        """Whether digest is of password and user, as they are now."""
+        return hmac.compare_digest(digest, self._digest(password, user))
+
+    def set(self, email, password, user):
+        """Cache a successful login."""
+        self.cache.set(
+            self._key(email),
+            (user.pk, self._digest(password, user)),
+            self.ttl,
+        )
+
+    def delete(self, email):
+        """Drop the login of email."""
+        self.cache.delete(self._key(email))
+
+
+token_cache = TokenCache(ttl=getattr(settings, "TOKEN_AUTH_CACHE_TTL", 60))
+login_cache = LoginCache(ttl=getattr(settings, "LOGIN_CACHE_TTL", 300))
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication rejecting expired tokens and moving the
+    expiry of used ones (see core.tokens).
+    """
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        if token_expired(token):
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+
+        refresh_token(token)
+        return user, token
+
+
+class CachedTokenAuthentication(ExpiringTokenAuthentication):
+    """
+    Token authentication that skips the token + user query
+    for tokens seen recently (see TokenCache).
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        # Looks expired: another process may have refreshed it since.
+        if cached is not None and not token_expired(cached[1]):
+            token = cached[1]
+            last_use = token.created
+            refresh_token(token)
+            if token.created != last_use:
+                token_cache.set(token)
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(token)
+
+        return user, token
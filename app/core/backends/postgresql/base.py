@@ -0,0 +1,127 @@
+"""
+PostgreSQL backend with connection health checks and pooling.
+
+Django 3.2 has neither, this backports them with the settings later
+versions use, so upgrading only means switching ENGINE back:
+- CONN_HEALTH_CHECKS (Django 4.1): a persistent connection is checked
+  on its first use in each request, and replaced if the server closed
+  it, instead of failing that request.
+- OPTIONS["pool"] (Django 5.1): True, or a dict of max_size / timeout
+  (see core.backends.postgresql.pool). Connections go back to the pool
+  at the end of each request, so CONN_MAX_AGE must be 0.
+
+Queries of requests are counted and timed (core.instrumentation).
+
+TRANSACTION_POOLING is for PgBouncer in transaction mode, which hands
+the server connection to another client after each transaction: server
+side cursors are only used inside transactions (never WITH HOLD).
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from core.backends.postgresql.pool import get_pool
+from core.instrumentation import query_timer
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Whether the connection was checked (or opened) in this request.
+    health_check_done = False
+    # Pool the current connection came from.
+    pool = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(query_timer)
+
+    def check_settings(self):
+        super().check_settings()
+        if not self.settings_dict["OPTIONS"].get("pool"):
+            return
+        if self.settings_dict["CONN_MAX_AGE"] != 0:
+            raise ImproperlyConfigured(
+                "Pooling doesn't support persistent connections, "
+                "set CONN_MAX_AGE to 0."
+            )
+        if self.settings_dict.get("TRANSACTION_POOLING"):
+            raise ImproperlyConfigured(
+                "Use either the pool or TRANSACTION_POOLING, not both."
+            )
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options:
+            return super().get_new_connection(conn_params)
+
+        self.pool = get_pool(
+            conn_params,
+            check=self.settings_dict.get("CONN_HEALTH_CHECKS", False),
+            **({} if options is True else options),
+        )
+        return self.pool.get(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+
+    def connect(self):
+        # Just opened, or checked by the pool. Set first, connect() sets
+        # autocommit, which checks.
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+
+        pool, self.pool = self.pool, None
+        # Closed in an atomic block, the connection stays referenced
+        # until the block exits, it can't go to another thread.
+        pool.put(
+            self.connection,
+            reusable=not (self.in_atomic_block or self.errors_occurred),
+        )
+
+    def close_if_unusable_or_obsolete(self):
+        # Runs when each request starts and finishes.
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    # Checked before the first query or transaction of the request. Not
+    # in ensure_connection(), it also runs when requests start.
+    def _cursor(self, name=None):
+        self._close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def set_autocommit(self, *args, **kwargs):
+        self._close_if_health_check_failed()
+        super().set_autocommit(*args, **kwargs)
+
+    def _close_if_health_check_failed(self):
+        """Drop a persistent connection the server closed meanwhile."""
+        if (
+            self.connection is None
+            or self.health_check_done
+            or self.in_atomic_block
+            or not self.settings_dict.get("CONN_HEALTH_CHECKS")
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def create_cursor(self, name=None):
+        if (
+            name
+            and self.settings_dict.get("TRANSACTION_POOLING")
+            and self.connection.autocommit
+        ):
+            # A cursor WITH HOLD outlives its transaction, but the server
+            # connection moves on to another client. Fetch the rows
+            # client side, like DISABLE_SERVER_SIDE_CURSORS does.
+            name = None
+        return super().create_cursor(name)
@@ -0,0 +1,170 @@
+"""
+In-process pool of psycopg2 connections.
+
+Each process keeps up to max_size open connections and hands them out
+per request, so threads share a bounded set of Postgres backends and
+requests skip connecting (fork of a backend, authentication, ...).
+"""
+import os
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    """
+    Bounded, thread safe pool. get() waits up to timeout seconds for a
+    free slot and opens a connection with connect() if no idle one is
+    left. put() returns it, or closes it if it's broken.
+    Waiting threads are served first come, first served: a freed slot
+    is handed to the oldest one, so none waits behind newer requests.
+    Idle connections are reused last in, first out, so the ones left
+    over after a burst go stale and are checked (or replaced) first.
+    """
+
+    def __init__(self, max_size=10, timeout=30, check=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self._lock = threading.Lock()
+        self._free = max_size
+        # Events of the threads waiting for a slot, oldest first.
+        self._waiting = deque()
+        self._idle = []
+        self.stats = {"opened": 0, "reused": 0, "discarded": 0, "waits": 0}
+
+    def get(self, connect):
+        """Return an idle connection, or a new one if there's none."""
+        self._acquire()
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    break
+                if not self.check or self._is_usable(connection):
+                    self._count("reused")
+                    return connection
+                self._discard(connection)
+
+            connection = connect()
+            self._count("opened")
+            return connection
+        except BaseException:
+            self._release()
+            raise
+
+    def put(self, connection, reusable=True):
+        """Give back a connection from get()."""
+        try:
+            if reusable and self._reset(connection):
+                with self._lock:
+                    self._idle.append(connection)
+            else:
+                self._discard(connection)
+        finally:
+            self._release()
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    def _acquire(self):
+        """Take a slot, waiting for one up to timeout seconds."""
+        with self._lock:
+            if self._free and not self._waiting:
+                self._free -= 1
+                return
+            self.stats["waits"] += 1
+            slot = threading.Event()
+            self._waiting.append(slot)
+
+        if slot.wait(self.timeout):
+            return
+        with self._lock:
+            # Handed over between the timeout and the lock.
+            if slot.is_set():
+                return
+            self._waiting.remove(slot)
+        raise psycopg2.OperationalError(
+            f"No connection available in the pool "
+            f"(max_size={self.max_size}) after {self.timeout}s."
+        )
+
+    def _release(self):
+        """Hand the slot to the oldest waiting thread, or free it."""
+        with self._lock:
+            if self._waiting:
+                self._waiting.popleft().set()
+            else:
+                self._free += 1
+
+    def _reset(self, connection):
+        """Roll back what a request left open. False if it's broken."""
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            # Not in autocommit, SELECT 1 opened a transaction.
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, connection):
+        self._count("discarded")
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params, **options):
+    """
+    Return the pool of this process for these connection parameters,
+    creating it on first use. Keyed by process id too: a forked worker
+    (i.e: gunicorn --preload) never shares its parent's sockets.
+    """
+    key = (os.getpid(), repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(**options)
+    return pool
+
+
+def close_pools():
+    """Close the idle connections of every pool of this process."""
+    with _pools_lock:
+        pools = [
+            pool for (pid, _), pool in _pools.items() if pid == os.getpid()
+        ]
+    for pool in pools:
+        pool.close()
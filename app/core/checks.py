@@ -0,0 +1,36 @@
+"""
+Checks of the settings against how the app is served.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+# Caches that hold state every process must see the same: a write
+# served by one process invalidates the responses all of them cache,
+# and pins its user to the primary database for all of them. Recent
+# logins are checked against the password hash at the time, and login
+# attempts counted across them, or limits grow with the workers.
+SHARED_CACHES = ("default", "api", "throttle")
+# Backends keeping their entries in the memory of each process.
+LOCAL_CACHE_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def check_shared_caches(processes):
+    """
+    Raise ImproperlyConfigured if several processes would each keep a
+    cache of SHARED_CACHES in their own memory.
+    """
+    if processes <= 1:
+        return
+
+    local = [
+        alias
+        for alias in SHARED_CACHES
+        if settings.CACHES[alias]["BACKEND"] in LOCAL_CACHE_BACKENDS
+    ]
+    if local:
+        raise ImproperlyConfigured(
+            f"{processes} processes can't share the local memory caches "
+            f"{', '.join(local)}. Set a shared backend (i.e: memcached), "
+            f"see settings.CACHES."
+        )
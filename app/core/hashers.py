@@ -0,0 +1,26 @@
+"""
+Password hashers with their costs from settings.
+
+Each keeps the algorithm name of Django's, so existing hashes verify.
+Hashes from another hasher, or with other costs, are rehashed with
+settings.PASSWORD_HASHER on the user's next successful login (Django's
+check_password() does it, see must_update()).
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id, memory hard: GPUs can't run many guesses at once."""
+
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
+    memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+    parallelism = settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    rounds = settings.PASSWORD_BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = settings.PASSWORD_PBKDF2_ITERATIONS
@@ -0,0 +1,169 @@
+"""
+Per-request performance measurements.
+
+RequestMetricsMiddleware (core.middleware) gives each request a
+RequestMetrics, which the layers below add to:
+- SQL: query_timer(), an execute wrapper the database backend installs
+  on every connection, counts and times queries.
+- Serializers and renderers time themselves with timed(). Time spent
+  in SQL within them is left out, it's counted as SQL.
+The current request's metrics are in a ContextVar, so they follow the
+request into sync_to_async() threads. Outside requests (i.e: commands)
+there are none and nothing is measured.
+
+With settings.QUERY_DETECTOR (for tests and staging), the SQL of each
+request is also kept and checked by check_queries(): the same SELECT
+run QUERY_REPEAT_THRESHOLD times or more (an N+1 query, i.e: a missing
+prefetch_related()), and queries slower than SLOW_QUERY_MS.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# IN lists, their number of placeholders changes with the values.
+IN_LIST = re.compile(r"\bIN \(%s(?:\s*,\s*%s)*\)")
+
+
+class RepeatedQueriesError(Exception):
+    """A request ran the same SELECT too many times."""
+
+
+class RequestMetrics:
+    """What a request spent its time on, in seconds."""
+
+    __slots__ = (
+        "queries", "db", "serialize", "render", "sql", "slow", "_timing"
+    )
+
+    def __init__(self, detect=False):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        # SQL of the queries, and (seconds, sql) of the slow ones, only
+        # kept when detecting.
+        self.sql = [] if detect else None
+        self.slow = [] if detect else None
+        # Name of the timed() block running, they don't nest.
+        self._timing = None
+
+    def server_timing(self, total):
+        """Return the Server-Timing header value, durations in ms."""
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize * 1000:.1f}, "
+            f"render;dur={self.render * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def measure(detect=False):
+    """Measure the block as a request, yields its RequestMetrics."""
+    metrics = RequestMetrics(detect)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Execute wrapper counting and timing the queries of requests."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.db += elapsed
+        metrics.queries += 1
+        if metrics.sql is not None:
+            metrics.sql.append(sql)
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                metrics.slow.append((elapsed, sql))
+
+
+def sql_shape(sql):
+    """Return the SQL with IN lists of any length made the same."""
+    return IN_LIST.sub("IN (...)", sql)
+
+
+def repeated_queries(sqls, threshold):
+    """Return {shape: count} of SELECTs run threshold times or more."""
+    counts = Counter(
+        sql_shape(sql)
+        for sql in sqls
+        if sql.lstrip()[:6].upper() == "SELECT"
+    )
+    return {shape: count for shape, count in counts.items() if count >= threshold}  # noqa
+
+
+def check_queries(request, metrics):
+    """
+    Log the repeated and slow queries of a request measured with
+    detect=True. Repeated ones raise RepeatedQueriesError instead with
+    QUERY_DETECTOR = "raise".
+    """
+    repeated = repeated_queries(metrics.sql, settings.QUERY_REPEAT_THRESHOLD)
+    for shape, count in repeated.items():
+        message = (
+            f"{request.method} {request.path} ran the same query {count} "
+            f"times, missing select_related() or prefetch_related()? {shape}"
+        )
+        if settings.QUERY_DETECTOR == "raise":
+            raise RepeatedQueriesError(message)
+        logger.warning(message)
+
+    for elapsed, sql in metrics.slow:
+        logger.warning(
+            "%s %s ran a slow query (%.0f ms): %s",
+            request.method,
+            request.path,
+            elapsed * 1000,
+            sql,
+        )
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time of the block, but its SQL, to the request's `name`
+    (serialize or render). Nested blocks are counted by the outer one.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics._timing is not None:
+        yield
+        return
+
+    metrics._timing = name
+    db = metrics.db
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (metrics.db - db)
+        setattr(metrics, name, getattr(metrics, name) + elapsed)
+        metrics._timing = None
+
+
+class TimedSerializerMixin:
+    """Time to_representation() of a serializer as "serialize"."""
+
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
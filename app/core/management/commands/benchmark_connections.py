@@ -0,0 +1,200 @@
+"""
+Django command to load test the database connection settings.
+
+Threads send authenticated requests for recipe details (lists are
+cached) through the WSGI handler, like a threaded server would (i.e:
+gunicorn --threads), so connections are opened and closed by the
+request signals. Each mode runs with the configured DATABASES plus:
+- close: CONN_MAX_AGE=0, a new connection per request.
+- persistent: CONN_MAX_AGE=600 with health checks, one per thread.
+- pool: the in-process pool, --pool-size connections for all threads.
+Reports requests/sec, latencies, the Postgres backends opened and the
+peak of open ones. The benchmark user is deleted at the end, i.e:
+    python manage.py benchmark_connections --threads 16 --requests 4000
+"""
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.backends.postgresql.pool import close_pools
+from core.models import Recipe
+
+MODES = {
+    "close": {"CONN_MAX_AGE": 0},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+    "pool": {"CONN_MAX_AGE": 0, "TRANSACTION_POOLING": False},
+}
+
+# Open client connections to this database, but the monitor's own.
+BACKENDS_SQL = """
+SELECT count(*) - 1 FROM pg_stat_activity
+WHERE datname = current_database() AND backend_type = 'client backend'
+"""
+
+
+class BackendMonitor(threading.Thread):
+    """Sample the number of open Postgres backends until stopped."""
+
+    def __init__(self, conn_params, interval=0.005):
+        super().__init__(daemon=True)
+        self.conn_params = conn_params
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        monitor = psycopg2.connect(**self.conn_params)
+        monitor.autocommit = True
+        try:
+            with monitor.cursor() as cursor:
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(BACKENDS_SQL)
+                    self.peak = max(self.peak, cursor.fetchone()[0])
+        finally:
+            monitor.close()
+
+
+class Command(BaseCommand):
+    """Django command to load test database connections."""
+
+    help = "Compare requests/sec with and without connection reuse."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--pool-size", type=int, default=4)
+        parser.add_argument(
+            "--modes", nargs="+", choices=list(MODES), default=list(MODES)
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        # Threads need committed data, it can't be rolled back.
+        user = get_user_model().objects.create_user(
+            email="benchmark-connections@example.com", password="benchmark"
+        )
+        try:
+            token = Token.objects.create(user=user)
+            recipes = Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        user=user, title=f"Recipe {i}", time_minutes=5, price=1
+                    )
+                    for i in range(20)
+                ]
+            )
+            conn_params = connection.get_connection_params()
+            settings_dict = connections.databases["default"]
+            configured = dict(settings_dict)
+            for mode in options["modes"]:
+                settings_dict.update(configured, **MODES[mode])
+                if mode == "pool":
+                    settings_dict["OPTIONS"] = {
+                        **configured["OPTIONS"],
+                        "pool": {"max_size": options["pool_size"]},
+                    }
+                connections.close_all()
+                self._report(
+                    mode, self._run(token, recipes, conn_params, options)
+                )
+        finally:
+            settings_dict.update(configured)
+            connections.close_all()
+            user.delete()
+
+    def _run(self, token, recipes, conn_params, options):
+        """Send the requests from the threads, return the results."""
+        handler = WSGIHandler()
+        paths = [
+            reverse("recipe:recipe-detail", args=[recipe.id])
+            for recipe in recipes
+        ]
+        latencies = []
+        backends = set()
+        failures = []
+        lock = threading.Lock()
+
+        def opened(sender, connection, **kwargs):
+            # Counted by server process: pooled connections send it
+            # again each time they're handed out.
+            with lock:
+                backends.add(connection.connection.info.backend_pid)
+
+        def worker(count):
+            timings = []
+            try:
+                for i in range(count):
+                    environ = {
+                        "PATH_INFO": paths[i % len(paths)],
+                        "HTTP_AUTHORIZATION": f"Token {token.key}",
+                        "HTTP_ACCEPT": "application/json",
+                    }
+                    setup_testing_defaults(environ)
+                    start = time.perf_counter()
+                    response = handler(environ, lambda *args: None)
+                    # Like the server, sends request_finished.
+                    response.close()
+                    timings.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(timings)
+
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(options["requests"] // options["threads"],),
+            )
+            for _ in range(options["threads"])
+        ]
+        monitor = BackendMonitor(conn_params)
+        connection_created.connect(opened)
+        monitor.start()
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.perf_counter() - start
+            connection_created.disconnect(opened)
+            monitor.stopped.set()
+            monitor.join()
+            close_pools()
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "failures": len(failures),
+            "elapsed": elapsed,
+            "p50": latencies[len(latencies) // 2],
+            "p99": latencies[int(len(latencies) * 0.99)],
+            "opened": len(backends),
+            "peak": monitor.peak,
+        }
+
+    def _report(self, mode, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {mode}"))
+        self.stdout.write(
+            f"{result['requests'] / result['elapsed']:10.0f} requests/sec"
+            f"  p50 {result['p50'] * 1000:.1f} ms"
+            f"  p99 {result['p99'] * 1000:.1f} ms"
+            f"  ({result['failures']} failed)"
+        )
+        self.stdout.write(
+            f"{result['opened']:10d} connections opened"
+            f"  {result['peak']} open at most"
+        )
@@ -0,0 +1,187 @@
+"""
+Django command to load test a running server over HTTP.
+
+Clients (threads) send GET requests for the paths in a loop, over
+keep-alive connections like browsers and load balancers do, and the
+requests/sec and latencies are reported per path. "{recipe}" in a
+path is replaced by the seeded recipes, i.e: for the docker compose
+deployment:
+    python manage.py benchmark_http --url http://app:8000 \\
+        --path /api/recipe/recipes/ --path /api/recipe/recipes/{recipe}/
+The server must use the same database: a user, their token and
+recipes are created for the run and deleted at the end.
+"""
+import http.client
+import threading
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+
+
+class Client(threading.Thread):
+    """Send the requests of paths one after the other, timing them."""
+
+    def __init__(self, url, paths, count, headers, keep_alive=True, ready=None):
+        super().__init__(daemon=True)
+        self.url = url
+        self.paths = paths
+        self.count = count
+        self.headers = headers
+        self.keep_alive = keep_alive
+        # Barrier of all the clients, passed once they are connected.
+        self.ready = ready
+        # (path template, status, seconds, body bytes)
+        self.results = []
+
+    def _connect(self):
+        connection_class = (
+            http.client.HTTPSConnection
+            if self.url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return connection_class(self.url.netloc, timeout=60)
+
+    def run(self):
+        conn = self._connect()
+        if self.ready is not None:
+            try:
+                conn.connect()
+            except OSError:
+                pass
+            self.ready.wait()
+        try:
+            for (template, path), _ in zip(cycle(self.paths), range(self.count)):  # noqa
+                start = time.perf_counter()
+                try:
+                    conn.request("GET", path, headers=self.headers)
+                    response = conn.getresponse()
+                    size = len(response.read())
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    # i.e: the server closed an idle connection.
+                    conn.close()
+                    conn = self._connect()
+                    status, size = None, 0
+                self.results.append(
+                    (template, status, time.perf_counter() - start, size)
+                )
+                if not self.keep_alive:
+                    conn.close()
+        finally:
+            conn.close()
+
+
+class Command(BaseCommand):
+    """Django command to load test a server."""
+
+    help = "Measure requests/sec and latencies of a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request, repeat for more.",
+        )
+        parser.add_argument("--clients", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=4000)
+        parser.add_argument("--no-keep-alive", action="store_true")
+        parser.add_argument(
+            "--compressed",
+            action="store_true",
+            help="Accept gzip and brotli encoded responses.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        url = urlsplit(options["url"])
+        if url.scheme not in ("http", "https"):
+            raise CommandError(f"Unsupported URL: {options['url']}")
+        templates = options["paths"] or ["/api/recipe/recipes/{recipe}/"]
+
+        user = get_user_model().objects.create_user(
+            email="benchmark-http@example.com", password="benchmark"
+        )
+        try:
+            token = Token.objects.create(user=user)
+            recipes = Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        user=user, title=f"Recipe {i}", time_minutes=5, price=1
+                    )
+                    for i in range(20)
+                ]
+            )
+            paths = [
+                (template, template.format(recipe=recipe.id))
+                for recipe in recipes
+                for template in templates
+            ]
+            headers = {
+                "Authorization": f"Token {token.key}",
+                "Accept": "application/json",
+            }
+            if options["compressed"]:
+                headers["Accept-Encoding"] = "br, gzip"
+            self._report(templates, self._run(url, paths, headers, options))
+        finally:
+            user.delete()
+
+    def _run(self, url, paths, headers, options):
+        # Thousands of connections at once would overflow the listen
+        # backlog, clients connect before the clock starts.
+        ready = threading.Barrier(options["clients"] + 1)
+        clients = [
+            # Each client starts at another path.
+            Client(
+                url,
+                paths[i % len(paths):] + paths[:i % len(paths)],
+                options["requests"] // options["clients"],
+                headers,
+                keep_alive=not options["no_keep_alive"],
+                ready=ready,
+            )
+            for i in range(options["clients"])
+        ]
+        for client in clients:
+            client.start()
+        ready.wait()
+        start = time.perf_counter()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        return elapsed, [
+            result for client in clients for result in client.results
+        ]
+
+    def _report(self, templates, run):
+        elapsed, results = run
+        self.stdout.write(
+            f"{len(results) / elapsed:10.0f} requests/sec in {elapsed:.1f}s"
+        )
+        for template in templates:
+            path_results = [r for r in results if r[0] == template]
+            latencies = sorted(r[2] for r in path_results)
+            failed = sum(1 for r in path_results if r[1] != 200)
+            size = sum(r[3] for r in path_results) // len(path_results)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {template}"))
+            self.stdout.write(
+                f"{len(path_results):10d} requests"
+                f"  p50 {self._percentile(latencies, 0.5):.1f} ms"
+                f"  p90 {self._percentile(latencies, 0.9):.1f} ms"
+                f"  p99 {self._percentile(latencies, 0.99):.1f} ms"
+                f"  {size} bytes  ({failed} failed)"
+            )
+
+    def _percentile(self, latencies, fraction):
+        """Return the percentile of sorted latencies, in milliseconds."""
+        return latencies[int(len(latencies) * fraction)] * 1000
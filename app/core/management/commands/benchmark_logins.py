@@ -0,0 +1,116 @@
+"""
+Django command to benchmark logins to the token API.
+
+For each hasher, a user with a password hashed by it logs in --requests
+times through CreateTokenView (without rate limits), checking the
+password every time. The hasher is made the preferred one for its run,
+so the hash isn't replaced on the first login. The "recent" run logs in
+again with the same credentials, answered from the login cache without
+hashing. Reports logins/sec and latencies, the users are deleted at the
+end, i.e:
+    python manage.py benchmark_logins --requests 50
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import login_cache
+from user.views import CreateTokenView
+
+HASHERS = {
+    "argon2": "core.hashers.Argon2PasswordHasher",
+    "bcrypt_sha256": "core.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2_sha256": "core.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    """Django command to benchmark logins."""
+
+    help = "Compare logins/sec of the password hashers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument(
+            "--hashers", nargs="+", choices=list(HASHERS), default=list(HASHERS)  # noqa
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        view = CreateTokenView.as_view(throttle_classes=[])
+        users = []
+        try:
+            for algorithm in options["hashers"]:
+                preferred = [HASHERS[algorithm]] + [
+                    hasher
+                    for hasher in settings.PASSWORD_HASHERS
+                    if hasher != HASHERS[algorithm]
+                ]
+                with override_settings(PASSWORD_HASHERS=preferred):
+                    users.append(
+                        get_user_model().objects.create(
+                            email=f"benchmark-{algorithm}@example.com",
+                            password=make_password(PASSWORD, hasher=algorithm),  # noqa
+                        )
+                    )
+                    self._report(
+                        algorithm,
+                        self._run(view, users[-1], options["requests"]),
+                    )
+
+            # Logging in again with the same password.
+            self._report(
+                "recent",
+                self._run(view, users[0], options["requests"], recent=True),
+            )
+        finally:
+            get_user_model().objects.filter(
+                pk__in=[user.pk for user in users]
+            ).delete()
+            for user in users:
+                login_cache.delete(user.email)
+
+    def _run(self, view, user, count, recent=False):
+        """Log the user in count times, return the results."""
+        factory = APIRequestFactory()
+        credentials = {"email": user.email, "password": PASSWORD}
+        latencies = []
+        failures = 0
+        login_cache.delete(user.email)
+        if recent:
+            view(factory.post("/", credentials, format="json"))
+
+        for _ in range(count):
+            if not recent:
+                login_cache.delete(user.email)
+            request = factory.post("/", credentials, format="json")
+            start = time.perf_counter()
+            response = view(request)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+        latencies.sort()
+        return {
+            "requests": count,
+            "failures": failures,
+            "elapsed": sum(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p99": latencies[int(len(latencies) * 0.99)],
+        }
+
+    def _report(self, name, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+        self.stdout.write(
+            f"{result['requests'] / result['elapsed']:10.0f} logins/sec"
+            f"  p50 {result['p50'] * 1000:.1f} ms"
+            f"  p99 {result['p99'] * 1000:.1f} ms"
+            f"  ({result['failures']} failed)"
+        )
@@ -0,0 +1,212 @@
+"""
+Django command to benchmark the recipe API list queries.
+
+Seeds a synthetic library for one user, prints the Postgres query plan
+(EXPLAIN ANALYZE) of the querysets the recipe views build, and rolls
+everything back at the end. Run it before and after a migration to
+compare plans, i.e:
+    python manage.py migrate core 0005
+    python manage.py benchmark_queries --recipes 50000
+    python manage.py migrate
+    python manage.py benchmark_queries --recipes 50000
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import views
+
+
+# Vocabulary of the synthetic titles and descriptions, for search.
+WORDS = (
+    "chicken beef pork lamb turkey duck tofu tempeh seitan salmon tuna cod "
+    "shrimp crab mussel clam squid lentil chickpea bean pea edamame quinoa "
+    "barley oat rice couscous polenta noodle pasta gnocchi dumpling bread "
+    "bagel brioche focaccia tortilla taco burrito quesadilla enchilada "
+    "tamale pizza calzone pie tart quiche cake cookie brownie muffin scone "
+    "pancake waffle crepe pudding custard mousse sorbet gelato parfait "
+    "mushroom potato tomato spinach kale chard cabbage carrot beet radish "
+    "turnip parsnip squash pumpkin zucchini eggplant pepper cucumber celery "
+    "fennel leek onion shallot garlic ginger lemon lime orange grapefruit "
+    "apple pear peach plum cherry apricot mango papaya pineapple banana "
+    "coconut date fig raisin almond walnut pecan cashew pistachio peanut "
+    "hazelnut sesame chili cumin coriander turmeric paprika saffron "
+    "cinnamon nutmeg clove cardamom vanilla chocolate caramel honey maple "
+    "miso soy tahini pesto salsa curry soup stew chowder bisque salad roast "
+    "grilled baked fried braised poached steamed smoked spicy creamy "
+    "crispy tangy zesty sweet savory hearty"
+).split()
+
+# Recipes created (and linked) per batch by the seeding.
+SEED_CHUNK = 5000
+
+
+def seed_library(rng, recipes, tags, ingredients, per_recipe):
+    """
+    Create a user with a synthetic library of the given number of
+    recipes, tags and ingredients, and return it.
+    Meant to run in a transaction that is rolled back.
+    """
+    user = get_user_model().objects.create_user(
+        email="benchmark@example.com", password="benchmark"
+    )
+    tag_list = Tag.objects.bulk_create(
+        [Tag(user=user, name=f"Tag {i}") for i in range(tags)]
+    )
+    ingredient_list = Ingredient.objects.bulk_create(
+        [
+            Ingredient(user=user, name=f"Ingredient {i}")
+            for i in range(ingredients)
+        ]
+    )
+    # In chunks, so memory stays flat for millions of recipes.
+    remaining = recipes
+    analyzed = False
+    while remaining > 0:
+        batch = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user=user,
+                    title=" ".join(rng.sample(WORDS, 3)),
+                    description=" ".join(rng.choices(WORDS, k=12)),
+                    time_minutes=rng.randint(5, 120),
+                    price=Decimal(rng.randint(100, 9999)) / 100,
+                )
+                for _ in range(min(SEED_CHUNK, remaining))
+            ]
+        )
+        remaining -= len(batch)
+
+        for relation, items in (
+            ("tags", tag_list),
+            ("ingredients", ingredient_list),
+        ):
+            through = getattr(Recipe, relation).through
+            # i.e: 'tag_id' or 'ingredient_id'
+            field = f"{relation[:-1]}_id"
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe.id, **{field: item.id})
+                    for recipe in batch
+                    for item in rng.sample(items, min(per_recipe, len(items)))
+                ]
+            )
+        # Planned against empty tables, the search vector refresh of
+        # the next chunks reads every link (a whole tag_id index,
+        # filtered by recipe_id). Counts of the first chunk are
+        # enough, the planner scales them by the table size.
+        if not analyzed:
+            _analyze_library()
+            analyzed = True
+
+    # Fresh statistics so the planner sees the seeded data.
+    _analyze_library()
+
+    return user
+
+
+def _analyze_library():
+    """Refresh the planner statistics of the seeded tables."""
+    with connection.cursor() as cursor:
+        for model in (Recipe, Tag, Ingredient):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+        cursor.execute(f"ANALYZE {Recipe.tags.through._meta.db_table}")
+        cursor.execute(f"ANALYZE {Recipe.ingredients.through._meta.db_table}")
+
+
+class Command(BaseCommand):
+    """Django command to benchmark recipe queries."""
+
+    help = "Show query plans for the recipe API list queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--ingredients", type=int, default=500)
+        parser.add_argument("--per-recipe", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            user = seed_library(
+                rng,
+                recipes=options["recipes"],
+                tags=options["tags"],
+                ingredients=options["ingredients"],
+                per_recipe=options["per_recipe"],
+            )
+            tag_ids = list(
+                Tag.objects.filter(user=user).values_list("id", flat=True)[:3]
+            )
+            ingredient_ids = list(
+                Ingredient.objects.filter(user=user).values_list(
+                    "id", flat=True
+                )[:3]
+            )
+            cases = [
+                ("recipes", views.RecipeViewSet, {}),
+                (
+                    "recipes filtered by tags and ingredients",
+                    views.RecipeViewSet,
+                    {
+                        "tags": ",".join(map(str, tag_ids)),
+                        "ingredients": ",".join(map(str, ingredient_ids)),
+                    },
+                ),
+                (
+                    "recipes with all tags",
+                    views.RecipeViewSet,
+                    {"tags": ",".join(map(str, tag_ids)), "tags_match": "all"},
+                ),
+                ("recipes search", views.RecipeViewSet, {"search": "chicken"}),
+                (
+                    "recipes search prefix",
+                    views.RecipeViewSet,
+                    {"search": "spic chick"},
+                ),
+                (
+                    "recipes search typo",
+                    views.RecipeViewSet,
+                    {"search": "chiken"},
+                ),
+                ("tags", views.TagViewSet, {}),
+                ("tags assigned only", views.TagViewSet, {"assigned_only": 1}),
+                ("tags with counts", views.TagViewSet, {"with_counts": 1}),
+                (
+                    "tags assigned only with counts",
+                    views.TagViewSet,
+                    {"assigned_only": 1, "with_counts": 1},
+                ),
+                ("ingredients", views.IngredientViewSet, {}),
+                (
+                    "ingredients with counts",
+                    views.IngredientViewSet,
+                    {"with_counts": 1},
+                ),
+            ]
+            for label, viewset, params in cases:
+                queryset = self._view_queryset(viewset, user, params)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"== {label}"))
+                self.stdout.write(queryset.explain(analyze=True))
+
+            # Nothing seeded is kept.
+            transaction.set_rollback(True)
+
+    def _view_queryset(self, viewset, user, params):
+        """Return the list queryset the viewset builds for the user."""
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = user
+        view = viewset(request=request, action="list", format_kwarg=None)
+
+        # Lists read only the columns they render (recipe.values).
+        return view.get_values_serializer().values(view.get_queryset())
@@ -0,0 +1,110 @@
+"""
+Django command to benchmark the recipe list serializers.
+
+Seeds a synthetic library for one user and times building the list
+response data with the model serializers, which the list endpoints
+used before, and with the values serializers they use now. Queries are
+included, like in the views. Then times encoding the recipes with DRF's
+JSONRenderer and with core.renderers. Everything is rolled back, i.e:
+    python manage.py benchmark_serializers --recipes 5000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_queries import seed_library
+from core.models import Recipe, Tag, Ingredient
+from core.renderers import FastJSONRenderer
+from recipe import serializers
+
+
+class Command(BaseCommand):
+    """Django command to benchmark recipe serializers."""
+
+    help = "Compare objects/sec of the list serializers and renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=2000)
+        parser.add_argument("--per-recipe", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            user = seed_library(
+                rng,
+                recipes=options["recipes"],
+                tags=200,
+                ingredients=500,
+                per_recipe=options["per_recipe"],
+            )
+            recipes = Recipe.objects.filter(user=user).order_by("-id")
+            tags = Tag.objects.filter(user=user).order_by("-name")
+
+            data = self._values(serializers.RecipeValuesSerializer(), recipes)
+
+            cases = [
+                (
+                    "recipes",
+                    len(data),
+                    lambda: serializers.RecipeSerializer(
+                        recipes.prefetch_related(
+                            Prefetch("tags", Tag.objects.order_by("id")),
+                            Prefetch(
+                                "ingredients",
+                                Ingredient.objects.order_by("id"),
+                            ),
+                        ),
+                        many=True,
+                    ).data,
+                    lambda: self._values(
+                        serializers.RecipeValuesSerializer(), recipes
+                    ),
+                ),
+                (
+                    "tags",
+                    tags.count(),
+                    lambda: serializers.TagSerializer(tags, many=True).data,
+                    lambda: self._values(
+                        serializers.TagValuesSerializer(), tags
+                    ),
+                ),
+                (
+                    "recipes json",
+                    len(data),
+                    lambda: JSONRenderer().render(data),
+                    lambda: FastJSONRenderer().render(data),
+                ),
+            ]
+            for label, count, before, after in cases:
+                before_rate = count / self._best_time(before, options)
+                after_rate = count / self._best_time(after, options)
+                self.stdout.write(
+                    f"{label}: {before_rate:,.0f} -> {after_rate:,.0f} "
+                    f"objects/sec ({after_rate / before_rate:.1f}x)"
+                )
+
+            # Nothing seeded is kept.
+            transaction.set_rollback(True)
+
+    def _values(self, serializer, queryset):
+        """Build list data like recipe.values.ValuesListMixin does."""
+        return serializer.to_representation(list(serializer.values(queryset)))
+
+    def _best_time(self, build, options):
+        """Best wall time of building the data, in seconds."""
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            build()
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
@@ -0,0 +1,44 @@
+"""
+Django command to delete expired auth tokens.
+
+Deletes in batches of --batch-size, each in its own transaction, so rows
+are locked briefly and logins and refreshes aren't held up. Run it
+regularly (i.e: from cron), then it reports the live tokens:
+    python manage.py delete_expired_tokens --batch-size 1000
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.tokens import delete_expired_tokens, live_tokens
+
+
+class Command(BaseCommand):
+    """Django command to delete expired tokens."""
+
+    help = "Delete expired auth tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Seconds between batches, for replicas and vacuum.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        deleted = 0
+        while True:
+            batch = delete_expired_tokens(options["batch_size"])
+            deleted += batch
+            if batch < options["batch_size"]:
+                break
+            time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} expired tokens, {live_tokens()} live."
+            )
+        )
@@ -0,0 +1,38 @@
+"""
+Django command to generate missing resized recipe images.
+
+Uploads queue their resizing in memory, so a job is lost if the process
+stops first. This picks up every recipe with an image but no derivatives.
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to generate recipe image derivatives."""
+
+    help = "Generate resized images for recipes that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate derivatives of every recipe with an image.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        recipes = Recipe.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            recipes = recipes.filter(image_derivatives={})
+
+        done = 0
+        for recipe_id in recipes.values_list("id", flat=True).iterator():
+            if images.generate_derivatives(recipe_id) is not None:
+                done += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated derivatives for {done} recipes.")
+        )
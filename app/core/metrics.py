@@ -0,0 +1,107 @@
+"""
+Prometheus metrics of the requests, served by core.views.metrics.
+
+Each gunicorn worker counts the requests it serves. With
+PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py) they count in files
+there, and a scrape, served by any worker, adds them all up. Without it
+a scrape only sees the worker serving it.
+"""
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from core.tokens import live_tokens
+
+
+# Anything else (clients make methods up) is counted as "other".
+METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to respond, from the first middleware to the response.",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Counter(
+    "http_request_db_queries",
+    "SQL queries run by requests.",
+    ["view"],
+)
+REQUEST_DB = Counter(
+    "http_request_db_seconds",
+    "Time requests spent running SQL.",
+    ["view"],
+)
+REQUEST_SERIALIZE = Counter(
+    "http_request_serialize_seconds",
+    "Time requests spent in serializers, but their SQL.",
+    ["view"],
+)
+REQUEST_RENDER = Counter(
+    "http_request_render_seconds",
+    "Time requests spent rendering response bodies.",
+    ["view"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies, but streamed ones without a length.",
+    ["view"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float("inf")),
+)
+
+
+def observe(request, response, metrics, total):
+    """Count a request, its RequestMetrics and total seconds."""
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match is not None else "none"
+    method = request.method if request.method in METHODS else "other"
+
+    REQUEST_DURATION.labels(view, method, response.status_code).observe(total)
+    REQUEST_QUERIES.labels(view).inc(metrics.queries)
+    REQUEST_DB.labels(view).inc(metrics.db)
+    REQUEST_SERIALIZE.labels(view).inc(metrics.serialize)
+    REQUEST_RENDER.labels(view).inc(metrics.render)
+    size = response_size(response)
+    if size is not None:
+        RESPONSE_SIZE.labels(view).observe(size)
+
+
+def response_size(response):
+    """Return the size of the body, None if streamed without a length."""
+    if not response.streaming:
+        return len(response.content)
+    length = response.get("Content-Length")
+    return int(length) if length else None
+
+
+class LiveTokensCollector:
+    """Tokens that haven't expired, counted on each scrape."""
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            "auth_live_tokens",
+            "Auth tokens that haven't expired.",
+            value=live_tokens(),
+        )
+
+
+def export():
+    """Return the metrics in Prometheus' text format."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    gauges = CollectorRegistry()
+    gauges.register(LiveTokensCollector())
+
+    return generate_latest(registry) + generate_latest(gauges)
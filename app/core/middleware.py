@@ -0,0 +1,39 @@
+"""
+Middleware for the app.
+"""
+import time
+
+from django.conf import settings
+
+from core import instrumentation, metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request (see core.instrumentation): its total time,
+    SQL, serializers, rendering and response size. Sent back in a
+    Server-Timing header (if settings.SERVER_TIMING) and counted in the
+    Prometheus metrics, and repeated or slow queries are reported with
+    settings.QUERY_DETECTOR. First in MIDDLEWARE, so the total covers
+    the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with instrumentation.measure(
+            detect=bool(settings.QUERY_DETECTOR)
+        ) as request_metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, request_metrics, start)
+
+    def finish(self, request, response, request_metrics, start):
+        total = time.perf_counter() - start
+        if request_metrics.sql is not None:
+            instrumentation.check_queries(request, request_metrics)
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = request_metrics.server_timing(total)
+        metrics.observe(request, response, request_metrics, total)
+        return response
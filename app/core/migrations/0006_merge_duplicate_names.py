@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:06
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    Merge tags/ingredients sharing a name for the same user.
+    Recipes are relinked to the oldest row before the rest are deleted,
+    so the unique constraints below can be created.
+    """
+    Recipe = apps.get_model("core", "Recipe")
+
+    for model_name, relation in (("Tag", "tags"), ("Ingredient", "ingredients")):  # noqa
+        model = apps.get_model("core", model_name)
+        through = getattr(Recipe, relation).through
+        field = f"{model_name.lower()}_id"
+
+        duplicates = (
+            model.objects.values("user_id", "name")
+            .annotate(keep_id=Min("id"), total=Count("id"))
+            .filter(total__gt=1)
+        )
+        for dup in duplicates:
+            other_ids = list(
+                model.objects.filter(user_id=dup["user_id"], name=dup["name"])
+                .exclude(id=dup["keep_id"])
+                .values_list("id", flat=True)
+            )
+            linked = set(
+                through.objects.filter(**{field: dup["keep_id"]}).values_list(
+                    "recipe_id", flat=True
+                )
+            )
+            for row in through.objects.filter(**{f"{field}__in": other_ids}):
+                if row.recipe_id not in linked:
+                    linked.add(row.recipe_id)
+                    through.objects.create(
+                        recipe_id=row.recipe_id, **{field: dup["keep_id"]}
+                    )
+            model.objects.filter(id__in=other_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_recipe_image"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
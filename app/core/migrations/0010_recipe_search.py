@@ -0,0 +1,192 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:21
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Weighted document of a recipe: title (A), description (B), tag and
+# ingredient names (C). The config must match recipe.search.
+#
+# Writes to links and names refresh the recipes they touch with one
+# statement each, so a bulk insert of links updates each recipe once.
+# The refresh is dynamic SQL, planned on every call: a cached plan made
+# while the tables were small would scan them once per recipe. Every
+# table is also filtered by the ids (= ANY), so it's read through its
+# index on them, as long as the statistics don't say it's empty.
+SEARCH_VECTOR_FUNCTIONS = """
+CREATE FUNCTION core_recipe_refresh_search_vector(recipe_ids bigint[])
+RETURNS void LANGUAGE plpgsql AS $fn$
+BEGIN
+    EXECUTE $sql$
+        UPDATE core_recipe r
+        SET search_vector =
+            setweight(to_tsvector('english', coalesce(r.title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(r.description, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(t.names, '')), 'C')
+            || setweight(to_tsvector('english', coalesce(i.names, '')), 'C')
+        FROM unnest($1) AS c(id)
+        LEFT JOIN (
+            SELECT rt.recipe_id, string_agg(t.name, ' ') AS names
+            FROM core_recipe_tags rt
+            JOIN core_tag t ON t.id = rt.tag_id
+            WHERE rt.recipe_id = ANY($1)
+            GROUP BY rt.recipe_id
+        ) t ON t.recipe_id = c.id
+        LEFT JOIN (
+            SELECT ri.recipe_id, string_agg(i.name, ' ') AS names
+            FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = ANY($1)
+            GROUP BY ri.recipe_id
+        ) i ON i.recipe_id = c.id
+        WHERE r.id = c.id AND r.id = ANY($1)
+    $sql$ USING recipe_ids;
+END;
+$fn$;
+
+-- Title and description are recomputed on the row, the names part
+-- (weight C) is kept as is, new recipes have no links yet.
+CREATE FUNCTION core_recipe_search_vector_row() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    IF TG_OP = 'UPDATE' THEN
+        NEW.search_vector := NEW.search_vector
+            || ts_filter(coalesce(OLD.search_vector, ''), '{c}');
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE FUNCTION core_recipe_search_vector_links() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search_vector(
+        ARRAY(SELECT DISTINCT recipe_id FROM changed_links)
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- TG_ARGV: through table and its column pointing to the renamed rows.
+CREATE FUNCTION core_recipe_search_vector_rename() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    recipe_ids bigint[];
+BEGIN
+    EXECUTE format(
+        $sql$
+            SELECT ARRAY(
+                SELECT DISTINCT l.recipe_id
+                FROM new_names n
+                JOIN old_names o ON o.id = n.id
+                JOIN %I l ON l.%I = n.id
+                WHERE o.name IS DISTINCT FROM n.name
+            )
+        $sql$,
+        TG_ARGV[0], TG_ARGV[1]
+    ) INTO recipe_ids;
+    PERFORM core_recipe_refresh_search_vector(recipe_ids);
+    RETURN NULL;
+END;
+$$;
+"""
+
+SEARCH_VECTOR_TRIGGERS = """
+CREATE TRIGGER core_recipe_search_vector
+BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+FOR EACH ROW EXECUTE FUNCTION core_recipe_search_vector_row();
+
+CREATE TRIGGER core_recipe_tags_search_insert
+AFTER INSERT ON core_recipe_tags
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_vector_links();
+
+CREATE TRIGGER core_recipe_tags_search_delete
+AFTER DELETE ON core_recipe_tags
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_vector_links();
+
+CREATE TRIGGER core_recipe_ingredients_search_insert
+AFTER INSERT ON core_recipe_ingredients
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_vector_links();
+
+CREATE TRIGGER core_recipe_ingredients_search_delete
+AFTER DELETE ON core_recipe_ingredients
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_vector_links();
+
+-- Transition tables can't be combined with UPDATE OF name.
+CREATE TRIGGER core_tag_search_rename
+AFTER UPDATE ON core_tag
+REFERENCING OLD TABLE AS old_names NEW TABLE AS new_names
+FOR EACH STATEMENT EXECUTE FUNCTION
+core_recipe_search_vector_rename('core_recipe_tags', 'tag_id');
+
+CREATE TRIGGER core_ingredient_search_rename
+AFTER UPDATE ON core_ingredient
+REFERENCING OLD TABLE AS old_names NEW TABLE AS new_names
+FOR EACH STATEMENT EXECUTE FUNCTION
+core_recipe_search_vector_rename('core_recipe_ingredients', 'ingredient_id');
+"""
+
+DROP_SEARCH_VECTOR_TRIGGERS = """
+DROP TRIGGER core_ingredient_search_rename ON core_ingredient;
+DROP TRIGGER core_tag_search_rename ON core_tag;
+DROP TRIGGER core_recipe_ingredients_search_delete ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_search_insert ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_tags_search_delete ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_search_insert ON core_recipe_tags;
+DROP TRIGGER core_recipe_search_vector ON core_recipe;
+DROP FUNCTION core_recipe_search_vector_rename();
+DROP FUNCTION core_recipe_search_vector_links();
+DROP FUNCTION core_recipe_search_vector_row();
+DROP FUNCTION core_recipe_refresh_search_vector(bigint[]);
+"""
+
+BACKFILL_SEARCH_VECTOR = """
+SELECT core_recipe_refresh_search_vector(ARRAY(SELECT id FROM core_recipe));
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_recipe_image_derivatives"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(
+            SEARCH_VECTOR_FUNCTIONS + SEARCH_VECTOR_TRIGGERS,
+            DROP_SEARCH_VECTOR_TRIGGERS,
+        ),
+        # Before the indexes, so they are built once on the filled column.
+        migrations.RunSQL(BACKFILL_SEARCH_VECTOR, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="core_recipe_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="core_recipe_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
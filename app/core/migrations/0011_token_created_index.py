@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index the auth tokens by "created", their last use (see core.tokens),
+    for deleting expired ones. Built concurrently: logins and
+    authentication keep using the table meanwhile.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("authtoken", "0003_tokenproxy"),
+        ("core", "0010_recipe_search"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS authtoken_token_created_idx "  # noqa
+            "ON authtoken_token (created);",
+            "DROP INDEX CONCURRENTLY IF EXISTS authtoken_token_created_idx;",
+        ),
+    ]
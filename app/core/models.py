@@ -11,6 +11,8 @@ from django.contrib.auth.models import (
     BaseUserManager,
     PermissionsMixin,
 )
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 
 def recipe_image_file_path(instance, filename):
@@ -74,6 +76,28 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)  #  # noqa
+    # Resized copies of image, i.e: {"thumbnail": {"webp": path, "jpeg": path}}  # noqa
+    # Filled in the background by recipe.images.
+    image_derivatives = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Title, description, tag and ingredient names, kept up to date by
+    # database triggers (see migration 0010), so bulk writes are covered.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the recipes list: WHERE user_id = ... ORDER BY id DESC  # noqa
+            models.Index(fields=["user", "-id"], name="core_recipe_user_id_desc_idx"),  # noqa
+            # Index only scan for max(updated_at) and count per user (ETags).  # noqa
+            models.Index(fields=["user", "updated_at"], name="core_recipe_user_updated_idx"),  # noqa
+            # Full-text search, and the trigram fallback for typos.
+            GinIndex(fields=["search_vector"], name="core_recipe_search_idx"),
+            GinIndex(
+                fields=["title"],
+                opclasses=["gin_trgm_ops"],
+                name="core_recipe_title_trgm_idx",
+            ),
+        ]
 
     # This is important for how it is displayed, i.e: django admin  noqa
     def __str__(self):
@@ -88,6 +112,18 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Its index also backs the tags list: WHERE user_id = ... ORDER BY name  # noqa
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_tag_name_per_user"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "updated_at"], name="core_tag_user_updated_idx"),  # noqa
+        ]
 
     def __str__(self):
         return self.name
@@ -101,6 +137,17 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_ingredient_name_per_user"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "updated_at"], name="core_ingr_user_updated_idx"),  # noqa
+        ]
 
     def __str__(self):
         return self.name
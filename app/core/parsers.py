@@ -0,0 +1,136 @@
+"""
+JSON parsers for the APIs, backed by orjson when it's installed.
+"""
+import codecs
+import io
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+
+from core.renderers import FastJSONRenderer, NDJSONRenderer, orjson
+
+
+class PayloadTooLarge(APIException):
+    """The request body is over a limit of its parser."""
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _("Request body is too large.")
+    default_code = "payload_too_large"
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser decoding UTF-8 bodies with orjson. Bodies orjson rejects
+    are parsed again by the stdlib, which accepts a few more documents
+    (i.e: integers over 64 bits) and reports errors like before.
+
+    Subclasses may limit the bytes read (max_bytes) and the items of
+    arrays (max_items). Bodies over max_bytes are rejected before
+    they are read past it, whatever their Content-Length says.
+    """
+
+    renderer_class = FastJSONRenderer
+    max_bytes = None
+    max_items = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        self.check_length(parser_context)
+        data = self.loads(self.read(stream), media_type, parser_context)
+        if isinstance(data, list):
+            self.check_items(len(data))
+
+        return data
+
+    def loads(self, body, media_type, parser_context):
+        """Decode a JSON document."""
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is not None and codecs.lookup(encoding).name == "utf-8":
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+    def check_length(self, parser_context):
+        """Reject a declared Content-Length over max_bytes, unread."""
+        request = parser_context.get("request")
+        if self.max_bytes is None or request is None:
+            return
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return
+        if length > self.max_bytes:
+            self.too_large()
+
+    def read(self, stream):
+        """Return the body, raising PayloadTooLarge past max_bytes."""
+        if self.max_bytes is None:
+            return stream.read()
+
+        body = stream.read(self.max_bytes + 1)
+        if len(body) > self.max_bytes:
+            self.too_large()
+        return body
+
+    def check_items(self, count):
+        """Raise PayloadTooLarge if count is over max_items."""
+        if self.max_items is not None and count > self.max_items:
+            raise PayloadTooLarge(
+                _("Request has more than %(max)s items.")
+                % {"max": self.max_items}
+            )
+
+    def too_large(self):
+        raise PayloadTooLarge(
+            _("Request body is larger than %(max)s bytes.")
+            % {"max": self.max_bytes}
+        )
+
+
+class NDJSONParser(FastJSONParser):
+    """
+    Newline delimited JSON: returns the list of the documents, one per
+    line. Blank lines are skipped. Lines are read and parsed one at a
+    time, max_items stops reading at the first document over it.
+    """
+
+    media_type = "application/x-ndjson"
+    renderer_class = NDJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        self.check_length(parser_context)
+        documents = []
+        for number, line in enumerate(self.lines(stream), start=1):
+            if not line.strip():
+                continue
+            self.check_items(len(documents) + 1)
+            try:
+                documents.append(self.loads(line, media_type, parser_context))  # noqa
+            except ParseError as exc:
+                raise ParseError(f"Line {number}: {exc.detail}")
+
+        return documents
+
+    def lines(self, stream):
+        """Yield the lines of the body, raising PayloadTooLarge past max_bytes."""  # noqa
+        if self.max_bytes is None:
+            yield from stream
+            return
+
+        remaining = self.max_bytes
+        while True:
+            line = stream.readline(remaining + 1)
+            if not line:
+                return
+            remaining -= len(line)
+            if remaining < 0:
+                self.too_large()
+            yield line
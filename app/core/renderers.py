@@ -0,0 +1,88 @@
+"""
+JSON renderer for the APIs, backed by orjson when it's installed.
+
+The output is the same as DRF's JSONRenderer, byte for byte. Values
+orjson doesn't encode natively (Decimal, datetime, lazy strings, ...)
+go through DRF's encoder, like they do with the stdlib json. Anything
+orjson refuses, i.e: integers over 64 bits, is rendered by the stdlib.
+The one difference: NaN and infinite floats render as null, where the
+stdlib raises (STRICT_JSON).
+"""
+from rest_framework.renderers import JSONRenderer
+
+from core.instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # Optional, DRF's stdlib renderer is used instead.
+    orjson = None
+
+
+# DRF renders datetimes with milliseconds and "Z", not orjson's format.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+# Escaped by DRF, so the JSON is also valid JavaScript.
+LINE_SEPARATORS = (
+    ("\u2028".encode(), b"\\u2028"),
+    ("\u2029".encode(), b"\\u2029"),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson. Indented output (i.e: for the
+    browsable API) and non default JSON settings use the stdlib.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("render"):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b""
+        if not self._can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+        return ret
+
+    def _can_use_orjson(self, accepted_media_type, renderer_context):
+        """Whether orjson renders what the stdlib would."""
+        if orjson is None:
+            return False
+        if not self.compact or self.ensure_ascii or not self.strict:
+            return False
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return indent is None
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    Newline delimited JSON: one compact document per line, one per item
+    when data is a list.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, (list, tuple)):
+            data = [data]
+
+        # Never indented, a line is a document.
+        render = super().render
+        return b"".join(render(item) + b"\n" for item in data)
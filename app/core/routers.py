@@ -0,0 +1,74 @@
+"""
+Database router sending reads to replicas.
+
+Reads only go to a replica inside replica_reads(), which views enter
+for requests that can be served slightly stale. Everything else reads
+and writes the primary ("default"), so a request that writes reads its
+own writes. One replica is picked per block: replicas lag behind the
+primary by different amounts, and mixing them within a response could
+show rows going back in time.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Replica of the current replica_reads() block, if any.
+_replica = ContextVar("replica", default=None)
+
+
+def get_replicas():
+    """Return the aliases of the replica databases."""
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _is_primary(alias):
+    """
+    Whether the alias connects to the primary database, i.e: a test
+    mirror. Its reads would miss the primary's uncommitted writes.
+    """
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict
+    replica = connections[alias].settings_dict
+    return all(
+        replica[name] == primary[name] for name in ("HOST", "PORT", "NAME")
+    )
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads in the block to one replica (if there are any)."""
+    replicas = get_replicas()
+    replica = random.choice(replicas) if replicas else None
+    if replica is not None and _is_primary(replica):
+        replica = None
+    token = _replica.set(replica)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Route reads in replica_reads() blocks to a replica."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary.
+        if db in get_replicas():
+            return False
+        return None
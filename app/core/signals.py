@@ -0,0 +1,28 @@
+"""
+Signal handlers for the core app.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    """Drop a changed or deleted token from the auth cache."""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drop the tokens of a changed user from the token cache, i.e:
+    deactivated, new password or deleted. Their recent logins no
+    longer match by themselves (see core.authentication.LoginCache).
+    """
+    token_cache.delete_user(instance.pk)
@@ -0,0 +1,61 @@
+"""
+Test helpers for the queries of API requests.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.instrumentation import repeated_queries
+
+
+class QueryRecorder:
+    """Execute wrapper keeping the SQL of the queries, not interpolated."""
+
+    def __init__(self):
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.sql.append(sql)
+        return execute(sql, params, many, context)
+
+
+class QueryAssertionsMixin:
+    """
+    TestCase mixin asserting query budgets, i.e:
+        with self.assertMaxQueries(4):
+            res = self.client.get(RECIPES_URL)
+    """
+
+    # Runs of the same SELECT that fail the test, i.e: a serializer
+    # querying each item's relation. None is QUERY_REPEAT_THRESHOLD.
+    query_repeat_threshold = None
+
+    @contextmanager
+    def assertMaxQueries(self, maximum, using=DEFAULT_DB_ALIAS):
+        """
+        Fail if the block runs more than `maximum` queries, or the same
+        SELECT query_repeat_threshold times or more.
+        """
+        recorder = QueryRecorder()
+        with connections[using].execute_wrapper(recorder):
+            yield recorder
+
+        numbered = "\n".join(
+            f"{i}. {sql}" for i, sql in enumerate(recorder.sql, start=1)
+        )
+        if len(recorder.sql) > maximum:
+            self.fail(
+                f"{len(recorder.sql)} queries executed, at most {maximum} "
+                f"expected\nCaptured queries were:\n{numbered}"
+            )
+
+        threshold = (
+            self.query_repeat_threshold or settings.QUERY_REPEAT_THRESHOLD
+        )
+        for shape, count in repeated_queries(recorder.sql, threshold).items():
+            self.fail(
+                f"The same query ran {count} times, missing "
+                f"select_related() or prefetch_related()? {shape}\n"
+                f"Captured queries were:\n{numbered}"
+            )
@@ -0,0 +1,137 @@
+"""
+Tests for the cached token authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse("user:me")
+
+
+def create_user(email="user@example.com", password="testpass123"):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating requests with cached tokens."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_warm_request_no_auth_query(self):
+        """Test only the first request looks the token up."""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # The view loads the user itself.
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_invalid_token_not_cached(self):
+        """Test an invalid token is rejected on every request."""
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(token_cache.get("invalid"))
+
+    def test_deleted_token_rejected(self):
+        """Test deleting a token invalidates the cached lookup."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates the cached lookup."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_changed_user_reloaded(self):
+        """Test changes to the user are seen on the next request."""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"name": "New name"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["name"], "New name")
+
+    def test_update_keeps_unseen_changes(self):
+        """Test an update doesn't write back fields changed since caching."""
+        self.client.get(ME_URL)
+        # No signal: the cached entry stays.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=make_password("newpass123")
+        )
+
+        res = self.client.patch(ME_URL, {"name": "New name"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, "New name")
+        self.assertTrue(self.user.check_password("newpass123"))
+        self.assertTrue(self.user.is_active)
+
+
+class TokenCacheTests(TestCase):
+    """Test the shared token cache."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+
+    def test_shared_between_processes(self):
+        """Test a lookup cached by one process is seen by the others."""
+        TokenCache().set(self.token)
+
+        user, token = TokenCache().get(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.created, self.token.created)
+
+    def test_user_change_seen_by_other_processes(self):
+        """Test a changed user fails the entries every process reads."""
+        TokenCache().set(self.token)
+
+        TokenCache().delete_user(self.user.pk)
+
+        self.assertIsNone(TokenCache().get(self.token.key))
+
+    def test_user_fields_loaded_fresh(self):
+        """Test only the user id is cached, the rest comes from the database."""
+        token_cache.set(self.token)
+        get_user_model().objects.filter(pk=self.user.pk).update(name="Changed")
+
+        user, _ = token_cache.get(self.token.key)
+
+        self.assertEqual(user.get_deferred_fields(), {
+            field.attname for field in get_user_model()._meta.concrete_fields
+            if not field.primary_key
+        })
+        self.assertEqual(user.name, "Changed")
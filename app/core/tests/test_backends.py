@@ -0,0 +1,199 @@
+"""
+Tests for the PostgreSQL backend health checks and pooling.
+"""
+import time
+from unittest.mock import patch
+
+import psycopg2
+from psycopg2 import extensions
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase
+
+from core.backends.postgresql.base import DatabaseWrapper
+from core.backends.postgresql.pool import ConnectionPool, close_pools
+
+
+def terminate(pid):
+    """Close the server side of a connection, and wait until it's gone."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+        for _ in range(100):
+            cursor.execute(
+                "SELECT 1 FROM pg_stat_activity WHERE pid = %s", [pid]
+            )
+            if not cursor.fetchone():
+                return
+            time.sleep(0.01)
+
+
+class ConnectionPoolTests(TestCase):
+    """Test the in-process connection pool."""
+
+    def connect(self):
+        return psycopg2.connect(**connection.get_connection_params())
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(**options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuses_connections(self):
+        """Test connections given back are handed out again."""
+        pool = self.make_pool()
+        conn = pool.get(self.connect)
+        pool.put(conn)
+
+        self.assertIs(pool.get(self.connect), conn)
+        self.assertEqual(pool.stats["opened"], 1)
+        self.assertEqual(pool.stats["reused"], 1)
+
+    def test_rolls_back_open_transaction(self):
+        """Test a transaction left open is rolled back on return."""
+        pool = self.make_pool()
+        conn = pool.get(self.connect)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        pool.put(conn)
+
+        self.assertEqual(
+            conn.info.transaction_status, extensions.TRANSACTION_STATUS_IDLE
+        )
+        self.assertIs(pool.get(self.connect), conn)
+
+    def test_discards_unusable(self):
+        """Test closed or unreusable connections aren't kept."""
+        pool = self.make_pool()
+        closed = pool.get(self.connect)
+        closed.close()
+        pool.put(closed)
+        dropped = pool.get(self.connect)
+        pool.put(dropped, reusable=False)
+
+        conn = pool.get(self.connect)
+
+        self.assertTrue(dropped.closed)
+        self.assertIsNot(conn, closed)
+        self.assertIsNot(conn, dropped)
+        self.assertEqual(pool.stats["discarded"], 2)
+        pool.put(conn)
+
+    def test_health_check_replaces_terminated(self):
+        """Test idle connections the server closed are replaced."""
+        pool = self.make_pool()
+        conn = pool.get(self.connect)
+        pool.put(conn)
+        terminate(conn.info.backend_pid)
+
+        new = pool.get(self.connect)
+
+        self.assertIsNot(new, conn)
+        self.assertEqual(pool.stats["discarded"], 1)
+        with new.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        pool.put(new)
+
+    def test_timeout(self):
+        """Test get() fails when every connection is in use."""
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        conn = pool.get(self.connect)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.get(self.connect)
+
+        self.assertEqual(pool.stats["waits"], 1)
+        pool.put(conn)
+        # The slot is free again.
+        pool.put(pool.get(self.connect))
+
+
+class DatabaseWrapperTests(TestCase):
+    """Test the backend connection settings."""
+
+    def make_wrapper(self, **settings):
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, **settings}, connection.alias
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def test_pool_requires_non_persistent(self):
+        """Test the pool can't be combined with CONN_MAX_AGE."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=60, OPTIONS={"pool": True})
+
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.check_settings()
+
+    def test_pool_excludes_transaction_pooling(self):
+        """Test the pool can't be used behind PgBouncer."""
+        wrapper = self.make_wrapper(
+            OPTIONS={"pool": True}, TRANSACTION_POOLING=True
+        )
+
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.check_settings()
+
+    def test_health_check_reconnects(self):
+        """Test a persistent connection closed by the server is replaced."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        pid = self.backend_pid(wrapper)
+        terminate(pid)
+        # Next request.
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
+
+    def test_health_check_before_transaction(self):
+        """Test a request starting with a transaction is checked too."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        pid = self.backend_pid(wrapper)
+        terminate(pid)
+        wrapper.close_if_unusable_or_obsolete()
+
+        # What atomic() does first, no query is checked in the block.
+        wrapper.set_autocommit(False)
+
+        self.assertNotEqual(wrapper.connection.info.backend_pid, pid)
+        wrapper.set_autocommit(True)
+
+    def test_health_check_once_per_request(self):
+        """Test the connection is checked on its first use only."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        self.backend_pid(wrapper)
+        wrapper.close_if_unusable_or_obsolete()
+
+        with patch.object(
+            wrapper, "is_usable", wraps=wrapper.is_usable
+        ) as is_usable:
+            self.backend_pid(wrapper)
+            self.backend_pid(wrapper)
+
+        is_usable.assert_called_once_with()
+
+    def test_pool_shares_connections(self):
+        """Test closed connections go back to the pool for reuse."""
+        self.addCleanup(close_pools)
+        first = self.make_wrapper(OPTIONS={"pool": {"max_size": 2}})
+        second = self.make_wrapper(OPTIONS={"pool": {"max_size": 2}})
+        pid = self.backend_pid(first)
+        first.close()
+
+        self.assertEqual(self.backend_pid(second), pid)
+        self.assertIsNone(first.connection)
+
+    def test_transaction_pooling_cursors(self):
+        """Test server side cursors are only used inside transactions."""
+        wrapper = self.make_wrapper(TRANSACTION_POOLING=True)
+        wrapper.ensure_connection()
+
+        self.assertIsNone(wrapper.create_cursor(name="rows").name)
+        wrapper.set_autocommit(False)
+        self.assertEqual(wrapper.create_cursor(name="rows").name, "rows")
+        wrapper.rollback()
+        wrapper.set_autocommit(True)
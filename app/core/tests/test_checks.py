@@ -0,0 +1,57 @@
+"""
+Tests for the checks of how the app is served.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_shared_caches
+
+
+def caches_with(**backends):
+    """Return settings.CACHES with the backends of some aliases set."""
+    return {
+        alias: {**config, "BACKEND": backends.get(alias, config["BACKEND"])}
+        for alias, config in settings.CACHES.items()
+    }
+
+
+MEMCACHED = "django.core.cache.backends.memcached.PyMemcacheCache"
+LOCMEM = "django.core.cache.backends.locmem.LocMemCache"
+
+
+class SharedCachesTests(SimpleTestCase):
+    """Test processes are only started with caches they share."""
+
+    @override_settings(CACHES=caches_with(api=LOCMEM))
+    def test_single_process(self):
+        """Test one process may keep its caches in memory."""
+        check_shared_caches(1)
+
+    @override_settings(
+        CACHES=caches_with(default=LOCMEM, api=LOCMEM, throttle=LOCMEM)
+    )
+    def test_local_caches_rejected(self):
+        """Test several processes need shared caches."""
+        with self.assertRaisesMessage(
+            ImproperlyConfigured, "caches default, api, throttle"
+        ):
+            check_shared_caches(3)
+
+    @override_settings(
+        CACHES=caches_with(default=MEMCACHED, api=MEMCACHED, throttle=MEMCACHED)  # noqa
+    )
+    def test_shared_caches(self):
+        """Test several processes may share memcached."""
+        check_shared_caches(3)
+
+    @override_settings(
+        CACHES=caches_with(
+            default=MEMCACHED,
+            api="django.core.cache.backends.dummy.DummyCache",
+            throttle=MEMCACHED,
+        )
+    )
+    def test_response_cache_off(self):
+        """Test the response cache can be turned off instead."""
+        check_shared_caches(3)
@@ -1,15 +1,24 @@
 """
 Test custom Django managment commands
 """
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import (
     patch,
 )  # Helps replacing db methods by mocking code hta simulates db behaviors. # noqa
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
 
 
 @patch(
@@ -44,3 +53,50 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)  # Checks 6 outcomes # noqa
         patched_check.assert_called_with(databases=["default"])  # Use default db # noqa
+
+
+class BenchmarkQueriesCommandTests(TestCase):
+    """Test the benchmark_queries command."""
+
+    def test_benchmark_queries_prints_plans(self):
+        """Test query plans are printed and seeded data is rolled back."""
+        out = StringIO()
+        call_command(
+            "benchmark_queries",
+            recipes=20,
+            tags=5,
+            ingredients=5,
+            per_recipe=2,
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertIn("== recipes", output)
+        self.assertIn("== tags assigned only", output)
+        self.assertIn("Execution Time", output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class DeleteExpiredTokensCommandTests(TestCase):
+    """Test the delete_expired_tokens command."""
+
+    def test_deletes_expired_tokens_in_batches(self):
+        """Test every expired token is deleted, live ones kept."""
+        users = [
+            get_user_model().objects.create_user(
+                email=f"user{i}@example.com", password="testpass123"
+            )
+            for i in range(5)
+        ]
+        tokens = [Token.objects.create(user=user) for user in users]
+        expired = timezone.now() - timedelta(seconds=settings.TOKEN_TTL + 1)
+        Token.objects.filter(
+            key__in=[token.key for token in tokens[:4]]
+        ).update(created=expired)
+        out = StringIO()
+
+        with patch("core.management.commands.delete_expired_tokens.time.sleep"):  # noqa
+            call_command("delete_expired_tokens", batch_size=2, stdout=out)
+
+        self.assertEqual(list(Token.objects.all()), [tokens[4]])
+        self.assertIn("Deleted 4 expired tokens, 1 live.", out.getvalue())
@@ -0,0 +1,275 @@
+"""
+Tests for the request timings, metrics and query checks.
+"""
+import re
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.middleware import RequestMetricsMiddleware
+from core.models import Recipe
+from core.testing import QueryAssertionsMixin
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+METRICS_URL = reverse("metrics")
+SERVER_TIMING = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=[\d.]+, '
+    r"render;dur=[\d.]+, total;dur=[\d.]+"
+)
+
+
+def sample(name, **labels):
+    """Return the value of a metric of this process, 0 if not there."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTests(TestCase):
+    """Test measuring API requests."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user, title="Recipe", time_minutes=5, price=1
+        )
+
+    def test_server_timing_counts_queries(self):
+        """Test the header reports the queries the request ran."""
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(RECIPES_URL)
+
+        match = SERVER_TIMING.fullmatch(res["Server-Timing"])
+        self.assertIsNotNone(match, res["Server-Timing"])
+        self.assertEqual(int(match[1]), len(context.captured_queries))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """Test the header can be left out."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", res)
+
+    def test_request_counted(self):
+        """Test requests are counted by view, with their SQL and size."""
+        labels = {"view": "recipe:recipe-list"}
+        requests = sample(
+            "http_request_duration_seconds_count",
+            method="GET",
+            status="200",
+            **labels,
+        )
+        queries = sample("http_request_db_queries_total", **labels)
+        size = sample("http_response_size_bytes_sum", **labels)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            sample(
+                "http_request_duration_seconds_count",
+                method="GET",
+                status="200",
+                **labels,
+            ),
+            requests + 1,
+        )
+        self.assertGreater(
+            sample("http_request_db_queries_total", **labels), queries
+        )
+        self.assertEqual(
+            sample("http_response_size_bytes_sum", **labels),
+            size + len(res.content),
+        )
+
+    def test_unknown_methods_grouped(self):
+        """Test made up methods don't add a label each."""
+        before = sample(
+            "http_request_duration_seconds_count",
+            view="recipe:recipe-list",
+            method="other",
+            status="405",
+        )
+
+        self.client.generic("BREW", RECIPES_URL)
+
+        self.assertEqual(
+            sample(
+                "http_request_duration_seconds_count",
+                view="recipe:recipe-list",
+                method="other",
+                status="405",
+            ),
+            before + 1,
+        )
+
+
+class MetricsViewTests(TestCase):
+    """Test the Prometheus endpoint."""
+
+    @override_settings(METRICS_TOKEN="")
+    def test_not_served_without_token(self):
+        """Test the metrics aren't public without a token set."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self):
+        """Test scrapers need the token."""
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res["WWW-Authenticate"], "Bearer")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics(self):
+        """Test the request metrics and live tokens are exported."""
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        Token.objects.create(user=user)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        content = res.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", content)
+        self.assertIn("\nauth_live_tokens 1.0\n", content)
+
+
+class InstrumentationTests(SimpleTestCase):
+    """Test the timers outside of requests."""
+
+    databases = ["default"]
+
+    def test_timed_leaves_out_sql(self):
+        """Test SQL within timed blocks is only counted as SQL."""
+        with instrumentation.measure() as metrics:
+            with instrumentation.timed("serialize"):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_sleep(0.05)")
+
+        self.assertEqual(metrics.queries, 1)
+        self.assertGreaterEqual(metrics.db, 0.05)
+        self.assertLess(metrics.serialize, 0.05)
+
+    def test_nested_timed_counted_once(self):
+        """Test nested blocks (i.e: nested serializers) aren't added twice."""
+        with instrumentation.measure() as metrics:
+            with instrumentation.timed("serialize"):
+                with instrumentation.timed("serialize"):
+                    pass
+                inner = metrics.serialize
+
+        self.assertEqual(inner, 0)
+        self.assertGreater(metrics.serialize, 0)
+
+
+def select_users(request):
+    """View querying the users one by one, an N+1 query."""
+    for pk in range(3):
+        list(get_user_model().objects.filter(pk=pk))
+    return HttpResponse("ok")
+
+
+class QueryDetectorTests(TestCase):
+    """Test reporting repeated and slow queries of requests."""
+
+    def test_sql_shape(self):
+        """Test IN lists of any length have the same shape."""
+        self.assertEqual(
+            instrumentation.sql_shape('WHERE "id" IN (%s, %s,%s)'),
+            instrumentation.sql_shape('WHERE "id" IN (%s)'),
+        )
+
+    @override_settings(QUERY_DETECTOR="log")
+    def test_repeated_query_logged(self):
+        """Test the same SELECT run in a loop is logged."""
+        middleware = RequestMetricsMiddleware(select_users)
+
+        with self.assertLogs("core.instrumentation", "WARNING") as logs:
+            middleware(RequestFactory().get("/users/"))
+
+        self.assertIn("GET /users/ ran the same query 3 times", logs.output[0])  # noqa
+
+    @override_settings(QUERY_DETECTOR="raise")
+    def test_repeated_query_raises(self):
+        """Test the same SELECT run in a loop can fail the request."""
+        middleware = RequestMetricsMiddleware(select_users)
+
+        with self.assertRaises(instrumentation.RepeatedQueriesError):
+            middleware(RequestFactory().get("/users/"))
+
+    @override_settings(QUERY_DETECTOR="log", SLOW_QUERY_MS=10)
+    def test_slow_query_logged(self):
+        """Test queries over SLOW_QUERY_MS are logged."""
+
+        def view(request):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(0.02)")
+            return HttpResponse("ok")
+
+        with self.assertLogs("core.instrumentation", "WARNING") as logs:
+            RequestMetricsMiddleware(view)(RequestFactory().get("/"))
+
+        self.assertIn("ran a slow query", logs.output[0])
+        self.assertIn("pg_sleep", logs.output[0])
+
+    @override_settings(QUERY_DETECTOR="")
+    def test_not_detecting_by_default(self):
+        """Test the SQL isn't kept without QUERY_DETECTOR."""
+        with patch("core.instrumentation.check_queries") as patched_check:
+            RequestMetricsMiddleware(select_users)(RequestFactory().get("/"))
+
+        patched_check.assert_not_called()
+
+
+class QueryAssertionsTests(QueryAssertionsMixin, TestCase):
+    """Test the query budget assertions."""
+
+    def test_within_budget(self):
+        """Test blocks within budget pass."""
+        with self.assertMaxQueries(2) as recorder:
+            list(get_user_model().objects.all())
+
+        self.assertEqual(len(recorder.sql), 1)
+
+    def test_over_budget(self):
+        """Test blocks running more queries fail, listing them."""
+        with self.assertRaisesMessage(
+            AssertionError, "2 queries executed, at most 1 expected"
+        ):
+            with self.assertMaxQueries(1):
+                list(get_user_model().objects.all())
+                list(Recipe.objects.all())
+
+    def test_repeated_query(self):
+        """Test repeated SELECTs fail, even within budget."""
+        with self.assertRaisesMessage(
+            AssertionError, "The same query ran 3 times"
+        ):
+            with self.assertMaxQueries(10):
+                select_users(None)
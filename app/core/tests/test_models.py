@@ -17,6 +17,7 @@ the mocked version during testing.
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -97,6 +98,25 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user can't have two tags with the same name."""
+        user = create_user()
+        other_user = create_user(email="other@example.com")
+        models.Tag.objects.create(user=user, name="Vegan")
+        # Same name for another user is fine.
+        models.Tag.objects.create(user=other_user, name="Vegan")
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Vegan")
+
+    def test_ingredient_name_unique_per_user(self):
+        """Test a user can't have two ingredients with the same name."""
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name="Salt")
+
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name="Salt")
+
     @patch("core.models.uuid.uuid4")
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
@@ -0,0 +1,190 @@
+"""
+Tests for the orjson backed JSON renderers and parsers.
+They must behave like DRF's stdlib based JSON classes.
+"""
+import datetime
+import io
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser, NDJSONParser, PayloadTooLarge
+from core.renderers import FastJSONRenderer, NDJSONRenderer
+
+
+PAYLOAD = {
+    "id": 1,
+    "price": Decimal("5.50"),
+    "created": datetime.datetime(
+        2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc
+    ),
+    "naive": datetime.datetime(2024, 5, 1, 12, 30),
+    "day": datetime.date(2024, 5, 1),
+    "time": datetime.time(9, 15, 30, 250000),
+    "duration": datetime.timedelta(minutes=90),
+    "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "lazy": gettext_lazy("Lazy"),
+    "title": "Café \"quoted\" \\ \n\t\x01 \u2028 \u2029 ñ \U0001f600",
+    "tags": (1, 2),
+    "ingredients": frozenset(["Rice"]),
+    "nested": OrderedDict([("z", None), ("a", [True, False, 1.5])]),
+    "empty": {},
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test rendering like DRF's JSONRenderer."""
+
+    def _assert_same(self, data, media_type=None, context=None):
+        expected = JSONRenderer().render(data, media_type, context)
+        self.assertEqual(
+            FastJSONRenderer().render(data, media_type, context), expected
+        )
+
+    def test_render_like_json_renderer(self):
+        """Test Decimal, datetimes, lazy strings and escapes."""
+        self._assert_same(PAYLOAD)
+        self._assert_same([PAYLOAD, PAYLOAD])
+
+    def test_render_none(self):
+        """Test None renders an empty body."""
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_render_indent(self):
+        """Test indented output, i.e: asked in the media type."""
+        self._assert_same(PAYLOAD, "application/json; indent=4")
+        self._assert_same(PAYLOAD, None, {"indent": 2})
+
+    def test_render_big_integers(self):
+        """Test integers over 64 bits fall back to the stdlib."""
+        self._assert_same({"big": 2 ** 70, "negative": -(2 ** 70)})
+
+    def test_render_unsupported_type(self):
+        """Test types no encoder knows raise like before."""
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({"object": object()})
+
+    def test_render_nan_as_null(self):
+        """Test NaN renders as null, instead of raising."""
+        self.assertEqual(
+            FastJSONRenderer().render({"nan": float("nan")}), b'{"nan":null}'
+        )
+
+    def test_render_without_orjson(self):
+        """Test the stdlib is used when orjson isn't installed."""
+        with patch("core.renderers.orjson", None):
+            self._assert_same(PAYLOAD)
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test parsing like DRF's JSONParser."""
+
+    def _parse(self, parser, body, encoding="utf-8"):
+        return parser.parse(
+            io.BytesIO(body), "application/json", {"encoding": encoding}
+        )
+
+    def _assert_same(self, body, encoding="utf-8"):
+        self.assertEqual(
+            self._parse(FastJSONParser(), body, encoding),
+            self._parse(JSONParser(), body, encoding),
+        )
+
+    def test_parse_like_json_parser(self):
+        """Test parsing a document."""
+        body = JSONRenderer().render(PAYLOAD)
+
+        self._assert_same(body)
+
+    def test_parse_big_integers(self):
+        """Test integers over 64 bits fall back to the stdlib."""
+        self._assert_same(b'{"big": 1180591620717411303424}')
+
+    def test_parse_other_encoding(self):
+        """Test bodies not in UTF-8 use the stdlib."""
+        self._assert_same('{"title": "Café"}'.encode("latin-1"), "latin-1")
+
+    def test_parse_errors(self):
+        """Test invalid bodies raise the same errors."""
+        for body in (b"{", b'{"price": NaN}', b"", b"[1,]"):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    self._parse(JSONParser(), body)
+                with self.assertRaises(ParseError) as error:
+                    self._parse(FastJSONParser(), body)
+
+                self.assertEqual(
+                    str(error.exception.detail),
+                    str(expected.exception.detail),
+                )
+
+    def test_parse_without_orjson(self):
+        """Test the stdlib is used when orjson isn't installed."""
+        with patch("core.parsers.orjson", None):
+            self._assert_same(b'{"title": "Rice", "tags": [1, 2]}')
+
+
+class NDJSONTests(SimpleTestCase):
+    """Test the newline delimited JSON renderer and parser."""
+
+    def test_render_one_line_per_item(self):
+        """Test lists render one document per line."""
+        body = NDJSONRenderer().render(
+            [PAYLOAD, {"id": 2}], "application/x-ndjson; indent=4"
+        )
+
+        lines = body.split(b"\n")
+        self.assertEqual(lines[0], JSONRenderer().render(PAYLOAD))
+        self.assertEqual(lines[1:], [b'{"id":2}', b""])
+
+    def test_render_document(self):
+        """Test anything else renders as a single line."""
+        renderer = NDJSONRenderer()
+
+        self.assertEqual(renderer.render({"id": 1}), b'{"id":1}\n')
+        self.assertEqual(renderer.render([]), b"")
+        self.assertEqual(renderer.render(None), b"")
+
+    def test_parse(self):
+        """Test parsing a document per line, skipping blank lines."""
+        body = NDJSONRenderer().render([PAYLOAD, [1, 2]]) + b"\n \n"
+
+        self.assertEqual(
+            NDJSONParser().parse(io.BytesIO(body)),
+            [FastJSONParser().parse(io.BytesIO(body.split(b"\n")[0])), [1, 2]],
+        )
+        self.assertEqual(NDJSONParser().parse(io.BytesIO(b"")), [])
+
+    def test_parse_error_line(self):
+        """Test errors report the line number."""
+        body = b'{"id": 1}\n\n{"id":\n'
+
+        with self.assertRaises(ParseError) as error:
+            NDJSONParser().parse(io.BytesIO(body))
+
+        self.assertTrue(str(error.exception.detail).startswith("Line 3: "))
+
+    def test_parse_limits(self):
+        """Test bodies are read no further than their limits."""
+        parser = NDJSONParser()
+        parser.max_bytes = 30
+        parser.max_items = 2
+        stream = io.BytesIO(b'{"id": 1}\n' * 4)
+
+        with self.assertRaisesMessage(PayloadTooLarge, "more than 2 items"):
+            parser.parse(stream)
+        self.assertEqual(stream.tell(), 30)
+
+        stream = io.BytesIO(b'{"title": "%s"}\n' % (b"x" * 100))
+        with self.assertRaisesMessage(PayloadTooLarge, "30 bytes"):
+            parser.parse(stream)
+        self.assertEqual(stream.tell(), 31)
@@ -0,0 +1,78 @@
+"""
+Tests for the read replica database router.
+"""
+from unittest.mock import patch
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase, override_settings
+
+from core.models import Recipe, Tag
+from core.routers import ReplicaRouter, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=["fake_replica1", "fake_replica2"])
+class ReplicaRouterTests(SimpleTestCase):
+    """Test routing queries to the primary and the replicas."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        replica = {**connection.settings_dict, "HOST": "replica.example.com"}
+        databases = patch.dict(
+            connections.databases,
+            {"fake_replica1": replica, "fake_replica2": dict(replica)},
+        )
+        databases.start()
+        self.addCleanup(databases.stop)
+        self.addCleanup(self._close_replicas)
+
+    def _close_replicas(self):
+        for alias in ("fake_replica1", "fake_replica2"):
+            if hasattr(connections._connections, alias):
+                del connections[alias]
+
+    def test_primary_by_default(self):
+        """Test reads outside replica_reads() use the primary."""
+        self.assertIsNone(self.router.db_for_read(Recipe))
+        self.assertIsNone(self.router.db_for_write(Recipe))
+
+    def test_replica_reads(self):
+        """Test reads in replica_reads() use one replica, writes don't."""
+        with replica_reads():
+            replica = self.router.db_for_read(Recipe)
+
+            self.assertIn(replica, ["fake_replica1", "fake_replica2"])
+            self.assertEqual(self.router.db_for_read(Tag), replica)
+            self.assertIsNone(self.router.db_for_write(Recipe))
+
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test replica_reads() reads the primary without replicas."""
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_replica_of_primary_database(self):
+        """Test replicas pointing at the primary read through it."""
+        primary_host = connection.settings_dict["HOST"]
+        connections.databases["fake_replica1"]["HOST"] = primary_host
+
+        with override_settings(DATABASE_REPLICAS=["fake_replica1"]):
+            with replica_reads():
+                self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_relations_across_replicas(self):
+        """Test objects read from a replica can be linked to others."""
+        recipe = Recipe(id=1)
+        recipe._state.db = "fake_replica1"
+        tag = Tag(id=1)
+        tag._state.db = DEFAULT_DB_ALIAS
+
+        self.assertTrue(self.router.allow_relation(recipe, tag))
+        tag._state.db = "other"
+        self.assertIsNone(self.router.allow_relation(recipe, tag))
+
+    def test_no_migrations_on_replicas(self):
+        """Test migrations only run on the primary."""
+        self.assertFalse(self.router.allow_migrate("fake_replica1", "core"))
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, "core"))
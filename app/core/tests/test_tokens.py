@@ -0,0 +1,137 @@
+"""
+Tests for expiring and rotating auth tokens.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.tokens import issue_token, live_tokens
+
+
+ME_URL = reverse("user:me")
+TOKEN_URL = reverse("user:token")
+CREDENTIALS = {"email": "user@example.com", "password": "testpass123"}
+
+
+def used_ago(token, seconds):
+    """Set the token's last use, return its timestamp."""
+    created = timezone.now() - timedelta(seconds=seconds)
+    Token.objects.filter(key=token.key).update(created=created)
+    token.created = created
+    return created
+
+
+class ExpiringTokenTests(TestCase):
+    """Test expiring and refreshing tokens of requests."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = get_user_model().objects.create_user(**CREDENTIALS)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_expired_token_rejected(self):
+        """Test a token unused for TOKEN_TTL is rejected."""
+        used_ago(self.token, settings.TOKEN_TTL + 1)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.data["detail"], "Token has expired.")
+
+    def test_used_token_refreshed(self):
+        """Test using a token moves its expiry, once per interval."""
+        created = used_ago(self.token, settings.TOKEN_TTL - 10)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.created, created)
+
+        # Only the view's user query.
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    def test_fresh_token_not_written(self):
+        """Test tokens used within the interval aren't refreshed."""
+        created = used_ago(self.token, settings.TOKEN_REFRESH_INTERVAL - 10)
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.created, created)
+
+    def test_cached_token_expiry_rechecked(self):
+        """Test a cached token that looks expired is looked up again."""
+        # As if another process refreshed the token since.
+        token_cache.set(Token(
+            key=self.token.key,
+            user=self.user,
+            created=self.token.created - timedelta(seconds=settings.TOKEN_TTL + 1),  # noqa
+        ))
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_live_tokens(self):
+        """Test only tokens that haven't expired are counted."""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="testpass123"
+        )
+        used_ago(Token.objects.create(user=other), settings.TOKEN_TTL + 1)
+
+        self.assertEqual(live_tokens(), 1)
+
+
+class TokenRotationTests(TestCase):
+    """Test logging in for a new token after expiry."""
+
+    def setUp(self):
+        caches["throttle"].clear()
+        caches["default"].clear()
+        self.user = get_user_model().objects.create_user(**CREDENTIALS)
+        self.client = APIClient()
+
+    def test_login_rotates_expired_token(self):
+        """Test logging in replaces an expired token with a new key."""
+        token = Token.objects.create(user=self.user)
+        used_ago(token, settings.TOKEN_TTL + 1)
+
+        res = self.client.post(TOKEN_URL, CREDENTIALS)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["token"], token.key)
+        self.assertFalse(Token.objects.filter(key=token.key).exists())
+        self.assertEqual(Token.objects.get(user=self.user).key, res.data["token"])  # noqa
+
+    def test_repeated_login_after_expiry(self):
+        """Test a recent login doesn't return a token that expired since."""
+        first = self.client.post(TOKEN_URL, CREDENTIALS).data["token"]
+        used_ago(Token.objects.get(key=first), settings.TOKEN_TTL + 1)
+
+        res = self.client.post(TOKEN_URL, CREDENTIALS)
+
+        self.assertNotEqual(res.data["token"], first)
+
+    def test_login_refreshes_token(self):
+        """Test logging in moves the expiry of the user's token."""
+        token = Token.objects.create(user=self.user)
+        created = used_ago(token, settings.TOKEN_TTL - 10)
+
+        self.assertEqual(issue_token(self.user), token)
+        token.refresh_from_db()
+        self.assertGreater(token.created, created)
@@ -0,0 +1,27 @@
+"""
+Tests for serving uploaded files.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+
+class MediaTests(SimpleTestCase):
+    """Test uploads aren't served by Django in production."""
+
+    def test_not_served_without_debug(self):
+        """Test the proxy serves uploads, not the app."""
+        self.assertFalse(settings.DEBUG)
+        with tempfile.TemporaryDirectory() as media_root:
+            os.makedirs(os.path.join(media_root, "uploads"))
+            with open(
+                os.path.join(media_root, "uploads", "image.jpg"), "wb"
+            ) as image:
+                image.write(b"jpeg")
+
+            with override_settings(MEDIA_ROOT=media_root):
+                res = self.client.get(f"{settings.MEDIA_URL}uploads/image.jpg")  # noqa
+
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,92 @@
+"""
+Expiry and rotation of auth tokens.
+
+A token expires TOKEN_TTL seconds after it was last used. DRF's Token
+has no expiry field, so its "created" timestamp is used as the time of
+last use: using a token moves it to now, at most once every
+TOKEN_REFRESH_INTERVAL seconds so most requests don't write. Logging in
+with an expired token gives the user a new key. Expired tokens are
+deleted by the delete_expired_tokens command, along the index on
+"created" (migration core 0011).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+
+# Batches lock only their rows, skipping those a refresh is updating.
+DELETE_EXPIRED_SQL = """
+DELETE FROM {table} WHERE key IN (
+    SELECT key FROM {table}
+    WHERE created < %(cutoff)s
+    ORDER BY created
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+"""
+
+
+def expiry_cutoff():
+    """Return the time tokens last used before are expired."""
+    return timezone.now() - timedelta(seconds=settings.TOKEN_TTL)
+
+
+def token_expired(token):
+    return token.created < expiry_cutoff()
+
+
+def token_refresh_due(token):
+    """Whether using the token now moves its expiry."""
+    age = timezone.now() - token.created
+    return age >= timedelta(seconds=settings.TOKEN_REFRESH_INTERVAL)
+
+
+def refresh_token(token):
+    """Move the expiry of a used token, if it's due."""
+    if not token_refresh_due(token):
+        return
+
+    now = timezone.now()
+    # An update, not save(): concurrent requests write once, and the
+    # token stays in the auth caches.
+    Token.objects.filter(
+        key=token.key,
+        created__lt=now - timedelta(seconds=settings.TOKEN_REFRESH_INTERVAL),
+    ).update(created=now)
+    token.created = now
+
+
+def issue_token(user):
+    """Return the user's token, with a new key if theirs expired."""
+    token, created = Token.objects.get_or_create(user=user)
+    if created:
+        return token
+
+    if token_expired(token):
+        # Only one of concurrent logins rotates, the others get its key.
+        Token.objects.filter(key=token.key).update(
+            key=Token.generate_key(), created=timezone.now()
+        )
+        return Token.objects.get(user=user)
+
+    refresh_token(token)
+    return token
+
+
+def live_tokens():
+    """Return the number of tokens that haven't expired."""
+    return Token.objects.filter(created__gte=expiry_cutoff()).count()
+
+
+def delete_expired_tokens(batch_size=1000):
+    """Delete a batch of expired tokens, oldest first, return how many."""
+    sql = DELETE_EXPIRED_SQL.format(
+        table=connection.ops.quote_name(Token._meta.db_table)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"cutoff": expiry_cutoff(), "limit": batch_size})
+        return cursor.rowcount
@@ -0,0 +1,30 @@
+"""
+Views of the app itself, not of its APIs.
+"""
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from core.metrics import export
+
+
+def metrics(request):
+    """
+    Serve the Prometheus metrics (core.metrics) to scrapers with the
+    METRICS_TOKEN, 404 without one configured.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), expected.encode()
+    ):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = "Bearer"
+        return response
+
+    return HttpResponse(export(), content_type=CONTENT_TYPE_LATEST)
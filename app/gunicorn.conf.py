@@ -0,0 +1,72 @@
+"""
+Gunicorn settings for production, read from the environment.
+
+gthread workers: each process serves GUNICORN_THREADS requests at once
+and keeps idle keep-alive connections open without holding a thread.
+Threads fit the app, most of a request is waiting on Postgres. Each
+thread may hold a database connection, so size the pool (DB_POOL) or
+max_connections for WEB_CONCURRENCY x GUNICORN_THREADS per container.
+Started by scripts/run.sh, i.e:
+    gunicorn --config gunicorn.conf.py
+"""
+import multiprocessing
+import os
+import shutil
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+wsgi_app = "app.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Processes: one per core runs Python in parallel, plus one to cover
+# for a worker busy with the GIL held (i.e: resizing an image).
+workers = int(
+    os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count() + 1
+)
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Seconds an idle client connection is kept open. Behind a load
+# balancer, set it above the balancer's idle timeout.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# Restart workers after this many requests (0 never), the jitter keeps
+# them from restarting all at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Heartbeat files on tmpfs, a slow disk would get workers killed.
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+accesslog = "-" if int(os.environ.get("GUNICORN_ACCESS_LOG", 0)) else None
+
+# Workers count their Prometheus metrics in files there, so a scrape
+# served by any of them sees all (see core/metrics.py). Emptied on
+# start, counters begin at zero like a single process' would.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    "/dev/shm/prometheus" if os.path.isdir("/dev/shm") else "/tmp/prometheus",
+)
+
+
+def on_starting(server):
+    from django.core.exceptions import ImproperlyConfigured
+
+    from core.checks import check_shared_caches
+
+    # Workers keeping their own caches would serve stale responses.
+    try:
+        check_shared_caches(server.cfg.workers)
+    except ImproperlyConfigured as error:
+        # Gunicorn prints it and exits.
+        raise RuntimeError(error)
+
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,305 @@
+"""
+Bulk operations on recipe libraries.
+
+Imports are validated in chunks with RecipeBulkSerializer and written
+with one bulk insert per table and chunk, instead of one request (and
+a dozen queries) per recipe. Their bodies are parsed whole first, so
+the parsers cap them (RECIPE_IMPORT_MAX_BYTES, _MAX_RECIPES). Exports
+stream NDJSON from a server side cursor, rendering chunk by chunk with
+RecipeBulkValuesSerializer, so memory stays flat however large the
+library is.
+
+Tags and ingredients are renamed, deleted and merged many at a time,
+with one statement each. None of them sends model signals, so they
+invalidate the cache and touch updated_at themselves.
+"""
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe, Tag, Ingredient
+from core.parsers import FastJSONParser, NDJSONParser
+from core.renderers import NDJSONRenderer
+from recipe.cache import bump_generation
+from recipe.serializers import (
+    RecipeBulkSerializer,
+    RecipeBulkValuesSerializer,
+    get_or_create_by_name,
+)
+
+
+IMPORT_CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+# Recipe many to many relations and the model of their items.
+RELATIONS = (("tags", Tag), ("ingredients", Ingredient))
+
+# Deletes tags/ingredients (ids) and their links, in one statement.
+# The recipes that lose a link get a new updated_at, like m2m changes
+# do (see recipe/signals.py), so their ETags change. The link triggers
+# refresh their search vectors once, at the end of the statement.
+DELETE_SQL = """
+WITH unlinked AS (
+    DELETE FROM {through} WHERE {column} = ANY(%(ids)s)
+    RETURNING recipe_id
+), touched AS (
+    UPDATE {recipe} SET updated_at = %(now)s
+    WHERE id IN (SELECT recipe_id FROM unlinked)
+)
+DELETE FROM {table} WHERE id = ANY(%(ids)s)
+"""
+
+# Same, but the links are moved to the target first. Recipes that are
+# already linked to it keep their link (ON CONFLICT on the through
+# table unique constraint), so no recipe ends up with it twice.
+MERGE_SQL = """
+WITH unlinked AS (
+    DELETE FROM {through} WHERE {column} = ANY(%(ids)s)
+    RETURNING recipe_id
+), linked AS (
+    INSERT INTO {through} (recipe_id, {column})
+    SELECT DISTINCT recipe_id, %(target)s FROM unlinked
+    ON CONFLICT DO NOTHING
+), touched AS (
+    UPDATE {recipe} SET updated_at = %(now)s
+    WHERE id IN (SELECT recipe_id FROM unlinked)
+)
+DELETE FROM {table} WHERE id = ANY(%(ids)s)
+"""
+
+
+class ImportLimitsMixin:
+    """Parser limits of recipe imports, from settings."""
+
+    @property
+    def max_bytes(self):
+        return settings.RECIPE_IMPORT_MAX_BYTES
+
+    @property
+    def max_items(self):
+        return settings.RECIPE_IMPORT_MAX_RECIPES
+
+
+class ImportJSONParser(ImportLimitsMixin, FastJSONParser):
+    """A JSON array of recipes to import."""
+
+
+class ImportNDJSONParser(ImportLimitsMixin, NDJSONParser):
+    """Recipes to import, one per line."""
+
+
+def _create_recipes(user, items):
+    """
+    Create validated recipes and their links, with one bulk insert per
+    table. Returns the number of recipes created.
+    """
+    names = {
+        relation: [
+            list(dict.fromkeys(obj["name"] for obj in item.get(relation, [])))
+            for item in items
+        ]
+        for relation, _ in RELATIONS
+    }
+    recipes = Recipe.objects.bulk_create(
+        [
+            Recipe(
+                user=user,
+                **{
+                    name: value
+                    for name, value in item.items()
+                    if name not in names
+                },
+            )
+            for item in items
+        ]
+    )
+
+    for relation, model in RELATIONS:
+        existing = get_or_create_by_name(
+            model,
+            user,
+            [name for recipe_names in names[relation] for name in recipe_names],  # noqa
+        )
+        through = getattr(Recipe, relation).through
+        # i.e: 'tag_id' or 'ingredient_id'
+        field = f"{model._meta.model_name}_id"
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe.id, **{field: existing[name].id})
+                for recipe, recipe_names in zip(recipes, names[relation])
+                for name in recipe_names
+            ]
+        )
+
+    return len(recipes)
+
+
+def import_recipes(user, items, context, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and create recipes for the user, all or nothing.
+    Returns (created, errors), errors being [{index, errors}] of the
+    invalid items. Nothing is created if any item is invalid, but every
+    chunk is still validated, so all the errors are reported at once.
+    """
+    created = 0
+    errors = []
+    with transaction.atomic():
+        for start in range(0, len(items), chunk_size):
+            serializer = RecipeBulkSerializer(
+                data=items[start:start + chunk_size],
+                many=True,
+                context=context,
+            )
+            if not serializer.is_valid():
+                errors.extend(
+                    {"index": start + offset, "errors": item_errors}
+                    for offset, item_errors in enumerate(serializer.errors)
+                    if item_errors
+                )
+            if not errors:
+                created += _create_recipes(user, serializer.validated_data)
+
+        if errors:
+            transaction.set_rollback(True)
+            return 0, errors
+
+        # Bulk inserts send no signals.
+        if created:
+            bump_generation(user.pk)
+
+    return created, errors
+
+
+def export_recipes(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the recipes of queryset as NDJSON, one chunk at a time.
+    Rows come from a server side cursor, and each chunk loads its tags
+    and ingredients with one query each.
+    """
+    serializer = RecipeBulkValuesSerializer()
+    renderer = NDJSONRenderer()
+
+    # In autocommit the cursor would be WITH HOLD: Postgres copies the
+    # whole result when the query commits, and a transaction pooler
+    # (PgBouncer) may hand the server connection to another client.
+    with transaction.atomic():
+        rows = serializer.values(queryset).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield renderer.render(serializer.to_representation(chunk))
+
+
+def _format_links_sql(sql, model):
+    """Fill in the tables of model and its Recipe through table."""
+    relation = next(name for name, related in RELATIONS if related is model)
+    quote = connection.ops.quote_name
+    return sql.format(
+        through=quote(getattr(Recipe, relation).through._meta.db_table),
+        column=quote(f"{model._meta.model_name}_id"),
+        recipe=quote(Recipe._meta.db_table),
+        table=quote(model._meta.db_table),
+    )
+
+
+def _lock_owned(model, user, ids, field="ids"):
+    """
+    Lock the user's tags/ingredients with these ids, for the rest of the
+    transaction. Returns their {id: name}. Raises ValidationError on
+    field if some aren't theirs.
+    """
+    found = dict(
+        model.objects.select_for_update()
+        .filter(user=user, id__in=ids)
+        .values_list("id", "name")
+    )
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        raise ValidationError(
+            {field: [_("Not found: %s.") % ", ".join(map(str, missing))]}
+        )
+
+    return found
+
+
+def rename_attrs(model, user, names):
+    """
+    Rename the user's tags/ingredients, names being {id: name}, with one
+    UPDATE. Returns the renamed objects. Raises ValidationError if an id
+    isn't theirs or a name is already taken.
+    Names may move between the items (i.e: swapped): the unique
+    constraint is checked row by row, so they are all renamed to
+    temporary names first, with another UPDATE.
+    """
+    now = timezone.now()
+    objs = [
+        model(id=pk, user=user, name=name, updated_at=now)
+        for pk, name in names.items()
+    ]
+    try:
+        with transaction.atomic():
+            current = _lock_owned(model, user, list(names))
+            taken = set(current.values())
+            if any(
+                name in taken and name != current[pk]
+                for pk, name in names.items()
+            ):
+                model.objects.bulk_update(
+                    [
+                        model(id=pk, name=f"{uuid.uuid4().hex} renaming")
+                        for pk in names
+                    ],
+                    ["name"],
+                )
+            model.objects.bulk_update(objs, ["name", "updated_at"])
+    except IntegrityError:
+        raise ValidationError(
+            {"name": [_("You already have an item with this name.")]}
+        )
+
+    bump_generation(user.pk)
+    return objs
+
+
+def delete_attrs(model, user, ids):
+    """
+    Delete the user's tags/ingredients with these ids and unlink them
+    from their recipes. Returns the number deleted.
+    """
+    with transaction.atomic():
+        _lock_owned(model, user, ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _format_links_sql(DELETE_SQL, model),
+                {"ids": ids, "now": timezone.now()},
+            )
+            deleted = cursor.rowcount
+        bump_generation(user.pk)
+
+    return deleted
+
+
+def merge_attrs(model, user, ids, target):
+    """
+    Merge the user's tags/ingredients with these ids into target: their
+    recipes are linked to target instead, and they are deleted.
+    Returns the target.
+    """
+    with transaction.atomic():
+        _lock_owned(model, user, [target], field="target")
+        _lock_owned(model, user, ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _format_links_sql(MERGE_SQL, model),
+                {"ids": ids, "target": target, "now": timezone.now()},
+            )
+        bump_generation(user.pk)
+
+    return model.objects.get(pk=target)
@@ -0,0 +1,283 @@
+"""
+Per-user response cache for the recipe list APIs.
+
+Cached lists are keyed by user, a per-user generation, the endpoint,
+the normalized query params and the response format. Any write to a
+user's recipes, tags or ingredients replaces the generation, so old
+entries are never read again and simply expire. There is no need to
+find and delete them. The same writes record when the user last wrote,
+their library's Last-Modified (see recipe/conditional.py).
+
+The backend is the "api" alias in settings.CACHES, so it can be local
+memory, file based, or anything else Django supports.
+
+The same writes pin the user to the primary database for a few seconds
+(settings.REPLICA_PIN_SECONDS), so they read their own writes even if
+the replicas lag (see recipe/replicas.py). Pins are kept in the
+"default" cache, which every process shares, and not with the
+responses: turning response caching off mustn't lose them.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+CACHE_ALIAS = "api"
+PIN_CACHE_ALIAS = "default"
+KEY_PREFIX = "recipe-api"
+# Response headers stored with the cached data.
+# Last-Modified is computed when served, see last_modified().
+CACHED_HEADERS = ("ETag", "Vary")
+
+
+class CacheStats:
+    """
+    Hit, miss and eviction counters of this process.
+    An eviction is an entry we stored that the backend dropped
+    before it expired and before its generation changed.
+    """
+
+    # Keys we remember storing, to tell evictions from plain misses.
+    max_tracked_keys = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stored = OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """Set all counters back to zero."""
+        with self._lock:
+            self._stored.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self, key):
+        with self._lock:
+            self.misses += 1
+            expires = self._stored.pop(key, None)
+            if expires is not None and expires > time.monotonic():
+                self.evictions += 1
+
+    def record_set(self, key, timeout):
+        # None means the entry never expires.
+        expires = float("inf") if timeout is None else time.monotonic() + timeout  # noqa
+        with self._lock:
+            self._stored[key] = expires
+            self._stored.move_to_end(key)
+            while len(self._stored) > self.max_tracked_keys:
+                self._stored.popitem(last=False)
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    """Return the cache backend for API responses."""
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    return f"{KEY_PREFIX}:gen:{user_id}"
+
+
+def get_generation(user_id):
+    """Return the current cache generation of the user."""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # add() keeps the value of a concurrent request that got there first.  # noqa
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def _modified_key(user_id):
+    return f"{KEY_PREFIX}:modified:{user_id}"
+
+
+def last_write(user_id):
+    """
+    Return when the user last wrote (a timestamp), recorded with each
+    new generation. A time the cache lost counts as a write now.
+    """
+    cache = get_cache()
+    key = _modified_key(user_id)
+    written = cache.get(key)
+    if written is None:
+        cache.add(key, time.time(), None)
+        written = cache.get(key)
+
+    return time.time() if written is None else written
+
+
+def last_modified(written):
+    """
+    Return the Last-Modified of a library last written at written, in
+    whole seconds, or None during the second of the write: HTTP dates
+    have no fractions, a write later in that second would keep it.
+    """
+    if written is None or int(written) >= int(time.time()):
+        return None
+    return int(written)
+
+
+def _set_new_generation(user_id):
+    # A random token instead of a counter, so a generation lost to an  # noqa
+    # eviction can never come back and revive old entries.
+    get_cache().set_many(
+        {
+            _generation_key(user_id): uuid.uuid4().hex,
+            _modified_key(user_id): time.time(),
+        },
+        None,
+    )
+    stats.record_invalidation()
+    pin_to_primary(user_id)
+
+
+def _pin_key(user_id):
+    return f"{KEY_PREFIX}:primary:{user_id}"
+
+
+def get_pin_cache():
+    """Return the cache backend for replica pins."""
+    return caches[PIN_CACHE_ALIAS]
+
+
+def pin_to_primary(user_id):
+    """Read the user's data from the primary for a while."""
+    get_pin_cache().set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)  # noqa
+
+
+def pinned_to_primary(user_id):
+    """Whether the user wrote recently, see pin_to_primary()."""
+    return get_pin_cache().get(_pin_key(user_id), False)
+
+
+def bump_generation(user_id):
+    """
+    Invalidate every cached response of the user.
+    Inside a transaction it is bumped again on commit, otherwise a request
+    reading the old rows before the commit could cache them as fresh.
+    Call it after writes that don't send model signals (bulk_create,
+    queryset update/delete).
+    """
+    _set_new_generation(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _set_new_generation(user_id))
+
+
+def response_key(request):
+    """Build the cache key of a request for its user."""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    # The headers (ETag) depend on the negotiated format, see Vary.
+    renderer = getattr(request, "accepted_renderer", None)
+    raw = (
+        f"{request.get_host()}{request.path}?{params}:"
+        f"{getattr(renderer, 'format', '')}"
+    )
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    generation = get_generation(request.user.pk)
+
+    return f"{KEY_PREFIX}:{request.user.pk}:{generation}:{digest}"
+
+
+def cached_response(request, key):
+    """
+    Return the cached response of the request (200 or 304), or None on
+    a miss. Never queries the database.
+    """
+    entry = get_cache().get(key)
+    if entry is None:
+        return None
+
+    stats.record_hit()
+    headers = {**entry["headers"], "X-Cache": "HIT"}
+    # No write since, or the generation would have changed.
+    modified = last_modified(entry.get("written"))
+    if modified is not None:
+        headers["Last-Modified"] = http_date(modified)
+    not_modified = get_conditional_response(
+        request, etag=headers.get("ETag"), last_modified=modified
+    )
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    return Response(entry["data"], headers=headers)
+
+
+class CachedListMixin:
+    """
+    Serve list responses from the per-user response cache.
+    Adds an 'X-Cache: HIT/MISS' header to list responses.
+    Validators (the ETag, and the time of the last write) are cached
+    with the data, so a hit also answers conditional requests without
+    touching the database.
+    """
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        # The generation is read before querying, so data cached under it
+        # is never older than the writes it has seen.
+        key = response_key(request)
+        response = cached_response(request, key)
+        if response is not None:
+            return response
+
+        stats.record_miss(key)
+        # Read after the generation: a later write makes the entry stale.
+        written = last_write(request.user.pk)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                name: response[name]
+                for name in CACHED_HEADERS
+                if response.has_header(name)
+            }
+            cache.set(
+                key,
+                {"data": response.data, "headers": headers, "written": written},  # noqa
+            )
+            stats.record_set(key, cache.default_timeout)
+        response["X-Cache"] = "MISS"
+
+        return response
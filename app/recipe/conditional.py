@@ -0,0 +1,110 @@
+"""
+Conditional GET (ETag / Last-Modified) for the recipe APIs.
+
+The ETag is computed for the user's whole library with one query:
+max(updated_at) and count of their recipes, tags and ingredients.
+Any create, update or delete moves one of them (a delete lowers a
+count), and m2m changes touch updated_at (see recipe/signals.py).
+Each (user_id, updated_at) index turns every part into an index only
+scan, so this is much cheaper than running the list query.
+Last-Modified is when the user last wrote, recorded with the cache
+generation (recipe/cache.py) by the same writes, deletes included.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from rest_framework import status
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import last_modified, last_write
+
+
+LIBRARY_MODELS = (Recipe, Tag, Ingredient)
+
+
+def _aggregate(model, function):
+    """Subquery of an aggregate over the rows of the outer user."""
+    return Subquery(
+        model.objects.filter(user=OuterRef("pk"))
+        .order_by()
+        .values("user")
+        .annotate(value=function)
+        .values("value")
+    )
+
+
+def library_state(user):
+    """Return max(updated_at) and count of each model for the user."""
+    annotations = {}
+    for model in LIBRARY_MODELS:
+        name = model._meta.model_name
+        annotations[f"{name}_max"] = _aggregate(model, Max("updated_at"))
+        annotations[f"{name}_count"] = _aggregate(model, Count("id"))
+
+    state = (
+        get_user_model()
+        .objects.filter(pk=user.pk)
+        .values(**annotations)
+        .first()
+    )
+    # Read from a replica that hasn't seen the user yet: nothing to show.
+    return state or dict.fromkeys(annotations)
+
+
+def library_etag(request):
+    """
+    Return the ETag of a request.
+    It also covers the path, query params and response format, since
+    they all change the representation.
+    """
+    state = library_state(request.user)
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    renderer = getattr(request, "accepted_renderer", None)
+    raw = (
+        f"{request.path}?{params}:{getattr(renderer, 'format', '')}:"
+        f"{sorted(state.items())}"
+    )
+
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Answer list requests with 304 Not Modified when the client's
+    ETag or Last-Modified is still current, without running the
+    serializer. Must come after CachedListMixin, which caches the
+    validators with the data.
+    Detail views opt in by wrapping retrieve with conditional_response.
+    """
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        """Return 304 if the client is up to date, else call handler."""
+        # Read before the rows, so it's never newer than what they show.
+        modified = last_modified(last_write(request.user.pk))
+        etag = library_etag(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response["ETag"] = etag
+        if modified is not None:
+            response["Last-Modified"] = http_date(modified)
+        # The ETag covers the format negotiated from Accept.
+        patch_vary_headers(response, ("Accept",))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)  # noqa
@@ -0,0 +1,146 @@
+"""
+Background generation of resized recipe images.
+
+After an upload commits, the recipe id is handed to a local thread
+pool, so the upload request never waits on resizing. Each configured
+size is written in each configured format next to the original, and
+the paths are stored on Recipe.image_derivatives. The files of the
+derivatives they replace are deleted once that commits.
+
+Jobs live in memory: a crashed or restarted process loses them. The
+generate_image_derivatives command picks up any recipe left without
+derivatives.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from PIL import Image, features
+
+from core.models import Recipe
+from recipe.cache import bump_generation
+
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (Pillow format, file extension).
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+_executor = None
+
+
+def get_executor():
+    """Return the worker pool, created on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix="recipe-images",
+        )
+
+    return _executor
+
+
+def enqueue_derivatives(recipe_id):
+    """Generate the derivatives of a recipe once the transaction commits."""
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_job, recipe_id)
+    )
+
+
+def _run_job(recipe_id):
+    """Worker entrypoint, with its own database connection."""
+    close_old_connections()
+    try:
+        generate_derivatives(recipe_id)
+    except Exception:
+        logger.exception("Image derivatives failed for recipe %s", recipe_id)
+    finally:
+        close_old_connections()
+
+
+def available_formats():
+    """Configured formats this Pillow build can write."""
+    formats = []
+    for name in settings.RECIPE_IMAGE_FORMATS:
+        if name == "webp" and not features.check("webp"):
+            continue
+        formats.append(name)
+
+    return formats
+
+
+def generate_derivatives(recipe_id):
+    """
+    Resize the image of a recipe to every configured size and format.
+    Sizes are bounding boxes, the aspect ratio is kept and images are
+    never scaled up.
+    Returns the stored derivatives, or None if the image changed meanwhile.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return None
+
+    source_name = recipe.image.name
+    storage = recipe.image.storage
+    previous = recipe.image_derivatives
+    base, _ = os.path.splitext(source_name)
+
+    with recipe.image.open("rb") as source:
+        original = Image.open(source)
+        original.load()
+    if original.mode not in ("RGB", "L"):
+        original = original.convert("RGB")
+
+    derivatives = {}
+    for size_name, size in settings.RECIPE_IMAGE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((size, size))
+        derivatives[size_name] = {}
+        for format_name in available_formats():
+            pil_format, ext = FORMATS[format_name]
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, quality=80)
+            path = storage.save(
+                f"{base}_{size_name}.{ext}", ContentFile(buffer.getvalue())
+            )
+            derivatives[size_name][format_name] = path
+
+    # Only store them if the recipe still has the image we resized.
+    updated = Recipe.objects.filter(id=recipe_id, image=source_name).update(
+        image_derivatives=derivatives, updated_at=timezone.now()
+    )
+    if not updated:
+        delete_derivatives(storage, derivatives)
+        return None
+
+    # update() sends no signals.
+    bump_generation(recipe.user_id)
+    delete_derivatives_on_commit(storage, previous)
+
+    return derivatives
+
+
+def delete_derivatives(storage, derivatives):
+    """Delete derivative files."""
+    for formats in derivatives.values():
+        for path in formats.values():
+            storage.delete(path)
+
+
+def delete_derivatives_on_commit(storage, derivatives):
+    """
+    Delete derivative files once the transaction commits, i.e: after
+    the recipe stopped pointing to them.
+    """
+    if derivatives:
+        transaction.on_commit(lambda: delete_derivatives(storage, derivatives))  # noqa
@@ -0,0 +1,44 @@
+"""
+Pagination for the recipe APIs.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination that is only used when asked for.
+    Clients opt in by sending 'page_size' or a 'cursor' query param,
+    otherwise the full list is returned like before.
+    Cursors are opaque and filter on the ordering key (WHERE id < ...)
+    instead of using OFFSET, so every page costs the same.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Paginate only if the client requested it."""
+        params = request.query_params
+        if (
+            self.cursor_query_param not in params
+            and self.page_size_query_param not in params
+        ):
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipeCursorPagination(OptInCursorPagination):
+    """Cursor pagination for recipes, newest first."""
+
+    ordering = "-id"
+
+
+class RecipeAttrCursorPagination(OptInCursorPagination):
+    """
+    Cursor pagination for tags and ingredients.
+    id is a tie-breaker so the order is always total.
+    """
+
+    ordering = ("-name", "-id")
@@ -0,0 +1,34 @@
+"""
+Read replica routing for the recipe APIs.
+
+Lists and details are read from a replica (see core/routers.py), which
+takes most of the load off the primary: reads outnumber writes by far.
+Users who wrote in the last settings.REPLICA_PIN_SECONDS read from the
+primary instead, so they never miss their own changes while replicas
+catch up (see recipe/cache.py). Set it above the replication lag.
+"""
+from contextlib import ExitStack
+
+from core.routers import replica_reads
+from recipe.cache import pinned_to_primary
+
+
+class ReplicaReadMixin:
+    """
+    Run replica_actions on a replica, from the first query of the
+    handler (i.e: the ETag) to the response data.
+    Authentication and permissions still read the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self._replica_reads:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and not pinned_to_primary(
+            request.user.pk
+        ):
+            self._replica_reads.enter_context(replica_reads())
@@ -0,0 +1,58 @@
+"""
+Full-text search over recipes.
+
+Recipe.search_vector holds the weighted title (A), description (B) and
+tag/ingredient names (C), maintained by triggers in the database. Every
+search term is matched as a prefix ('choc' finds 'chocolate'). Titles
+that are only similar to the search (typos) are matched with trigrams
+and come after the full-text matches.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import F, Q
+
+
+# Must match the config of core_recipe_search_vector() in the database.
+SEARCH_CONFIG = "english"
+
+WORD_RE = re.compile(r"\w+")
+
+
+def prefix_query(text):
+    """Return a tsquery matching every word of text as a prefix, or None."""
+    words = WORD_RE.findall(text)
+    if not words:
+        return None
+
+    # Only word characters reach to_tsquery, so it can't fail to parse.
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def search_recipes(queryset, text):
+    """
+    Filter recipes matching text, best matches first.
+    Both conditions are backed by a GIN index, so Postgres can combine
+    them with a BitmapOr instead of scanning the recipes.
+    """
+    text = text.strip()
+    query = prefix_query(text)
+    if query is None:
+        return queryset.none()
+
+    return (
+        queryset.annotate(
+            rank=SearchRank(F("search_vector"), query),
+            similarity=TrigramSimilarity("title", text),
+        )
+        .filter(Q(search_vector=query) | Q(title__trigram_similar=text))
+        .order_by("-rank", "-similarity", "-id")
+    )
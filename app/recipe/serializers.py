@@ -1,12 +1,17 @@
 """
 Serializers for recipes APIs
 """
+from django.db import transaction
+from django.utils.translation import gettext as _
+
 from rest_framework import serializers
 
+from core.instrumentation import TimedSerializerMixin
 from core.models import Recipe, Tag, Ingredient
+from recipe.values import ValuesSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Ingredients."""
 
     class Meta:
@@ -15,7 +20,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializers for tags."""
 
     class Meta:
@@ -24,7 +29,104 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientCountSerializer(IngredientSerializer):
+    """Ingredients with the number of recipes using them."""
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ["recipe_count"]
+
+
+class TagCountSerializer(TagSerializer):
+    """Tags with the number of recipes using them."""
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ["recipe_count"]
+
+
+class RecipeAttrItemSerializer(TimedSerializerMixin, serializers.Serializer):
+    """A tag/ingredient by id, for bulk operations."""
+
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=255)
+
+
+class RecipeAttrItemListSerializer(serializers.ListSerializer):
+    """Tags/ingredients to rename, each id and name once."""
+
+    child = RecipeAttrItemSerializer()
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(*args, **kwargs)
+
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(_("Ids must be unique."))
+        names = [item["name"] for item in attrs]
+        if len(set(names)) != len(names):
+            raise serializers.ValidationError(_("Names must be unique."))
+        return attrs
+
+
+class RecipeAttrIdsSerializer(serializers.Serializer):
+    """Ids of tags/ingredients, for bulk deletes."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class RecipeAttrMergeSerializer(RecipeAttrIdsSerializer):
+    """Tags/ingredients (ids) to merge into another one (target)."""
+
+    target = serializers.IntegerField()
+
+    def validate(self, attrs):
+        if attrs["target"] in attrs["ids"]:
+            raise serializers.ValidationError(
+                {"target": [_("The target can't be merged into itself.")]}
+            )
+        return attrs
+
+
+def get_or_create_by_name(model, user, names):
+    """
+    Return {name: obj} of the user's tags/ingredients with these names,
+    creating the missing ones. Round trips are fixed no matter how many
+    names come in:
+    1. One query to fetch the ones that already exist.
+    2. One bulk insert for the missing ones, and one query to read
+       them back (skipped if nothing is missing).
+    """
+    names = list(dict.fromkeys(names))
+    existing = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+
+    missing = [name for name in names if name not in existing]
+    if missing:
+        # A concurrent request may insert the same name first, the unique  # noqa
+        # constraint rejects ours and we read back the winner instead.  # noqa
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        for obj in model.objects.filter(user=user, name__in=missing):
+            existing[obj.name] = obj
+
+    return existing
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
 
     tags = TagSerializer(
@@ -45,33 +147,61 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
-    def _get_or_create_tags(self, tags, recipe):
-        """Handle getting or creating tags as needed."""
+    # Relations that can be rendered as nested objects or as ids.
+    expandable_fields = ["tags", "ingredients"]
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        """
+        Optionally render a subset of the fields.
+        fields: names of the fields to render, or None for all of them.
+        expand: relations rendered as nested objects, the other ones
+        are rendered as lists of ids. None to expand all of them.
+        """
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name in self.expandable_fields:
+                if name in self.fields and name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True
+                    )
+
+    def _get_or_create_attrs(self, model, items, recipe, relation):
+        """
+        Get or create tags/ingredients by name and link them to recipe,
+        with get_or_create_by_name() and one bulk insert into the recipe
+        through table.
+        """
         auth_user = self.context["request"].user
+        # dict.fromkeys drops repeated names and keeps the payload order.  # noqa
+        names = list(dict.fromkeys(item["name"] for item in items))
+        if not names:
+            return
 
-        # Iterate tags we popped and then add them to recipe.  # noqa
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,  # This allows to include more parameters from the tag model.  # noqa
-                # as opposed to
-                # name = tag['name']
-            )
-            # Add them to recipe.
-            recipe.tags.add(tag_obj)
+        existing = get_or_create_by_name(model, auth_user, names)
+
+        through = getattr(Recipe, relation).through
+        # i.e: 'tag_id' or 'ingredient_id' in core_recipe_tags  # noqa
+        field = f"{model._meta.model_name}_id"
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe.id, **{field: existing[name].id})
+                for name in names
+            ]
+        )
+
+    def _get_or_create_tags(self, tags, recipe):
+        """Handle getting or creating tags as needed."""
+        self._get_or_create_attrs(Tag, tags, recipe, "tags")
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context["request"].user
-
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,  # This allows to include more parameters from the ingredient model, otherwise the ingredient model would need to be specified paramater by parameter.  # noqa
-            )
-            # Add them to recipe.
-            recipe.ingredients.add(ingredient_obj)
+        self._get_or_create_attrs(Ingredient, ingredients, recipe, "ingredients")
 
+    @transaction.atomic
     def create(self, validated_data):
         """Customizing creating a recipe."""
         tags = validated_data.pop(
@@ -86,6 +216,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop("tags", None)
@@ -109,14 +240,84 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class IngredientValuesSerializer(ValuesSerializer):
+    """Fast read-only IngredientSerializer, for lists."""
+
+    serializer_class = IngredientSerializer
+
+
+class TagValuesSerializer(ValuesSerializer):
+    """Fast read-only TagSerializer, for lists."""
+
+    serializer_class = TagSerializer
+
+
+class IngredientCountValuesSerializer(ValuesSerializer):
+    """Fast read-only IngredientCountSerializer, for lists."""
+
+    serializer_class = IngredientCountSerializer
+
+
+class TagCountValuesSerializer(ValuesSerializer):
+    """Fast read-only TagCountSerializer, for lists."""
+
+    serializer_class = TagCountSerializer
+
+
+class RecipeValuesSerializer(ValuesSerializer):
+    """Fast read-only RecipeSerializer, for lists. Takes fields/expand."""
+
+    serializer_class = RecipeSerializer
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
 
+    image_derivatives = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_derivatives",
+        ]
+
+    def get_image_derivatives(self, recipe):
+        """
+        URLs of the resized images, by size and format.
+        Empty until the background job has made them.
+        """
+        request = self.context.get("request")
+        storage = recipe.image.storage
+        urls = {}
+        for size, formats in recipe.image_derivatives.items():
+            urls[size] = {}
+            for image_format, path in formats.items():
+                url = storage.url(path)
+                urls[size][image_format] = (
+                    request.build_absolute_uri(url) if request else url
+                )
+
+        return urls
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """
+    Serializer for recipe imports and exports, one line per recipe.
+    Every field that can be written, so exports can be imported again.
+    """
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + ["description"]
+
+
+class RecipeBulkValuesSerializer(ValuesSerializer):
+    """Fast read-only RecipeBulkSerializer, for exports."""
+
+    serializer_class = RecipeBulkSerializer
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
         Serializer for uploading images to recipes.
         Only for uploading an image.
@@ -0,0 +1,35 @@
+"""
+Signal handlers for the recipe app.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_generation
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Invalidate cached responses of the owner of a changed object."""
+    bump_generation(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_cache_on_m2m(sender, instance, action, **kwargs):
+    """
+    Invalidate cached responses when recipe tags/ingredients change.
+    instance is a Recipe, or a Tag/Ingredient for reverse changes.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        # Links don't change either row, touch updated_at so ETags change.  # noqa
+        type(instance).objects.filter(pk=instance.pk).update(
+            updated_at=timezone.now()
+        )
+        bump_generation(instance.user_id)
@@ -0,0 +1,337 @@
+"""
+Tests for the recipe bulk import and export API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.parsers import NDJSONParser
+from core.renderers import NDJSONRenderer
+from recipe import bulk
+
+BULK_URL = reverse("recipe:recipe-bulk")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def recipe_payload(**params):
+    """Return a recipe as sent to the import."""
+    payload = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": "2.50",
+        "description": "Sample description.",
+        "tags": [{"name": "Dinner"}],
+        "ingredients": [{"name": "Rice"}],
+    }
+    payload.update(params)
+    return payload
+
+
+def parse_export(res):
+    """Return the recipes of a streamed export."""
+    body = b"".join(res.streaming_content)
+    return NDJSONParser().parse(body.splitlines(keepends=True))
+
+
+class PublicBulkApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to import and export."""
+        client = APIClient()
+
+        self.assertEqual(
+            client.get(BULK_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertEqual(
+            client.post(BULK_URL, [], format="json").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+
+class PrivateBulkApiTests(TestCase):
+    """Test authenticated bulk import and export."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_import_json_array(self):
+        """Test importing recipes from a JSON array."""
+        Tag.objects.create(user=self.user, name="Dinner")
+        payload = [
+            recipe_payload(title="Fried rice"),
+            recipe_payload(
+                title="Curry",
+                tags=[{"name": "Dinner"}, {"name": "Spicy"}],
+                ingredients=[],
+            ),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json(), {"created": 2})
+        fried, curry = Recipe.objects.filter(user=self.user).order_by("id")
+        self.assertEqual(fried.title, "Fried rice")
+        self.assertEqual(fried.price, Decimal("2.50"))
+        self.assertEqual(fried.description, "Sample description.")
+        self.assertEqual(
+            [tag.name for tag in fried.tags.all()], ["Dinner"]
+        )
+        self.assertEqual(
+            [ingredient.name for ingredient in fried.ingredients.all()],
+            ["Rice"],
+        )
+        self.assertEqual(
+            sorted(tag.name for tag in curry.tags.all()), ["Dinner", "Spicy"]
+        )
+        self.assertFalse(curry.ingredients.exists())
+        # Existing tags are reused, not duplicated.
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_import_ndjson(self):
+        """Test importing recipes from NDJSON, skipping blank lines."""
+        body = NDJSONRenderer().render(
+            [recipe_payload(title="Fried rice"), recipe_payload(title="Soup")]
+        )
+
+        res = self.client.post(
+            BULK_URL, body + b"\n", content_type=NDJSONRenderer.media_type
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("title", flat=True)),
+            ["Fried rice", "Soup"],
+        )
+
+    def test_import_ndjson_invalid_line(self):
+        """Test a malformed line is reported by number."""
+        body = NDJSONRenderer().render(recipe_payload()) + b"{\n"
+
+        res = self.client.post(
+            BULK_URL, body, content_type=NDJSONRenderer.media_type
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Line 2", res.json()["detail"])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_invalid_creates_nothing(self):
+        """Test invalid recipes are reported and nothing is created."""
+        payload = [recipe_payload() for _ in range(5)]
+        payload[1]["time_minutes"] = "soon"
+        del payload[4]["title"]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = res.json()["errors"]
+        self.assertEqual([error["index"] for error in errors], [1, 4])
+        self.assertIn("time_minutes", errors[0]["errors"])
+        self.assertIn("title", errors[1]["errors"])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_import_invalid_in_later_chunk(self):
+        """Test chunks written before an invalid one are rolled back."""
+        payload = [recipe_payload() for _ in range(5)]
+        payload[3]["price"] = "free"
+
+        created, errors = bulk.import_recipes(
+            self.user, payload, {}, chunk_size=2
+        )
+
+        self.assertEqual(created, 0)
+        self.assertEqual([error["index"] for error in errors], [3])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_import_not_a_list(self):
+        """Test a single object is rejected."""
+        res = self.client.post(BULK_URL, recipe_payload(), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMPORT_MAX_RECIPES=2)
+    def test_import_too_many_recipes(self):
+        """Test imports over RECIPE_IMPORT_MAX_RECIPES are rejected."""
+        payload = [recipe_payload(title=f"Recipe {i}") for i in range(3)]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+        res_ndjson = self.client.post(
+            BULK_URL,
+            NDJSONRenderer().render(payload),
+            content_type=NDJSONRenderer.media_type,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)  # noqa
+        self.assertEqual(
+            res_ndjson.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMPORT_MAX_BYTES=1000)
+    def test_import_too_large(self):
+        """Test import bodies over RECIPE_IMPORT_MAX_BYTES are rejected."""
+        payload = [recipe_payload(title=f"Recipe {i}") for i in range(20)]
+
+        res = self.client.post(
+            BULK_URL,
+            NDJSONRenderer().render(payload),
+            content_type=NDJSONRenderer.media_type,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)  # noqa
+        self.assertIn("1000 bytes", res.json()["detail"])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_query_count(self):
+        """Test queries don't grow with the number of recipes."""
+        payload = [
+            recipe_payload(
+                title=f"Recipe {i}",
+                tags=[{"name": f"Tag {i}"}, {"name": "Dinner"}],
+            )
+            for i in range(50)
+        ]
+
+        with self.assertNumQueries(11):
+            res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.tags.through.objects.count(), 100)
+
+    def test_import_invalidates_list(self):
+        """Test imported recipes show up in the cached list."""
+        self.assertEqual(self.client.get(RECIPES_URL).json(), [])
+
+        self.client.post(BULK_URL, [recipe_payload()], format="json")
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(
+            [recipe["title"] for recipe in res.json()], ["Sample recipe"]
+        )
+
+    def test_import_searchable(self):
+        """Test imported recipes are found by their tags."""
+        self.client.post(
+            BULK_URL,
+            [recipe_payload(title="Curry", tags=[{"name": "Vegan"}])],
+            format="json",
+        )
+
+        res = self.client.get(RECIPES_URL, {"search": "vegan"})
+
+        self.assertEqual(
+            [recipe["title"] for recipe in res.json()], ["Curry"]
+        )
+
+    def test_export(self):
+        """Test exporting streams the user's recipes as NDJSON."""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="testpass123"
+        )
+        Recipe.objects.create(
+            user=other, title="Other", time_minutes=1, price=Decimal("1")
+        )
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title="Fried rice",
+            time_minutes=10,
+            price=Decimal("2.50"),
+            description="Quick.",
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+
+        res = self.client.get(BULK_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], NDJSONRenderer.media_type)
+        recipes = parse_export(res)
+        self.assertEqual(len(recipes), 1)
+        self.assertEqual(recipes[0]["id"], recipe.id)
+        self.assertEqual(recipes[0]["title"], "Fried rice")
+        self.assertEqual(recipes[0]["price"], "2.50")
+        self.assertEqual(recipes[0]["description"], "Quick.")
+        self.assertEqual(recipes[0]["tags"][0]["name"], "Dinner")
+
+    def test_export_filtered(self):
+        """Test the list filters apply to exports."""
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        for title in ("Soup", "Curry"):
+            Recipe.objects.create(
+                user=self.user, title=title, time_minutes=1, price=1
+            )
+        Recipe.objects.get(title="Curry").tags.add(tag)
+
+        res = self.client.get(BULK_URL, {"tags": tag.id})
+
+        self.assertEqual(
+            [recipe["title"] for recipe in parse_export(res)], ["Curry"]
+        )
+
+    def test_export_chunks(self):
+        """Test exports render chunk by chunk, with bounded queries."""
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"Recipe {i}", time_minutes=1, price=1
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f"Food {i}")
+            )
+        queryset = Recipe.objects.filter(user=self.user).order_by("id")
+
+        # One query for the rows, then tags and ingredients per chunk,
+        # in a transaction (a savepoint in tests).
+        with self.assertNumQueries(2 + 1 + 2 * 3):
+            chunks = list(bulk.export_recipes(queryset, chunk_size=2))
+
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 1])
+        recipes = NDJSONParser().parse(b"".join(chunks).splitlines())
+        self.assertEqual(
+            [recipe["ingredients"][0]["name"] for recipe in recipes],
+            [f"Food {i}" for i in range(5)],
+        )
+
+    def test_export_import_round_trip(self):
+        """Test an export can be imported again, i.e: by another user."""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title="Fried rice",
+            time_minutes=10,
+            price=Decimal("2.50"),
+            link="http://example.com/rice",
+        )
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Rice")
+        )
+        body = b"".join(self.client.get(BULK_URL).streaming_content)
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.post(
+            BULK_URL, body, content_type=NDJSONRenderer.media_type
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        copy = Recipe.objects.get(user=other)
+        self.assertEqual(copy.title, "Fried rice")
+        self.assertEqual(copy.link, "http://example.com/rice")
+        self.assertEqual(
+            copy.ingredients.get().user, other
+        )
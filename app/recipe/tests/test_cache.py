@@ -0,0 +1,205 @@
+"""
+Tests for the recipe API response cache.
+"""
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+from recipe import cache
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+CACHE_STATS_URL = reverse("recipe:cache-stats")
+
+
+def create_user(email="user@example.com", password="testpass123"):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+    """Test caching list responses per user."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.stats.reset()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test the second identical list request is a cache hit."""
+        create_recipe(user=self.user)
+
+        res1 = self.client.get(RECIPES_URL)
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res1["X-Cache"], "MISS")
+        self.assertEqual(res2["X-Cache"], "HIT")
+        self.assertEqual(res1.data, res2.data)
+        self.assertEqual(cache.stats.hits, 1)
+        self.assertEqual(cache.stats.misses, 1)
+
+    def test_query_params_normalized(self):
+        """Test the order of query params doesn't change the cache key."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        self.client.get(f"{RECIPES_URL}?tags={tag.id}&tags_match=all")
+        res = self.client.get(f"{RECIPES_URL}?tags_match=all&tags={tag.id}")
+
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    def test_cache_limited_to_user(self):
+        """Test a user never gets another user's cached list."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        other_client = APIClient()
+        other_client.force_authenticate(create_user(email="other@example.com"))
+        res = other_client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data, [])
+
+    def test_create_recipe_invalidates(self):
+        """Test creating a recipe through the API invalidates the list."""
+        self.client.get(RECIPES_URL)
+        payload = {"title": "Soup", "time_minutes": 10, "price": "2.00"}
+        self.client.post(RECIPES_URL, payload)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data), 1)
+
+    def test_m2m_change_invalidates(self):
+        """Test adding a tag to a recipe invalidates the lists."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data[0]["tags"][0]["name"], "Vegan")
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data), 1)
+
+    def test_update_tag_invalidates(self):
+        """Test updating a tag invalidates the tags list."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.client.get(TAGS_URL)
+
+        url = reverse("recipe:tag-detail", args=[tag.id])
+        self.client.patch(url, {"name": "Vegetarian"})
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data[0]["name"], "Vegetarian")
+
+    def test_write_of_other_user_keeps_cache(self):
+        """Test writes by another user don't invalidate this user."""
+        self.client.get(RECIPES_URL)
+        create_recipe(user=create_user(email="other@example.com"))
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    def test_bump_generation_again_on_commit(self):
+        """Test invalidation inside a transaction is repeated on commit."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                cache.bump_generation(self.user.id)
+                generation = cache.get_generation(self.user.id)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(cache.get_generation(self.user.id), generation)
+
+    def test_eviction_counted(self):
+        """Test a stored entry missing before it expires is an eviction."""
+        stats = cache.CacheStats()
+        stats.record_set("evicted", 300)
+        stats.record_set("expired", -1)
+
+        stats.record_miss("evicted")
+        stats.record_miss("expired")
+        stats.record_miss("never-stored")
+
+        self.assertEqual(stats.misses, 3)
+        self.assertEqual(stats.evictions, 1)
+
+    def test_file_based_backend(self):
+        """Test the cache works with the file based backend."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            caches = {
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                },
+                "api": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",  # noqa
+                    "LOCATION": cache_dir,
+                },
+            }
+            with override_settings(CACHES=caches):
+                self.client.get(RECIPES_URL)
+                res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "HIT")
+
+
+class CacheStatsApiTests(TestCase):
+    """Test the cache stats endpoint."""
+
+    def setUp(self):
+        cache.stats.reset()
+        self.client = APIClient()
+
+    def test_cache_stats_admin_only(self):
+        """Test only admins can see the cache stats."""
+        self.client.force_authenticate(create_user())
+
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cache_stats(self):
+        """Test the counters are returned for admins."""
+        admin = get_user_model().objects.create_superuser(
+            "admin@example.com", "testpass123"
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data), {"hits", "misses", "evictions", "invalidations"}
+        )
@@ -0,0 +1,235 @@
+"""
+Tests for conditional GET (ETag / Last-Modified) on the recipe APIs.
+"""
+import time
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.renderers import FastJSONRenderer
+
+from recipe import cache
+from recipe.views import TagViewSet
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_user(email="user@example.com", password="testpass123"):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def at(timestamp):
+    """Set the clock of recipe/cache.py, which records writes."""
+    clock = Mock(wraps=time)
+    clock.time.return_value = timestamp
+    return patch.object(cache, "time", clock)
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETags on recipe endpoints."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # A whole second, in the past.
+        self.now = int(time.time()) - 100
+
+    def test_list_has_validators(self):
+        """Test list responses carry an ETag and Last-Modified."""
+        with at(self.now + 0.5):
+            create_recipe(user=self.user)
+
+        with at(self.now + 2):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.has_header("ETag"))
+        self.assertEqual(res["Last-Modified"], http_date(self.now))
+        self.assertIn("Accept", res["Vary"])
+
+    def test_no_last_modified_during_write_second(self):
+        """Test Last-Modified is left out until its second is over."""
+        with at(self.now + 0.2):
+            create_recipe(user=self.user)
+
+        with at(self.now + 0.5):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertTrue(res.has_header("ETag"))
+        self.assertFalse(res.has_header("Last-Modified"))
+
+    def test_not_modified_since(self):
+        """Test a current If-Modified-Since gets 304, also from cache."""
+        with at(self.now):
+            recipe = create_recipe(user=self.user)
+        with at(self.now + 2):
+            for url in (RECIPES_URL, detail_url(recipe.id)):
+                since = self.client.get(url)["Last-Modified"]
+
+                res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+
+                self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)  # noqa
+                self.assertEqual(res["Last-Modified"], since)
+
+    def test_list_not_modified(self):
+        """Test a current ETag gets 304 with only the validator query."""
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+        cache.get_cache().clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_list_not_modified_from_cache(self):
+        """Test a cached list answers 304 without any query."""
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_delete_not_hidden_by_if_modified_since(self):
+        """Test a list isn't 304 to If-Modified-Since after a delete."""
+        with at(self.now):
+            recipes = [create_recipe(user=self.user) for _ in range(3)]
+        # Read a second after the last write, or during a later second.
+        for read, delete in ((2, 2.5), (3.9, 4.9)):
+            with at(self.now + read):
+                since = self.client.get(RECIPES_URL)["Last-Modified"]
+            with at(self.now + delete):
+                recipes.pop().delete()
+
+            with at(self.now + delete):
+                res = self.client.get(RECIPES_URL, HTTP_IF_MODIFIED_SINCE=since)  # noqa
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data), len(recipes))
+
+    @patch.object(
+        TagViewSet, "renderer_classes", [FastJSONRenderer, BrowsableAPIRenderer]  # noqa
+    )
+    def test_cached_per_format(self):
+        """Test each format has its own cached ETag."""
+        Tag.objects.create(user=self.user, name="Vegan")
+        etag = self.client.get(TAGS_URL, HTTP_ACCEPT="application/json")["ETag"]  # noqa
+
+        res = self.client.get(TAGS_URL, HTTP_ACCEPT="text/html")
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertIn("Accept", res["Vary"])
+        res = self.client.get(
+            TAGS_URL, HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_query_params(self):
+        """Test a filtered list doesn't share the ETag of the full list."""
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        res = self.client.get(
+            RECIPES_URL, {"tags": "1"}, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_changes_etag(self):
+        """Test deleting a recipe changes the list ETag."""
+        create_recipe(user=self.user)
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_tag_rename_changes_etag(self):
+        """Test renaming a tag changes the recipes list ETag."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        tag.name = "Vegetarian"
+        tag.save()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["tags"][0]["name"], "Vegetarian")
+
+    def test_m2m_change_changes_etag(self):
+        """Test linking a tag to a recipe touches updated_at."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        updated_at = Recipe.objects.get(id=recipe.id).updated_at
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreater(
+            Recipe.objects.get(id=recipe.id).updated_at, updated_at
+        )
+
+    def test_detail_not_modified(self):
+        """Test conditional GET on the recipe detail."""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)["ETag"]
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {"title": "New title"})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "New title")
+
+    def test_tags_list_not_modified(self):
+        """Test conditional GET on the tags list."""
+        Tag.objects.create(user=self.user, name="Vegan")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
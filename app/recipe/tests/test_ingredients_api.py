@@ -15,12 +15,15 @@ from core.models import (
     Ingredient,
     Recipe
 )
+from core.testing import QueryAssertionsMixin
 
 from recipe.serializers import IngredientSerializer
 
 
 # From the recipe module, get url for ingredients: api/recipe/ingredient which for GET retrieves all.  # noqa
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+INGREDIENTS_BULK_URL = reverse("recipe:ingredient-bulk")
+INGREDIENTS_MERGE_URL = reverse("recipe:ingredient-merge")
 
 
 def detail_url(ingredient_id):
@@ -46,7 +49,7 @@ class PublicIngredientsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateIngredientsApiTests(TestCase):
+class PrivateIngredientsApiTests(QueryAssertionsMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -59,7 +62,8 @@ class PrivateIngredientsApiTests(TestCase):
         Ingredient.objects.create(user=self.user, name="Kale")
         Ingredient.objects.create(user=self.user, name="Vanilla")
 
-        res = self.client.get(INGREDIENTS_URL)
+        with self.assertMaxQueries(2):
+            res = self.client.get(INGREDIENTS_URL)
 
         ingredients = Ingredient.objects.all().order_by("-name")
         serializer = IngredientSerializer(ingredients, many=True)
@@ -77,7 +81,8 @@ class PrivateIngredientsApiTests(TestCase):
         ingredient = Ingredient.objects.create(user=self.user, name="Pepper")
 
         # API request made with main user, authenticated user.  # noqa
-        res = self.client.get(INGREDIENTS_URL)
+        with self.assertMaxQueries(2):
+            res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 1)
@@ -92,7 +97,8 @@ class PrivateIngredientsApiTests(TestCase):
         # Payload that will change the name.
         payload = {"name": "Coriander"}
         url = detail_url(ingredient.id)
-        res = self.client.patch(url, payload)
+        with self.assertMaxQueries(4):
+            res = self.client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         ingredient.refresh_from_db()
@@ -103,7 +109,8 @@ class PrivateIngredientsApiTests(TestCase):
         ingredient = Ingredient.objects.create(user=self.user, name="Lettuce")
 
         url = detail_url(ingredient_id=ingredient.id)
-        res = self.client.delete(url)
+        with self.assertMaxQueries(3):
+            res = self.client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         ingredients = Ingredient.objects.filter(user=self.user)
@@ -122,7 +129,8 @@ class PrivateIngredientsApiTests(TestCase):
         )
         recipe.ingredients.add(in1)
 
-        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        with self.assertMaxQueries(2):
+            res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
@@ -150,6 +158,65 @@ class PrivateIngredientsApiTests(TestCase):
         recipe1.ingredients.add(ing)
         recipe2.ingredients.add(ing)
 
-        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        with self.assertMaxQueries(2):
+            res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_merge_ingredients(self):
+        """Test merging duplicate ingredients into one."""
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        dup = Ingredient.objects.create(user=self.user, name="salt ")
+        recipe = Recipe.objects.create(
+            title="Fries", time_minutes=20, price=Decimal("3.00"), user=self.user
+        )
+        recipe.ingredients.add(dup)
+
+        res = self.client.post(
+            INGREDIENTS_MERGE_URL,
+            {"ids": [dup.id], "target": salt.id},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(recipe.ingredients.all()), [salt])
+        self.assertFalse(Ingredient.objects.filter(id=dup.id).exists())
+
+    def test_bulk_rename_and_delete_ingredients(self):
+        """Test renaming and deleting many ingredients."""
+        eggs = Ingredient.objects.create(user=self.user, name="Eggs")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+
+        res = self.client.patch(
+            INGREDIENTS_BULK_URL,
+            [{"id": eggs.id, "name": "Egg"}],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        eggs.refresh_from_db()
+        self.assertEqual(eggs.name, "Egg")
+
+        res = self.client.delete(
+            INGREDIENTS_BULK_URL, {"ids": [eggs.id, salt.id]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_list_ingredients_with_counts(self):
+        """Test with_counts adds the number of recipes of each ingredient."""
+        eggs = Ingredient.objects.create(user=self.user, name="Eggs")
+        Ingredient.objects.create(user=self.user, name="Salt")
+        recipe = Recipe.objects.create(
+            title="Omelette", time_minutes=5, price=Decimal("2.00"), user=self.user
+        )
+        recipe.ingredients.add(eggs)
+
+        with self.assertMaxQueries(2):
+            res = self.client.get(INGREDIENTS_URL, {"with_counts": 1})
+
+        self.assertEqual(
+            [(item["name"], item["recipe_count"]) for item in res.data],
+            [("Salt", 0), ("Eggs", 1)],
+        )
@@ -2,20 +2,26 @@
 Tests for recipe API's.
 """
 from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from core.testing import QueryAssertionsMixin
 
+from recipe import images
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -72,7 +78,7 @@ class PublicRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTest(TestCase):
+class PrivateRecipeApiTest(QueryAssertionsMixin, TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
@@ -91,7 +97,8 @@ class PrivateRecipeApiTest(TestCase):
         create_recipe(user=self.user)
         create_recipe(user=self.user)
 
-        res = self.client.get(RECIPES_URL)
+        with self.assertMaxQueries(4):
+            res = self.client.get(RECIPES_URL)
 
         # Retrieve all recipes
         recipes = Recipe.objects.all().order_by("-id")
@@ -115,7 +122,8 @@ class PrivateRecipeApiTest(TestCase):
         # One by the other user.
         create_recipe(user=self.user)
 
-        res = self.client.get(RECIPES_URL)
+        with self.assertMaxQueries(4):
+            res = self.client.get(RECIPES_URL)
 
         # Only authenticated user recipes
         recipes = Recipe.objects.filter(user=self.user)
@@ -130,7 +138,8 @@ class PrivateRecipeApiTest(TestCase):
         recipe = create_recipe(user=self.user)
 
         url = detail_url(recipe.id)
-        res = self.client.get(url)
+        with self.assertMaxQueries(4):
+            res = self.client.get(url)
 
         serializer = RecipeDetailSerializer(recipe)
 
@@ -144,7 +153,8 @@ class PrivateRecipeApiTest(TestCase):
             "price": Decimal("5.99"),
         }
         # RECIPES URL uses "list" endpoint, so the normal endopint "/recipes"
-        res = self.client.post(RECIPES_URL, payload)
+        with self.assertMaxQueries(5):
+            res = self.client.post(RECIPES_URL, payload)
         # Check code is correct
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
@@ -168,7 +178,8 @@ class PrivateRecipeApiTest(TestCase):
         payload = {"title": "New recipe title"}
         url = detail_url(recipe.id)
 
-        res = self.client.patch(url, payload)
+        with self.assertMaxQueries(6):
+            res = self.client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
@@ -194,7 +205,8 @@ class PrivateRecipeApiTest(TestCase):
             "price": Decimal("2.50"),
         }
         url = detail_url(recipe.id)
-        res = self.client.put(url, payload)
+        with self.assertMaxQueries(6):
+            res = self.client.put(url, payload)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # We need to refresh from db so we the latest object.
@@ -218,7 +230,8 @@ class PrivateRecipeApiTest(TestCase):
         """Test deleting a recipe successful."""
         recipe = create_recipe(user=self.user)
         url = detail_url(recipe.id)
-        res = self.client.delete(url)
+        with self.assertMaxQueries(4):
+            res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
 
@@ -247,7 +260,8 @@ class PrivateRecipeApiTest(TestCase):
             ],
         }
         # Format JSON is required so it accepts nested objects.  noqa
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with self.assertMaxQueries(9):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -279,7 +293,8 @@ class PrivateRecipeApiTest(TestCase):
             "price": Decimal("4.50"),
             "tags": [{"name": "Indian"}, {"name": "Breakfast"}],
         }
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with self.assertMaxQueries(9):
+            res = self.client.post(RECIPES_URL, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         recipes = Recipe.objects.filter(user=self.user)
@@ -318,7 +333,8 @@ class PrivateRecipeApiTest(TestCase):
         tag_lunch = Tag.objects.create(user=self.user, name="Lunch")
         payload = {"tags": [{"name": "Lunch"}]}
         url = detail_url(recipe.id)
-        res = self.client.patch(url, payload, format="json")
+        with self.assertMaxQueries(10):
+            res = self.client.patch(url, payload, format="json")
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(tag_lunch, recipe.tags.all())
@@ -347,7 +363,8 @@ class PrivateRecipeApiTest(TestCase):
             "price": Decimal("4.30"),
             "ingredients": [{"name": "Cauliflower"}, {"name": "Salt"}],
         }
-        res = self.client.post(RECIPES_URL, payload, format="json")
+        with self.assertMaxQueries(9):
+            res = self.client.post(RECIPES_URL, payload, format="json")
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
         # 2. Check recipes in db.
@@ -429,7 +446,8 @@ class PrivateRecipeApiTest(TestCase):
         url = detail_url(recipe.id)
 
         # Updating the 'list' of ingredients.
-        res = self.client.patch(url, payload, format="json")
+        with self.assertMaxQueries(10):
+            res = self.client.patch(url, payload, format="json")
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(ingredient2, recipe.ingredients.all())
 
@@ -451,6 +469,63 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_with_many_tags_query_count(self):
+        """
+        Test nested tags and ingredients are created in bulk.
+        The query count doesn't grow with the number of items.
+        """
+        Tag.objects.create(user=self.user, name="Tag 0")
+        Ingredient.objects.create(user=self.user, name="Ingredient 0")
+        payload = {
+            "title": "Big recipe",
+            "time_minutes": 30,
+            "price": Decimal("2.50"),
+            "tags": [{"name": f"Tag {i}"} for i in range(20)],
+            "ingredients": [{"name": f"Ingredient {i}"} for i in range(30)],
+        }
+
+        # Savepoint, insert recipe, then per relation: select existing,
+        # insert missing, select inserted and insert through rows,
+        # release savepoint, and load tags and ingredients for the response.
+        with self.assertNumQueries(13):
+            res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 20)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 20)
+
+    def test_update_recipe_tags_query_count(self):
+        """Test replacing tags on update doesn't issue a query per tag."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Old"))
+        payload = {"tags": [{"name": f"Tag {i}"} for i in range(20)]}
+
+        # Select recipe, savepoint, clear tags and touch updated_at, select
+        # existing, insert missing, select inserted, insert through rows,
+        # update recipe, release savepoint, and load tags and ingredients
+        # for the response.
+        with self.assertNumQueries(12):
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipe.tags.count(), 20)
+
+    def test_create_recipe_with_repeated_tag(self):
+        """Test a repeated tag name in the payload is only linked once."""
+        payload = {
+            "title": "Pasta",
+            "time_minutes": 15,
+            "price": Decimal("3.00"),
+            "tags": [{"name": "Dinner"}, {"name": "Dinner"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 1)
+
     def test_filter_by_tags(self):
         """Test filtering recipes by tags."""
         # Recipe and Tag creation
@@ -465,7 +540,8 @@ class PrivateRecipeApiTest(TestCase):
         r3 = create_recipe(user=self.user, title='Fish and Chips')
 
         params = {'tags': f'{tag1.id},{tag2.id}'}
-        res = self.client.get(RECIPES_URL, params)
+        with self.assertMaxQueries(4):
+            res = self.client.get(RECIPES_URL, params)
 
         # Serializer objects to compare
         s1 = RecipeSerializer(r1)
@@ -490,7 +566,8 @@ class PrivateRecipeApiTest(TestCase):
         r3 = create_recipe(user=self.user, title='Red Lentil Daal')
 
         params = {'ingredients': f'{ingredient1.id},{ingredient2.id}'}
-        res = self.client.get(RECIPES_URL, params)
+        with self.assertMaxQueries(4):
+            res = self.client.get(RECIPES_URL, params)
 
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
@@ -500,6 +577,289 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_list_recipes_query_count(self):
+        """
+        Test listing recipes uses a fixed number of queries.
+        One query for the ETag validators, one for recipes, one for tags
+        and one for ingredients, no matter how many recipes there are.
+        """
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"T{i}"))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f"I{i}")
+            )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+    def test_get_recipe_detail_query_count(self):
+        """Test retrieving a recipe detail uses a fixed number of queries."""
+        recipe = create_recipe(user=self.user)
+        for i in range(3):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"T{i}"))
+
+        # ETag validators, recipe, tags and ingredients.
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 3)
+
+    def test_partial_update_query_count(self):
+        """Test updating a recipe uses a fixed number of queries."""
+        recipe = create_recipe(user=self.user)
+        for i in range(3):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"T{i}"))
+
+        # Select recipe, savepoint, update recipe, release savepoint,
+        # then load tags and ingredients.
+        with self.assertNumQueries(6):
+            res = self.client.patch(detail_url(recipe.id), {"title": "New"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 3)
+
+    def test_recipes_not_paginated_by_default(self):
+        """Test recipes list is a plain list when no page is requested."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIsInstance(res.data, list)
+
+    def test_paginate_recipes_with_cursor(self):
+        """Test paging through recipes with page_size and cursors."""
+        recipes = [
+            create_recipe(user=self.user, title=f"Recipe {i}")
+            for i in range(5)
+        ]
+        expected_ids = [r.id for r in reversed(recipes)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["previous"])
+
+        ids = [r["id"] for r in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            self.assertLessEqual(len(res.data["results"]), 2)
+            ids += [r["id"] for r in res.data["results"]]
+
+        self.assertEqual(ids, expected_ids)
+
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes having all the given tags."""
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        r1 = create_recipe(user=self.user, title="Vegan Chili")
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title="Vegan Smoothie")
+        r2.tags.add(tag1)
+
+        params = {"tags": f"{tag1.id},{tag2.id}", "tags_match": "all"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [r1.id])
+
+    def test_filter_by_tags_match_invalid(self):
+        """Test an unknown tags_match mode is a bad request."""
+        res = self.client.get(RECIPES_URL, {"tags": "1", "tags_match": "some"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_by_tags_and_ingredients_without_distinct(self):
+        """
+        Test filtering returns each recipe once without DISTINCT.
+        The recipe matches two tags, a join would repeat it.
+        """
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        ingredient = Ingredient.objects.create(user=self.user, name="Beans")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+        recipe.ingredients.add(ingredient)
+
+        params = {"tags": f"{tag1.id},{tag2.id}", "ingredients": ingredient.id}
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data], [recipe.id])
+        sql = next(
+            q["sql"] for q in queries if q["sql"].startswith('SELECT "core_recipe"')  # noqa
+        )
+        self.assertNotIn("DISTINCT", sql)
+        self.assertIn("EXISTS", sql)
+
+    def _search(self, text):
+        """Return the ids of the recipes found for text."""
+        res = self.client.get(RECIPES_URL, {"search": text})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [r["id"] for r in res.data]
+
+    def test_search_title_and_description(self):
+        """Test searching recipe titles and descriptions."""
+        r1 = create_recipe(user=self.user, title="Chocolate Cake")
+        r2 = create_recipe(
+            user=self.user, title="Brownies", description="Dark chocolate."
+        )
+        create_recipe(user=self.user, title="Fish and Chips")
+
+        self.assertEqual(self._search("chocolate"), [r1.id, r2.id])
+
+    def test_search_prefix(self):
+        """Test search terms match word prefixes."""
+        recipe = create_recipe(user=self.user, title="Chocolate Cake")
+        create_recipe(user=self.user, title="Carrot Cake")
+
+        self.assertEqual(self._search("choc cak"), [recipe.id])
+
+    def test_search_typo(self):
+        """Test titles similar to the search are found as a fallback."""
+        recipe = create_recipe(user=self.user, title="Lasagna")
+        create_recipe(user=self.user, title="Fish and Chips")
+
+        self.assertEqual(self._search("lasagne"), [recipe.id])
+
+    def test_search_tags_and_ingredients_of_created_recipe(self):
+        """Test tag and ingredient names of a new recipe are searchable."""
+        payload = {
+            "title": "Pozole",
+            "time_minutes": 60,
+            "price": Decimal("8.50"),
+            "tags": [{"name": "Mexican"}],
+            "ingredients": [{"name": "Hominy"}],
+        }
+        recipe_id = self.client.post(RECIPES_URL, payload, format="json").data["id"]  # noqa
+
+        self.assertEqual(self._search("mexican"), [recipe_id])
+        self.assertEqual(self._search("hominy"), [recipe_id])
+
+    def test_search_follows_renamed_tag(self):
+        """Test renaming or unlinking a tag updates the search."""
+        recipe = create_recipe(user=self.user, title="Pozole")
+        tag = Tag.objects.create(user=self.user, name="Mexican")
+        recipe.tags.add(tag)
+
+        tag.name = "Soup"
+        tag.save()
+        self.assertEqual(self._search("mexican"), [])
+        self.assertEqual(self._search("soup"), [recipe.id])
+
+        recipe.tags.clear()
+        self.assertEqual(self._search("soup"), [])
+
+    def test_search_ranks_title_first(self):
+        """Test title matches rank above description matches."""
+        r1 = create_recipe(
+            user=self.user, title="Brownies", description="Dark chocolate."
+        )
+        r2 = create_recipe(user=self.user, title="Chocolate Cake")
+
+        self.assertEqual(self._search("chocolate"), [r2.id, r1.id])
+
+    def test_search_limited_to_user(self):
+        """Test search only returns recipes of the authenticated user."""
+        other_user = create_user(email="other@example.com", password="test123")
+        create_recipe(user=other_user, title="Chocolate Cake")
+
+        self.assertEqual(self._search("chocolate"), [])
+
+    def test_search_without_words(self):
+        """Test a search with no words returns no recipes."""
+        create_recipe(user=self.user, title="Chocolate Cake")
+
+        self.assertEqual(self._search("&!:*"), [])
+
+    def test_list_sparse_fields(self):
+        """Test only the fields asked for are returned and fetched."""
+        recipe = create_recipe(user=self.user, title="Tamal")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Mexican"))
+
+        # ETag validators and recipes, tags and ingredients aren't loaded.  # noqa
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {"fields": "id,title"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{"id": recipe.id, "title": "Tamal"}])
+        self.assertEqual(len(queries), 2)
+        sql = queries[-1]["sql"]
+        self.assertIn('"core_recipe"."title"', sql)
+        self.assertNotIn('"core_recipe"."price"', sql)
+
+    def test_list_sparse_relations_as_ids(self):
+        """Test relations not expanded are returned as ids."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Mexican")
+        ingredient = Ingredient.objects.create(user=self.user, name="Corn")
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPES_URL, {"fields": "id,tags,ingredients"})
+
+        self.assertEqual(
+            res.data,
+            [{"id": recipe.id, "tags": [tag.id], "ingredients": [ingredient.id]}],  # noqa
+        )
+
+    def test_list_expand(self):
+        """Test expanding some relations and keeping every field."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Mexican")
+        ingredient = Ingredient.objects.create(user=self.user, name="Corn")
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPES_URL, {"expand": "tags"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["title"], recipe.title)
+        self.assertEqual(res.data[0]["tags"], [{"id": tag.id, "name": "Mexican"}])  # noqa
+        self.assertEqual(res.data[0]["ingredients"], [ingredient.id])
+
+    def test_detail_sparse_fields(self):
+        """Test sparse fieldsets on the recipe detail."""
+        recipe = create_recipe(user=self.user, description="Steamed.")
+
+        res = self.client.get(
+            detail_url(recipe.id), {"fields": "description,image_derivatives"}
+        )
+
+        self.assertEqual(
+            res.data, {"description": "Steamed.", "image_derivatives": {}}
+        )
+
+    def test_sparse_fields_unknown(self):
+        """Test unknown fields or relations are a bad request."""
+        res = self.client.get(RECIPES_URL, {"fields": "id,secret"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", res.data)
+
+        # The detail fields aren't in the list.
+        res = self.client.get(RECIPES_URL, {"fields": "description"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {"expand": "title"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expand", res.data)
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test writes still return the full recipe."""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.patch(
+            f"{detail_url(recipe.id)}?fields=id", {"title": "New title"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "New title")
+        self.assertIn("tags", res.data)
+
 
 class ImageUploadTests(TestCase):
     """
@@ -547,6 +907,165 @@ class ImageUploadTests(TestCase):
         self.assertIn("image", res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def _upload_image(self, size=(800, 400)):
+        """
+        Upload a JPEG of the given size to the recipe.
+        The recipe is refreshed so tearDown deletes the file.
+        """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", size).save(image_file, format="JPEG")
+            image_file.seek(0)
+            res = self.client.post(url, {"image": image_file}, format="multipart")  # noqa
+
+        self.recipe.refresh_from_db()
+        return res
+
+    @patch("recipe.images.get_executor")
+    def test_upload_image_queues_derivatives(self, patched_executor):
+        """Test resizing is handed to the worker pool after commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self._upload_image()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_executor.return_value.submit.assert_called_once_with(
+            images._run_job, self.recipe.id
+        )
+
+    @override_settings(
+        RECIPE_IMAGE_SIZES={"thumbnail": 100, "medium": 300},
+        RECIPE_IMAGE_FORMATS=["jpeg"],
+    )
+    def test_generate_derivatives(self):
+        """Test resized images are stored and exposed in the detail."""
+        self._upload_image(size=(800, 400))
+
+        derivatives = images.generate_derivatives(self.recipe.id)
+        self.addCleanup(
+            images.delete_derivatives, self.recipe.image.storage, derivatives
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_derivatives, derivatives)
+        with self.recipe.image.storage.open(derivatives["thumbnail"]["jpeg"]) as f:  # noqa
+            self.assertEqual(Image.open(f).size, (100, 50))
+        with self.recipe.image.storage.open(derivatives["medium"]["jpeg"]) as f:  # noqa
+            self.assertEqual(Image.open(f).size, (300, 150))
+
+        res = self.client.get(detail_url(self.recipe.id))
+        thumbnail_url = res.data["image_derivatives"]["thumbnail"]["jpeg"]
+        self.assertTrue(thumbnail_url.startswith("http://testserver/"))
+
+    @override_settings(RECIPE_IMAGE_FORMATS=["jpeg"])
+    @patch("recipe.images.get_executor")
+    def test_upload_image_deletes_previous_derivatives(self, patched_executor):  # noqa
+        """Test derivatives of a replaced image are deleted on commit."""
+        self._upload_image()
+        first = images.generate_derivatives(self.recipe.id)
+        storage = self.recipe.image.storage
+        previous_image = self.recipe.image.name
+        self.addCleanup(storage.delete, previous_image)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self._upload_image()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.recipe.image_derivatives, {})
+        for formats in first.values():
+            self.assertFalse(storage.exists(formats["jpeg"]))
+
+    @override_settings(RECIPE_IMAGE_FORMATS=["jpeg"])
+    def test_generate_derivatives_again(self):
+        """Test regenerating derivatives deletes the previous files."""
+        self._upload_image()
+        first = images.generate_derivatives(self.recipe.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = images.generate_derivatives(self.recipe.id)
+        self.addCleanup(
+            images.delete_derivatives, self.recipe.image.storage, second
+        )
+
+        storage = self.recipe.image.storage
+        for size_name, formats in first.items():
+            self.assertFalse(storage.exists(formats["jpeg"]))
+            self.assertTrue(storage.exists(second[size_name]["jpeg"]))
+
+    def test_generate_derivatives_image_replaced(self):
+        """Test derivatives of an image replaced while resizing are dropped."""
+        self._upload_image()
+        original = self.recipe.image.name
+
+        def replace_image():
+            """A new upload lands while the job is resizing."""
+            Recipe.objects.filter(id=self.recipe.id).update(image="new.jpg")
+            return ["jpeg"]
+
+        with patch("recipe.images.available_formats", side_effect=replace_image):  # noqa
+            self.assertIsNone(images.generate_derivatives(self.recipe.id))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_derivatives, {})
+        Recipe.objects.filter(id=self.recipe.id).update(image=original)
+        self.recipe.refresh_from_db()
+
+    def _post_file(self, content, suffix=".jpg"):
+        """Upload raw file content as the recipe image."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=suffix) as upload:
+            upload.write(content)
+            upload.seek(0)
+            return self.client.post(url, {"image": upload}, format="multipart")  # noqa
+
+    def _noise_jpeg(self, size):
+        """Return JPEG bytes that don't compress well."""
+        buffer = BytesIO()
+        img = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+        img.save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+    def _staged_files(self):
+        """Partial uploads left in the image directory."""
+        directory = self.recipe.image.storage.path("uploads/recipe")
+        if not os.path.isdir(directory):
+            return []
+        return [f for f in os.listdir(directory) if f.endswith(".part")]
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=5000)
+    def test_upload_image_too_large(self):
+        """Test a file over the size limit is rejected while streaming."""
+        res = self._post_file(self._noise_jpeg((100, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("larger than", str(res.data["image"][0]))
+        self.assertEqual(self._staged_files(), [])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_upload_image_content_length_too_large(self):
+        """Test a body over the limit is rejected before it is read."""
+        res = self._post_file(self._noise_jpeg((300, 300)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._staged_files(), [])
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_upload_image_too_many_pixels(self):
+        """Test the pixel count from the header is checked."""
+        res = self._post_file(self._noise_jpeg((20, 20)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("pixels", str(res.data["image"][0]))
+        self.assertEqual(self._staged_files(), [])
+
+    def test_upload_not_an_image(self):
+        """Test a file that isn't an image is rejected."""
+        res = self._post_file(b"just some text, not an image")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._staged_files(), [])
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
         url = image_upload_url(self.recipe.id)
@@ -0,0 +1,119 @@
+"""
+Tests for reading the recipe APIs from replicas.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.routers import replica_reads
+from recipe import cache
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class ReplicaReadTests(TestCase):
+    """Test which requests read from replicas."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="testpass123"
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Created above, as a write from this user.
+        cache.get_pin_cache().delete(cache._pin_key(self.user.pk))
+
+    def assertReplicaReads(self, expected, method, url, data=None):
+        """Assert whether the request ran in replica_reads()."""
+        with patch(
+            "recipe.replicas.replica_reads", wraps=replica_reads
+        ) as reads:
+            res = getattr(self.client, method)(url, data, format="json")
+
+        self.assertEqual(reads.called, expected)
+        return res
+
+    def test_reads_from_replicas(self):
+        """Test lists and details read from a replica."""
+        res = self.assertReplicaReads(True, "get", RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.assertReplicaReads(True, "get", detail_url(self.recipe.id))
+        self.assertEqual(res.data["title"], "Soup")
+
+        self.assertReplicaReads(True, "get", TAGS_URL)
+
+    def test_writes_on_primary(self):
+        """Test writes and the reads they do use the primary."""
+        res = self.assertReplicaReads(
+            False, "patch", detail_url(self.recipe.id), {"title": "Stew"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_read_your_writes(self):
+        """Test a user reads the primary for a while after writing."""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="testpass123"
+        )
+        cache.get_pin_cache().delete(cache._pin_key(other.pk))
+
+        self.client.post(
+            RECIPES_URL,
+            {"title": "Curry", "time_minutes": 5, "price": "1.00"},
+            format="json",
+        )
+
+        self.assertTrue(cache.pinned_to_primary(self.user.pk))
+        res = self.assertReplicaReads(False, "get", RECIPES_URL)
+        self.assertEqual(len(res.data), 2)
+        # Other users aren't pinned.
+        self.client.force_authenticate(other)
+        self.assertReplicaReads(True, "get", RECIPES_URL)
+
+    def test_pin_expires(self):
+        """Test reads go back to replicas once the pin expires."""
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            cache.pin_to_primary(self.user.pk)
+
+        self.assertFalse(cache.pinned_to_primary(self.user.pk))
+        self.assertReplicaReads(True, "get", RECIPES_URL)
+
+    def test_pin_outlives_response_cache(self):
+        """
+        Test the pin doesn't live with the responses, another process
+        (its own response cache) or caching off still sees it.
+        """
+        self.client.patch(detail_url(self.recipe.id), {"title": "Stew"}, format="json")
+        cache.get_cache().clear()
+
+        res = self.assertReplicaReads(False, "get", detail_url(self.recipe.id))  # noqa
+        self.assertEqual(res.data["title"], "Stew")
+
+        dummy = "django.core.cache.backends.dummy.DummyCache"
+        with self.settings(
+            CACHES={**settings.CACHES, "api": {"BACKEND": dummy}}
+        ):
+            self.client.patch(
+                detail_url(self.recipe.id), {"title": "Soup"}, format="json"
+            )
+            self.assertReplicaReads(False, "get", detail_url(self.recipe.id))
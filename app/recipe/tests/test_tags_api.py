@@ -2,17 +2,22 @@
 Tests for the tags API.
 """
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Recipe, Tag
+from core.testing import QueryAssertionsMixin
 
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+TAGS_BULK_URL = reverse("recipe:tag-bulk")
+TAGS_MERGE_URL = reverse("recipe:tag-merge")
 
 
 def detail_url(tag_id):
@@ -25,6 +30,15 @@ def create_user(email="user@example.com", password="testpass123"):
     return get_user_model().objects.create_user(email=email, password=password)
 
 
+def create_recipe(user, *tags, **params):
+    """Create and return a sample recipe with these tags."""
+    defaults = {"title": "Sample recipe", "time_minutes": 5, "price": 1}
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.tags.add(*tags)
+    return recipe
+
+
 class PublicTagsApiTests(TestCase):
     """Test unauthenticated API requests."""
 
@@ -38,7 +52,7 @@ class PublicTagsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsApiTests(TestCase):
+class PrivateTagsApiTests(QueryAssertionsMixin, TestCase):
     """
     Test authenticated API requests.
     """
@@ -53,7 +67,8 @@ class PrivateTagsApiTests(TestCase):
         Tag.objects.create(user=self.user, name="Vegan")
         Tag.objects.create(user=self.user, name="Dessert")
 
-        res = self.client.get(TAGS_URL)
+        with self.assertMaxQueries(2):
+            res = self.client.get(TAGS_URL)
 
         tags = Tag.objects.all().order_by("-name")
         serializer = TagSerializer(tags, many=True)
@@ -69,7 +84,8 @@ class PrivateTagsApiTests(TestCase):
         # Testing that /tags/
         # endpoint lists only
         # tags for authenticated users.
-        res = self.client.get(TAGS_URL)
+        with self.assertMaxQueries(2):
+            res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # Only 1 tag, the one we created with authenticated user.
@@ -86,7 +102,8 @@ class PrivateTagsApiTests(TestCase):
         # Updating with patch
         payload = {"name": "Dessert"}
         url = detail_url(tag.id)
-        res = self.client.patch(url, payload)
+        with self.assertMaxQueries(4):
+            res = self.client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         tag.refresh_from_db()
@@ -97,9 +114,304 @@ class PrivateTagsApiTests(TestCase):
         tag = Tag.objects.create(user=self.user, name="Breakfast")
 
         url = detail_url(tag.id)
-        res = self.client.delete(url)
+        with self.assertMaxQueries(3):
+            res = self.client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
         # Since the user only created 1 tag and then we delete it, there shouldn't be any.  # noqa
         self.assertFalse(tags.exists())
+
+    def test_paginate_tags_with_cursor(self):
+        """Test paging tags by cursor returns every tag in order."""
+        for name in ["Vegan", "Apple", "Dinner", "Lunch", "Fruity"]:
+            Tag.objects.create(user=self.user, name=name)
+
+        with self.assertMaxQueries(2):
+            res = self.client.get(TAGS_URL, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        ids = [t["id"] for t in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            ids += [t["id"] for t in res.data["results"]]
+
+        expected = Tag.objects.filter(user=self.user).order_by("-name", "-id")
+        self.assertEqual(ids, [t.id for t in expected])
+
+    def test_update_tag_duplicate_name_error(self):
+        """Test renaming a tag to a name the user already has fails."""
+        Tag.objects.create(user=self.user, name="Breakfast")
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+
+        res = self.client.patch(detail_url(tag.id), {"name": "Breakfast"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "Lunch")
+
+    def test_bulk_rename_tags(self):
+        """Test renaming many tags with one request."""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        untouched = Tag.objects.create(user=self.user, name="Dinner")
+        recipe = create_recipe(self.user, tag1)
+        updated_at = tag1.updated_at
+        payload = [
+            {"id": tag1.id, "name": "Brunch"},
+            {"id": tag2.id, "name": "Lunch "},
+        ]
+
+        with self.assertNumQueries(4):
+            res = self.client.patch(TAGS_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            [{"id": tag1.id, "name": "Brunch"}, {"id": tag2.id, "name": "Lunch"}],  # noqa
+        )
+        tag1.refresh_from_db()
+        self.assertEqual(tag1.name, "Brunch")
+        self.assertGreater(tag1.updated_at, updated_at)
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.name, "Dinner")
+        # The search vectors follow the new names.
+        self.assertTrue(
+            Recipe.objects.filter(
+                pk=recipe.pk, search_vector="brunch"
+            ).exists()
+        )
+
+    def test_bulk_rename_tags_swap(self):
+        """Test names can move between the renamed tags."""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        tag3 = Tag.objects.create(user=self.user, name="Dinner")
+        payload = [
+            {"id": tag1.id, "name": "Lunch"},
+            {"id": tag2.id, "name": "Breakfast"},
+            {"id": tag3.id, "name": "Brunch"},
+        ]
+
+        res = self.client.patch(TAGS_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            dict(Tag.objects.values_list("id", "name")),
+            {tag1.id: "Lunch", tag2.id: "Breakfast", tag3.id: "Brunch"},
+        )
+
+    def test_bulk_rename_tags_errors(self):
+        """Test nothing is renamed if any tag can't be."""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        other = Tag.objects.create(user=create_user("u2@example.com"), name="X")
+
+        cases = [
+            ([{"id": tag1.id, "name": "Lunch"}], "name"),
+            ([{"id": tag1.id, "name": "B"}, {"id": other.id, "name": "Y"}], "ids"),  # noqa
+            ([{"id": tag1.id, "name": "A"}, {"id": tag1.id, "name": "B"}], None),  # noqa
+            ([{"id": tag1.id, "name": "A"}, {"id": tag2.id, "name": "A"}], None),  # noqa
+            ([], None),
+        ]
+        for payload, field in cases:
+            with self.subTest(payload=payload):
+                res = self.client.patch(
+                    TAGS_BULK_URL, payload, format="json"
+                )
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)  # noqa
+                if field:
+                    self.assertIn(field, res.data)
+
+        self.assertEqual(
+            sorted(Tag.objects.filter(user=self.user).values_list("name", flat=True)),  # noqa
+            ["Breakfast", "Lunch"],
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.name, "X")
+
+    def test_bulk_delete_tags(self):
+        """Test deleting many tags removes them from their recipes."""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        kept = Tag.objects.create(user=self.user, name="Dinner")
+        recipe = create_recipe(self.user, tag1, tag2, kept)
+        recipe.refresh_from_db()
+        updated_at = recipe.updated_at
+
+        with self.assertNumQueries(4):
+            res = self.client.delete(
+                TAGS_BULK_URL, {"ids": [tag1.id, tag2.id]}, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Tag.objects.filter(user=self.user)), [kept])
+        recipe.refresh_from_db()
+        self.assertEqual(list(recipe.tags.all()), [kept])
+        self.assertGreater(recipe.updated_at, updated_at)
+        self.assertFalse(
+            Recipe.objects.filter(search_vector="breakfast").exists()
+        )
+
+    def test_bulk_delete_other_users_tags(self):
+        """Test tags of other users can't be deleted."""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+        other = Tag.objects.create(user=create_user("u2@example.com"), name="X")
+
+        res = self.client.delete(
+            TAGS_BULK_URL, {"ids": [tag.id, other.id]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(other.id), str(res.data["ids"]))
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_merge_tags(self):
+        """Test merging tags moves their recipes to the target."""
+        target = Tag.objects.create(user=self.user, name="Dinner")
+        dup1 = Tag.objects.create(user=self.user, name="dinner")
+        dup2 = Tag.objects.create(user=self.user, name="Dinner ")
+        other = Tag.objects.create(user=self.user, name="Vegan")
+        both = create_recipe(self.user, target, dup1, dup2, title="Soup")
+        moved = create_recipe(self.user, dup1, dup2, other, title="Curry")
+        untouched = create_recipe(self.user, other, title="Salad")
+        untouched.refresh_from_db()
+        updated_at = untouched.updated_at
+
+        with self.assertNumQueries(6):
+            res = self.client.post(
+                TAGS_MERGE_URL,
+                {"ids": [dup1.id, dup2.id], "target": target.id},
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"id": target.id, "name": "Dinner"})
+        self.assertFalse(Tag.objects.filter(id__in=[dup1.id, dup2.id]).exists())  # noqa
+        self.assertEqual(list(both.tags.all()), [target])
+        self.assertEqual(
+            sorted(tag.name for tag in moved.tags.all()), ["Dinner", "Vegan"]
+        )
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.updated_at, updated_at)
+        self.assertEqual(
+            sorted(
+                Recipe.objects.filter(search_vector="dinner")
+                .values_list("title", flat=True)
+            ),
+            ["Curry", "Soup"],
+        )
+
+    def test_merge_tags_errors(self):
+        """Test invalid merges change nothing."""
+        target = Tag.objects.create(user=self.user, name="Dinner")
+        dup = Tag.objects.create(user=self.user, name="dinner")
+        other = Tag.objects.create(user=create_user("u2@example.com"), name="X")
+
+        cases = [
+            ({"ids": [dup.id], "target": other.id}, "target"),
+            ({"ids": [other.id], "target": target.id}, "ids"),
+            ({"ids": [dup.id, target.id], "target": target.id}, "target"),
+            ({"ids": [], "target": target.id}, "ids"),
+        ]
+        for payload, field in cases:
+            with self.subTest(payload=payload):
+                res = self.client.post(TAGS_MERGE_URL, payload, format="json")
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)  # noqa
+                self.assertIn(field, res.data)
+
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_bulk_changes_invalidate_list(self):
+        """Test bulk changes show up in the cached list."""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+        self.client.get(TAGS_URL)
+
+        self.client.patch(
+            TAGS_BULK_URL, [{"id": tag.id, "name": "Brunch"}], format="json"
+        )
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data, [{"id": tag.id, "name": "Brunch"}])
+
+    def test_list_tags_with_counts(self):
+        """Test with_counts adds the number of recipes of each tag."""
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        dessert = Tag.objects.create(user=self.user, name="Dessert")
+        unused = Tag.objects.create(user=self.user, name="Unused")
+        create_recipe(self.user, vegan, dessert)
+        create_recipe(self.user, vegan)
+
+        with self.assertMaxQueries(2):
+            res = self.client.get(TAGS_URL, {"with_counts": 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            [
+                {"id": vegan.id, "name": "Vegan", "recipe_count": 2},
+                {"id": unused.id, "name": "Unused", "recipe_count": 0},
+                {"id": dessert.id, "name": "Dessert", "recipe_count": 1},
+            ],
+        )
+
+        res = self.client.get(TAGS_URL, {"with_counts": 1, "assigned_only": 1})  # noqa
+
+        self.assertEqual(
+            [(tag["name"], tag["recipe_count"]) for tag in res.data],
+            [("Vegan", 2), ("Dessert", 1)],
+        )
+
+    def test_list_tags_flags(self):
+        """Test flags accept true/false, and reject anything else."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        create_recipe(self.user, tag)
+
+        res = self.client.get(TAGS_URL, {"with_counts": "true"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["recipe_count"], 1)
+        res = self.client.get(TAGS_URL, {"with_counts": "False"})
+        self.assertNotIn("recipe_count", res.data[0])
+
+        for params in ({"with_counts": "yes"}, {"assigned_only": "2"}):
+            with self.subTest(params=params):
+                res = self.client.get(TAGS_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)  # noqa
+                self.assertIn(next(iter(params)), res.data)
+
+    def test_list_tags_with_counts_same_queries(self):
+        """Test counts come with the list query, not one per tag."""
+        for i in range(5):
+            tag = Tag.objects.create(user=self.user, name=f"Tag {i}")
+            create_recipe(self.user, tag)
+
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(TAGS_URL)
+        with CaptureQueriesContext(connection) as counted:
+            res = self.client.get(TAGS_URL, {"with_counts": 1})
+
+        self.assertEqual(len(counted), len(plain))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual({tag["recipe_count"] for tag in res.data}, {1})
+
+    def test_list_tags_with_counts_paginated(self):
+        """Test counts on cursor pages."""
+        for i in range(3):
+            tag = Tag.objects.create(user=self.user, name=f"Tag {i}")
+            create_recipe(self.user, tag)
+
+        res = self.client.get(TAGS_URL, {"with_counts": 1, "page_size": 2})
+        following = self.client.get(res.data["next"])
+
+        self.assertEqual(
+            [tag["recipe_count"] for tag in res.data["results"]], [1, 1]
+        )
+        self.assertEqual(
+            [tag["name"] for tag in following.data["results"]], ["Tag 0"]
+        )
+        self.assertIn("recipe_count", following.data["results"][0])
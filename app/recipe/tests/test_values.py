@@ -0,0 +1,180 @@
+"""
+Tests for the fast values serializers.
+They must render byte for byte what the model serializers render.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import cache
+from recipe.serializers import (
+    IngredientSerializer,
+    IngredientValuesSerializer,
+    RecipeDetailSerializer,
+    RecipeSerializer,
+    RecipeValuesSerializer,
+    TagSerializer,
+    TagValuesSerializer,
+)
+from recipe.values import ValuesSerializer
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def create_user(email="user@example.com", password="testpass123"):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def render(data):
+    """Render data like the API does."""
+    return JSONRenderer().render(data)
+
+
+class ValuesSerializerParityTests(TestCase):
+    """Test values serializers render like the model serializers."""
+
+    def setUp(self):
+        self.user = create_user()
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ("Vegan", "Dinner", "Café")
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ("Rice", "Beans", "Jalapeño")
+        ]
+        prices = ["5.50", "0.05", "999.99", "12.00"]
+        for i, price in enumerate(prices):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"Recipe \"{i}\" ñ",
+                time_minutes=i * 10,
+                price=Decimal(price),
+                link="" if i % 2 else f"https://example.com/{i}",
+            )
+            # The last recipe has no tags nor ingredients.
+            if i < len(prices) - 1:
+                recipe.tags.add(*tags[i:])
+                recipe.ingredients.add(*ingredients[:i + 1])
+
+    def _recipes(self):
+        """Recipes with their relations prefetched like the views do."""
+        return Recipe.objects.order_by("-id").prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.order_by("id")),
+            Prefetch("ingredients", queryset=Ingredient.objects.order_by("id")),  # noqa
+        )
+
+    def _assert_parity(self, values_class, serializer_class, queryset, **kwargs):  # noqa
+        """Test both serializers render the same bytes."""
+        expected = serializer_class(queryset, many=True, **kwargs).data
+
+        values_serializer = values_class(**kwargs)
+        rows = list(values_serializer.values(queryset))
+        data = values_serializer.to_representation(rows)
+
+        self.assertEqual(render(data), render(expected))
+
+    def test_recipes(self):
+        """Test recipes render like RecipeSerializer."""
+        self._assert_parity(
+            RecipeValuesSerializer, RecipeSerializer, self._recipes()
+        )
+
+    def test_recipes_sparse_fieldsets(self):
+        """Test fields/expand render like RecipeSerializer."""
+        cases = [
+            {"fields": ["id", "title"], "expand": []},
+            {"fields": ["price", "tags"], "expand": []},
+            {"fields": ["title", "tags", "ingredients"], "expand": ["tags"]},
+            {"fields": RecipeSerializer.Meta.fields, "expand": ["ingredients"]},  # noqa
+        ]
+        for kwargs in cases:
+            with self.subTest(**kwargs):
+                self._assert_parity(
+                    RecipeValuesSerializer,
+                    RecipeSerializer,
+                    self._recipes(),
+                    **kwargs,
+                )
+
+    def test_tags_and_ingredients(self):
+        """Test tags and ingredients render like their serializers."""
+        self._assert_parity(
+            TagValuesSerializer, TagSerializer, Tag.objects.order_by("-name")
+        )
+        self._assert_parity(
+            IngredientValuesSerializer,
+            IngredientSerializer,
+            Ingredient.objects.order_by("-name"),
+        )
+
+    def test_empty(self):
+        """Test rendering no rows runs no query."""
+        serializer = RecipeValuesSerializer()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(serializer.to_representation([]), [])
+
+    def test_unsupported_field(self):
+        """Test fields that need model instances are refused."""
+
+        class DetailValuesSerializer(ValuesSerializer):
+            serializer_class = RecipeDetailSerializer
+
+        with self.assertRaises(ImproperlyConfigured):
+            DetailValuesSerializer()
+
+
+class ValuesListApiTests(TestCase):
+    """Test list endpoints render like the model serializers."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipes_list(self):
+        """Test the recipes list response bytes."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"Recipe {i}",
+                time_minutes=5,
+                price=Decimal("4.10"),
+            )
+            recipe.tags.add(tag)
+        recipes = Recipe.objects.order_by("-id").prefetch_related(
+            "tags", "ingredients"
+        )
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            res.content, render(RecipeSerializer(recipes, many=True).data)
+        )
+
+    def test_tags_list(self):
+        """Test the tags list response bytes."""
+        for name in ("Vegan", "Dinner"):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(
+            res.content,
+            render(TagSerializer(Tag.objects.order_by("-name"), many=True).data),  # noqa
+        )
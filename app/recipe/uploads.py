@@ -0,0 +1,145 @@
+"""
+Streaming upload handler for recipe images.
+
+Chunks are written to disk as they arrive, so memory per upload stays
+flat, and limits are checked as soon as they are crossed:
+- The declared Content-Length, before reading the body.
+- The image header, sniffed from the first chunks with Pillow, which
+  also gives the pixel count without decoding the image.
+- The bytes received so far, on every chunk.
+
+The file is staged in the directory of recipe_image_file_path, so the
+storage moves it into place with a rename instead of copying it.
+"""
+import os
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.utils.translation import gettext as _
+
+from PIL import Image
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import recipe_image_file_path
+
+
+# Bytes of the file kept to identify the image, the header has to fit.
+HEADER_LIMIT = 256 * 1024
+# Room for multipart boundaries and other form fields.
+FORM_OVERHEAD = 64 * 1024
+
+
+class StagedUploadedFile(UploadedFile):
+    """
+    An upload already written to its final directory.
+    Like TemporaryUploadedFile, storage moves it instead of copying it.
+    """
+
+    def __init__(self, path, name, content_type, size, charset,
+                 content_type_extra=None):
+        super().__init__(
+            open(path, "rb"), name, content_type, size, charset,
+            content_type_extra,
+        )
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """Stream the 'image' field to disk, enforcing size and pixel limits."""
+
+    field_name = "image"
+
+    def __init__(self, request=None, directory=None):
+        super().__init__(request)
+        # Use staging_dir() of the image storage.
+        self.directory = directory
+        self.max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        self.max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        self.staged_path = None
+        self._file = None
+
+    @staticmethod
+    def staging_dir(storage):
+        """Directory images end up in, or None if storage isn't local."""
+        try:
+            return storage.path(os.path.dirname(recipe_image_file_path(None, "")))  # noqa
+        except NotImplementedError:
+            return None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Reject what is too big before reading any of it.
+        if content_length > self.max_bytes + FORM_OVERHEAD:
+            self._reject(_("Image is larger than %(max)s bytes."))
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.field_name:
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.staged_path = os.path.join(self.directory, f".{uuid.uuid4()}.part")  # noqa
+        self._file = open(self.staged_path, "wb")
+        self._size = 0
+        self._header = b""
+        self._identified = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self._size += len(raw_data)
+        if self._size > self.max_bytes:
+            self._reject(_("Image is larger than %(max)s bytes."))
+        if not self._identified:
+            self._check_header(raw_data)
+
+        self._file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self._identified:
+            self._reject(_("Upload a valid image."))
+        self._file.close()
+
+        return StagedUploadedFile(
+            self.staged_path,
+            self.file_name,
+            self.content_type,
+            file_size,
+            self.charset,
+            self.content_type_extra,
+        )
+
+    def _check_header(self, raw_data):
+        """Identify the image from its header and check the pixel count."""
+        self._header += raw_data
+        try:
+            width, height = Image.open(BytesIO(self._header)).size
+        except Image.DecompressionBombError:
+            self._reject(_("Image has more than %(max)s pixels."), self.max_pixels)  # noqa
+        except Exception:
+            # Maybe the header isn't complete yet.
+            if len(self._header) >= HEADER_LIMIT:
+                self._reject(_("Upload a valid image."))
+            return
+
+        if width * height > self.max_pixels:
+            self._reject(_("Image has more than %(max)s pixels."), self.max_pixels)  # noqa
+        self._identified = True
+        self._header = b""
+
+    def _reject(self, message, limit=None):
+        self.cleanup()
+        limit = self.max_bytes if limit is None else limit
+        raise ValidationError({self.field_name: [message % {"max": limit}]})
+
+    def cleanup(self):
+        """Remove the staged file if it wasn't moved into place."""
+        if self._file is not None:
+            self._file.close()
+        if self.staged_path and os.path.exists(self.staged_path):
+            os.remove(self.staged_path)
@@ -21,4 +21,7 @@ router.register("ingredients", views.IngredientViewSet)
 app_name = "recipe"
 
 # Include the router urls
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("cache-stats/", views.CacheStatsView.as_view(), name="cache-stats"),
+    path("", include(router.urls)),
+]
@@ -0,0 +1,171 @@
+"""
+Fast read-only serializers for list endpoints.
+
+They render .values() rows instead of model instances, and many to
+many relations from one query on the through table, grouped in Python.
+The output is the same as the ModelSerializer they mirror: field order,
+names and representation (i.e: Decimal as a string) come from its
+fields, only the per-row field machinery is skipped.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.response import Response
+
+from core.instrumentation import timed
+
+
+# Fields whose representation of a database value is the value itself.
+IDENTITY_FIELDS = (
+    drf_fields.IntegerField,
+    drf_fields.CharField,
+    drf_fields.BooleanField,
+)
+
+
+class ValuesSerializer:
+    """
+    Read-only serializer of .values() rows, rendering like
+    `serializer_class`. Supports model fields and many to many relations,
+    nested or as ids. Arguments are passed to serializer_class,
+    i.e: fields/expand.
+    """
+
+    serializer_class = None
+
+    def __init__(self, *args, **kwargs):
+        serializer = self.serializer_class(*args, **kwargs)
+        self.model = serializer.Meta.model
+        # (name, column, converter) for columns, (name, None, nested)
+        # for relations, where nested is None for ids.
+        self.fields = []
+        self.relations = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                nested = type(
+                    f"{type(field.child).__name__}Values",
+                    (ValuesSerializer,),
+                    {"serializer_class": type(field.child)},
+                )()
+                self.relations.append((name, nested))
+            elif isinstance(field, relations.ManyRelatedField):
+                self.relations.append((name, None))
+            elif isinstance(field, (
+                serializers.BaseSerializer,
+                relations.RelatedField,
+                drf_fields.SerializerMethodField,
+            )):
+                raise ImproperlyConfigured(
+                    f"{type(self).__name__} can't render field '{name}'."
+                )
+            else:
+                converter = (
+                    None if isinstance(field, IDENTITY_FIELDS)
+                    else field.to_representation
+                )
+                self.fields.append((name, field.source, converter))
+                continue
+            self.fields.append((name, None, None))
+
+        # id groups the relations, and keys the cursor pagination.
+        self.columns = list(
+            dict.fromkeys(
+                ["id"] + [column for _, column, _ in self.fields if column]
+            )
+        )
+
+    def values(self, queryset):
+        """Return the queryset as the rows this serializer renders."""
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def related(self, name, nested, ids):
+        """
+        Return {id: [rendered related objects]} for a many to many
+        relation, with one query on the through table. Related objects
+        are ordered by id, like the views prefetch them.
+        """
+        descriptor = getattr(self.model, name)
+        through = descriptor.through
+        source = f"{descriptor.field.m2m_field_name()}_id"
+        target = descriptor.field.m2m_reverse_field_name()
+
+        rows = through.objects.filter(**{f"{source}__in": ids}).order_by(
+            f"{target}_id"
+        )
+        grouped = defaultdict(list)
+        if nested is None:
+            for owner_id, related_id in rows.values_list(
+                source, f"{target}_id"
+            ):
+                grouped[owner_id].append(related_id)
+            return grouped
+
+        columns = [f"{target}__{column}" for column in nested.columns]
+        # A tag linked to many recipes is rendered once.
+        rendered = {}
+        for owner_id, *values in rows.values_list(source, *columns):
+            related_id = values[0]
+            item = rendered.get(related_id)
+            if item is None:
+                item = rendered[related_id] = nested.render(
+                    dict(zip(nested.columns, values)), {}
+                )
+            grouped[owner_id].append(item)
+
+        return grouped
+
+    def render(self, row, related):
+        """Render one row, related is {relation: grouped rows}."""
+        item = {}
+        for name, column, converter in self.fields:
+            if column is None:
+                item[name] = related[name].get(row["id"], [])
+                continue
+            value = row[column]
+            if converter is not None and value is not None:
+                value = converter(value)
+            item[name] = value
+
+        return item
+
+    def to_representation(self, rows):
+        """Render the rows, with one query per relation."""
+        with timed("serialize"):
+            ids = [row["id"] for row in rows]
+            related = {
+                name: self.related(name, nested, ids) if ids else {}
+                for name, nested in self.relations
+            }
+
+            return [self.render(row, related) for row in rows]
+
+
+class ValuesListMixin:
+    """
+    List with values_serializer_class, rendering like the list serializer
+    of the view, from .values() rows.
+    """
+
+    values_serializer_class = None
+
+    def get_values_serializer(self, *args, **kwargs):
+        """Return the values serializer for the list."""
+        return self.values_serializer_class(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.to_representation(page)
+            )
+
+        return Response(serializer.to_representation(list(queryset)))
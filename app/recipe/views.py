@@ -1,6 +1,12 @@
 """
 Views for the recipe API's.
 """
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext as _
+
 from rest_framework import (
     viewsets,
     mixins,
@@ -15,17 +21,58 @@ from drf_spectacular.utils import (
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
+from core.authentication import CachedTokenAuthentication
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.renderers import NDJSONRenderer
+from recipe import images, serializers
+from recipe.bulk import (
+    ImportJSONParser,
+    ImportNDJSONParser,
+    delete_attrs,
+    export_recipes,
+    import_recipes,
+    merge_attrs,
+    rename_attrs,
+)
+from recipe.cache import CachedListMixin, stats as cache_stats
+from recipe.conditional import ConditionalGetMixin
+from recipe.replicas import ReplicaReadMixin
+from recipe.search import search_recipes
+from recipe.values import ValuesListMixin
+from recipe.uploads import RecipeImageUploadHandler
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to return.'
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of the relations (tags, ingredients) '
+            'returned as objects, the others are returned as ids. '
+            'All of them by default, unless fields is sent.'
+        )
+    ),
+]
 
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=SPARSE_FIELDSET_PARAMETERS + [
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
@@ -35,11 +82,31 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter'
-            )
+            ),
+            OpenApiParameter(
+                'tags_match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Match recipes with any (default) or all the tags.'
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description=(
+                    'Search title, description, tag and ingredient names. '
+                    'Best matches first, or by id when paginated.'
+                )
+            ),
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ReplicaReadMixin,
+    CachedListMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     """
     View for manage recipe API's.
     ModelViewSet will help on the different endpoints.
@@ -49,11 +116,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
     serializer_class = (
         serializers.RecipeDetailSerializer
     )  # We changed to be detail the default one.  noqa
+    # Renders lists like RecipeSerializer, without building model instances.  # noqa
+    values_serializer_class = serializers.RecipeValuesSerializer
     queryset = Recipe.objects.all()
     # Specifies authentication
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # This means you need to be authenticated.
     permission_classes = [IsAuthenticated]
+    # Opt-in, only when 'page_size' or 'cursor' is sent.
+    pagination_class = RecipeCursorPagination
 
     # parser_classes = [MultiPartParser]
 
@@ -61,6 +132,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _params_to_names(self, param, allowed):
+        """
+        Convert a comma separated query param to a list of names.
+        None if it wasn't sent.
+        """
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValidationError(
+                {param: [_('Unknown field(s): %s.') % ', '.join(unknown)]}
+            )
+
+        return names
+
+    def get_fieldset(self):
+        """
+        Return the (fields, expand) asked for in the query params.
+        (None, None) renders every field, like for writes.
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None, None
+
+        if not hasattr(self, '_fieldset'):
+            serializer_class = self.get_serializer_class()
+            fields = self._params_to_names(
+                'fields', serializer_class.Meta.fields
+            )
+            expand = self._params_to_names(
+                'expand', serializer_class.expandable_fields
+            )
+            # Sending either one renders relations not expanded as ids.
+            if expand is not None and fields is None:
+                fields = serializer_class.Meta.fields
+            if fields is not None and expand is None:
+                expand = []
+            self._fieldset = fields, expand
+
+        return self._fieldset
+
+    def _related_queryset(self, relation):
+        """
+        Tags or ingredients of recipes, by id so the order is stable.
+        The list (recipe.values) renders them in the same order.
+        """
+        model = Recipe._meta.get_field(relation).related_model
+
+        return model.objects.order_by('id')
+
+    def _sparse_queryset(self, queryset, fields, expand):
+        """
+        Only fetch the columns and relations the response needs.
+        Relations rendered as ids only load the ids.
+        """
+        model_fields = {field.name for field in Recipe._meta.concrete_fields}
+        columns = {'id'} | {name for name in fields if name in model_fields}
+        if 'image_derivatives' in columns:
+            # Its URLs are built with the storage of the image.
+            columns.add('image')
+        queryset = queryset.only(*columns)
+
+        for relation in ('tags', 'ingredients'):
+            if relation not in fields:
+                continue
+            related = self._related_queryset(relation)
+            if relation not in expand:
+                related = related.only('id')
+            queryset = queryset.prefetch_related(
+                Prefetch(relation, queryset=related)
+            )
+
+        return queryset
+
     def get_queryset(self):
         """
         Retrieve recipes for authenticated users. Desc order by recipe id
@@ -68,22 +215,86 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        tags_match = self.request.query_params.get('tags_match', 'any')
+        search = self.request.query_params.get('search')
 
-        queryset = self.queryset
+        if tags_match not in ('any', 'all'):
+            raise ValidationError(
+                {'tags_match': [_("Must be 'any' or 'all'.")]}
+            )
+
+        # The search document is only used in WHERE, never sent to clients.
+        queryset = self.queryset.defer('search_vector')
+
+        # Filters are semi-joins (WHERE EXISTS) on the through tables, instead of joins.  # noqa
+        # A join repeats a recipe once per matching tag, and needs a DISTINCT over whole rows.  # noqa
+        recipe_tags = Recipe.tags.through.objects.filter(recipe_id=OuterRef('pk'))
+        recipe_ingredients = Recipe.ingredients.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
 
         if tags:
             tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
+            if tags_match == 'all':
+                for tag_id in set(tags_ids):
+                    queryset = queryset.filter(
+                        Exists(recipe_tags.filter(tag_id=tag_id))
+                    )
+            else:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id__in=tags_ids))
+                )
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(
+                Exists(recipe_ingredients.filter(ingredient_id__in=ingredient_ids))  # noqa
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()  # We have to use distinct here, because a recipe having the same tag and id, is going to be repeated in the queryset.   # noqa
+        queryset = queryset.filter(user=self.request.user)
+        if search:
+            queryset = search_recipes(queryset, search)
+        else:
+            queryset = queryset.order_by('-id')
+
+        # Load nested tags and ingredients with one query each, instead of one per recipe.  # noqa
+        # Writes are skipped: DRF drops the prefetch cache after an update anyway.  # noqa
+        # Lists select their own columns and relations (recipe.values).
+        if self.action == 'retrieve':
+            fields, expand = self.get_fieldset()
+            if fields is not None:
+                queryset = self._sparse_queryset(queryset, fields, expand)
+            else:
+                queryset = queryset.prefetch_related(
+                    Prefetch('tags', queryset=self._related_queryset('tags')),
+                    Prefetch(
+                        'ingredients',
+                        queryset=self._related_queryset('ingredients')
+                    ),
+                )
+
+        return queryset
+
+    def get_values_serializer(self, *args, **kwargs):
+        """Render only the fields asked for."""
+        fields, expand = self.get_fieldset()
+
+        return super().get_values_serializer(
+            *args, fields=fields, expand=expand, **kwargs
+        )
 
+    def get_serializer(self, *args, **kwargs):
+        """Render only the fields asked for on reads."""
+        fields, expand = self.get_fieldset()
+        if fields is not None or expand is not None:
+            kwargs.update(fields=fields, expand=expand)
 
-        # return self.queryset.filter(user=self.request.user).order_by("-id")
+        return super().get_serializer(*args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, or 304 if the client copy is current."""
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         """
@@ -99,6 +310,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        elif self.action == "bulk":
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
@@ -121,13 +334,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         """
         recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
 
-        if serializer.is_valid():
-            serializer.save()  # Safe to db.
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        # Stream the file to its final directory with early size checks,
+        # if storage is local. Must be set before request.data is read.
+        storage = Recipe._meta.get_field("image").storage
+        directory = RecipeImageUploadHandler.staging_dir(storage)
+        handler = None
+        if directory:
+            handler = RecipeImageUploadHandler(request, directory)
+            request.upload_handlers = [handler]
+
+        try:
+            serializer = self.get_serializer(recipe, data=request.data)
+
+            if serializer.is_valid():
+                # Safe to db. Derivatives of a previous image no longer apply.  # noqa
+                previous = recipe.image_derivatives
+                serializer.save(image_derivatives={})
+                images.delete_derivatives_on_commit(storage, previous)
+                # Resizing runs in the background, the request doesn't wait.
+                images.enqueue_derivatives(recipe.id)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)  # noqa
+        finally:
+            if handler is not None:
+                handler.cleanup()
+
+    @extend_schema(
+        methods=["GET"],
+        description=(
+            'Export the recipes as NDJSON, one recipe per line. '
+            'The list filters apply.'
+        ),
+        parameters=[
+            OpenApiParameter('tags', OpenApiTypes.STR),
+            OpenApiParameter('ingredients', OpenApiTypes.STR),
+            OpenApiParameter('search', OpenApiTypes.STR),
+        ],
+        responses={
+            (200, NDJSONRenderer.media_type): serializers.RecipeBulkSerializer,  # noqa
+        },
+    )
+    @extend_schema(
+        methods=["POST"],
+        description=(
+            'Import recipes from NDJSON or a JSON array. '
+            'Nothing is created if any recipe is invalid. '
+            'Bodies over the import limits get a 413.'
+        ),
+        request={
+            'application/json': serializers.RecipeBulkSerializer(many=True),
+            ImportNDJSONParser.media_type: serializers.RecipeBulkSerializer,
+        },
+        responses={
+            201: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+            413: OpenApiTypes.OBJECT,
+        },
+    )
+    @action(
+        methods=["GET", "POST"],
+        detail=False,
+        parser_classes=[ImportJSONParser, ImportNDJSONParser],
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer],  # noqa
+    )
+    def bulk(self, request):
+        """
+        Export (GET) or import (POST) a whole recipe library.
+        Exports stream, so they are never cached nor paginated.
+        """
+        if request.method == "GET":
+            response = StreamingHttpResponse(
+                export_recipes(self.filter_queryset(self.get_queryset())),
+                content_type=NDJSONRenderer.media_type,
+            )
+            response["Content-Disposition"] = (
+                'attachment; filename="recipes.ndjson"'
+            )
+            return response
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(request.data, list):
+            raise ValidationError(
+                {"non_field_errors": [_("Expected a list of recipes.")]}
+            )
+        created, errors = import_recipes(
+            request.user, request.data, self.get_serializer_context()
+        )
+        if errors:
+            return Response(
+                {"errors": errors}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({"created": created}, status=status.HTTP_201_CREATED)
 
 
 @extend_schema_view(
@@ -137,11 +436,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.'
-            )
+            ),
+            OpenApiParameter(
+                'with_counts',
+                OpenApiTypes.INT, enum=[0, 1],
+                description=(
+                    'Add recipe_count, the number of recipes '
+                    'using each item.'
+                ),
+            ),
         ]
     )
 )
 class BaseRecipeAttrViewSet(
+    ReplicaReadMixin,
+    CachedListMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
     mixins.DestroyModelMixin,
@@ -149,22 +460,142 @@ class BaseRecipeAttrViewSet(
 ):
     """Base viewset for the recipe attributes."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    # Name of the Recipe many to many field, i.e: "tags"
+    recipe_relation = None
+    # Values serializer of lists with ?with_counts=1.
+    count_values_serializer_class = None
+
+    # Accepted values of flag query params.
+    FLAG_VALUES = {"0": False, "1": True, "false": False, "true": True}
+
+    def _param_to_bool(self, param):
+        """Parse a 0/1 (or false/true) query param, False if not sent."""
+        value = self.request.query_params.get(param, "0")
+        try:
+            return self.FLAG_VALUES[value.strip().lower()]
+        except KeyError:
+            raise ValidationError(
+                {param: [_('Expected 0, 1, false or true.')]}
+            )
+
+    def _with_counts(self):
+        """Whether the list was asked with recipe counts."""
+        return self.action == "list" and self._param_to_bool('with_counts')
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
+        assigned_only = self._param_to_bool('assigned_only')
         queryset = self.queryset
+        through = getattr(Recipe, self.recipe_relation).through
+        field = f"{queryset.model._meta.model_name}_id"
+        links = through.objects.filter(**{field: OuterRef("pk")})
 
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # WHERE EXISTS on the through table, so no DISTINCT is needed.
+            queryset = queryset.filter(Exists(links))
+
+        if self._with_counts():
+            # count(*) of the links of each item, in the same query: an
+            # index only scan of the through table item_id index per
+            # item, run after the LIMIT of a page. A LEFT JOIN ... GROUP
+            # BY reads all the user's links (or, misestimated, the whole
+            # through table) before the first row.
+            counts = links.order_by().values(field).annotate(
+                count=Count("*")
+            )
+            queryset = queryset.annotate(
+                recipe_count=Coalesce(Subquery(counts.values("count")), 0)
+            )
 
         return queryset.filter(
             user=self.request.user
-        ).order_by("-name").distinct()
+        ).order_by("-name", "-id")
+
+    def get_values_serializer(self, *args, **kwargs):
+        if self._with_counts():
+            return self.count_values_serializer_class(*args, **kwargs)
+        return super().get_values_serializer(*args, **kwargs)
+
+    def perform_update(self, serializer):
+        """
+        Update the tag/ingredient.
+        Names are unique per user, renaming to a name
+        that is already taken is a bad request.
+        """
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError(
+                {"name": [_("You already have an item with this name.")]}
+            )
+
+    @extend_schema(
+        methods=["PATCH"],
+        description="Rename many items at once, all or nothing.",
+        request=serializers.RecipeAttrItemListSerializer,
+        responses=serializers.RecipeAttrItemListSerializer,
+    )
+    @extend_schema(
+        methods=["DELETE"],
+        description=(
+            "Delete many items at once, "
+            "and remove them from their recipes. "
+            'Body: {"ids": [...]}.'
+        ),
+        request=serializers.RecipeAttrIdsSerializer,
+        responses={204: None},
+    )
+    @action(methods=["PATCH", "DELETE"], detail=False, pagination_class=None)
+    def bulk(self, request):
+        """Rename (PATCH) or delete (DELETE) many items by id."""
+        model = self.queryset.model
+        if request.method == "DELETE":
+            serializer = serializers.RecipeAttrIdsSerializer(
+                data=request.data
+            )
+            serializer.is_valid(raise_exception=True)
+            delete_attrs(
+                model, request.user, serializer.validated_data["ids"]
+            )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = serializers.RecipeAttrItemListSerializer(
+            data=request.data
+        )
+        serializer.is_valid(raise_exception=True)
+        objs = rename_attrs(
+            model,
+            request.user,
+            {item["id"]: item["name"] for item in serializer.validated_data},  # noqa
+        )
+        return Response(
+            serializers.RecipeAttrItemListSerializer(objs).data
+        )
+
+    @extend_schema(
+        description=(
+            "Merge items (ids) into another one (target): their recipes "
+            "are linked to the target instead and they are deleted."
+        ),
+        request=serializers.RecipeAttrMergeSerializer,
+        responses=serializers.RecipeAttrItemSerializer,
+    )
+    @action(methods=["POST"], detail=False)
+    def merge(self, request):
+        """Merge duplicates, i.e: "salt " into "Salt"."""
+        serializer = serializers.RecipeAttrMergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = merge_attrs(
+            self.queryset.model,
+            request.user,
+            serializer.validated_data["ids"],
+            serializer.validated_data["target"],
+        )
+        return Response(serializers.RecipeAttrItemSerializer(target).data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -175,11 +606,30 @@ class TagViewSet(BaseRecipeAttrViewSet):
     """
 
     serializer_class = serializers.TagSerializer
+    values_serializer_class = serializers.TagValuesSerializer
+    count_values_serializer_class = serializers.TagCountValuesSerializer
     queryset = Tag.objects.all()
+    recipe_relation = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Viewset for Ingredients. Manage Ingredients in the database."""
 
     serializer_class = serializers.IngredientSerializer
+    values_serializer_class = serializers.IngredientValuesSerializer
+    count_values_serializer_class = (
+        serializers.IngredientCountValuesSerializer
+    )
     queryset = Ingredient.objects.all()
+    recipe_relation = "ingredients"
+
+
+class CacheStatsView(APIView):
+    """Hit, miss and eviction counters of the list response cache."""
+
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Return the counters of this process."""
+        return Response(cache_stats.as_dict())
@@ -0,0 +1,228 @@
+"""
+Tests for password hashing, login caching and rate limits of the token API.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashers
+from core.authentication import LoginCache, login_cache
+from user.throttles import LoginRateThrottle
+
+
+TOKEN_URL = reverse("user:token")
+CREDENTIALS = {"email": "user@example.com", "password": "testpass123"}
+
+
+class LoginTestCase(TestCase):
+    """Start each test without login attempts or recent logins."""
+
+    def setUp(self):
+        caches["throttle"].clear()
+        caches["default"].clear()
+        self.user = get_user_model().objects.create_user(**CREDENTIALS)
+        self.client = APIClient()
+
+    def login(self, **credentials):
+        return self.client.post(TOKEN_URL, {**CREDENTIALS, **credentials})
+
+
+class PasswordHasherTests(LoginTestCase):
+    """Test hashing and rehashing passwords on login."""
+
+    def test_new_passwords_use_argon2(self):
+        """Test passwords are hashed with the configured hasher."""
+        self.assertTrue(self.user.password.startswith("argon2$"))
+        self.assertIn(
+            f"m={hashers.Argon2PasswordHasher.memory_cost},",
+            self.user.password,
+        )
+
+    def test_rehash_other_hasher_on_login(self):
+        """Test PBKDF2 hashes are replaced on the next login."""
+        self.user.password = make_password(
+            CREDENTIALS["password"], hasher="pbkdf2_sha256"
+        )
+        self.user.save()
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+        self.assertTrue(self.user.check_password(CREDENTIALS["password"]))
+
+    def test_rehash_other_costs_on_login(self):
+        """Test hashes made with other costs are replaced on login."""
+        old_hash = self.user.password
+
+        with patch.object(hashers.Argon2PasswordHasher, "time_cost", 3):
+            self.login()
+
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.password, old_hash)
+        self.assertIn("t=3,", self.user.password)
+
+    def test_failed_login_no_rehash(self):
+        """Test a wrong password doesn't change the hash."""
+        self.user.password = make_password("testpass123", hasher="pbkdf2_sha256")  # noqa
+        self.user.save()
+
+        res = self.login(password="wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+
+@patch("user.serializers.authenticate", wraps=authenticate)
+class LoginCacheTests(LoginTestCase):
+    """Test logging in again without hashing the password."""
+
+    def test_repeated_login_not_hashed(self, patched_authenticate):
+        """Test logging in again returns the token without hashing."""
+        token = self.login().data["token"]
+
+        with self.assertNumQueries(1):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["token"], token)
+        self.assertEqual(patched_authenticate.call_count, 1)
+
+    def test_wrong_password_checked(self, patched_authenticate):
+        """Test other passwords are checked, and rejected."""
+        self.login()
+
+        res = self.login(password="wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(patched_authenticate.call_count, 2)
+
+    def test_password_change_clears_login(self, patched_authenticate):
+        """Test the old password needs checking after a change."""
+        self.login()
+
+        self.user.set_password("newpass123")
+        self.user.save()
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_password_changed_by_other_process(self, patched_authenticate):
+        """Test a new password fails logins cached before, unsignalled."""
+        self.login()
+
+        # No signal, as if saved by another process.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=make_password("newpass123")
+        )
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(patched_authenticate.call_count, 2)
+
+        res = self.login(password="newpass123")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_email_changed(self, patched_authenticate):
+        """Test the old email needs checking after a change."""
+        self.login()
+
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            email="new@example.com"
+        )
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(patched_authenticate.call_count, 2)
+
+    def test_shared_between_processes(self, patched_authenticate):
+        """Test logins are kept in the shared cache, HMACs only."""
+        token = self.login().data["token"]
+
+        # Another process has its own LoginCache, over the same cache.
+        with patch("user.views.login_cache", LoginCache()):
+            res = self.login()
+
+        self.assertEqual(res.data["token"], token)
+        self.assertEqual(patched_authenticate.call_count, 1)
+        user_id, digest = login_cache.get(CREDENTIALS["email"])
+        self.assertEqual(user_id, self.user.pk)
+        self.assertNotIn(CREDENTIALS["password"], digest)
+
+    def test_deleted_token_checked(self, patched_authenticate):
+        """Test a new token is only created after checking the password."""
+        token = self.login().data["token"]
+        self.user.auth_token.delete()
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["token"], token)
+        self.assertEqual(patched_authenticate.call_count, 2)
+
+    def test_inactive_user_rejected(self, patched_authenticate):
+        """Test deactivated users can't log in again."""
+        self.login()
+
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False
+        )
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@patch.dict(
+    LoginRateThrottle.THROTTLE_RATES, login_ip="5/min", login_email="3/min"
+)
+@patch("user.serializers.authenticate", wraps=authenticate)
+class LoginRateLimitTests(LoginTestCase):
+    """Test rate limits of login attempts."""
+
+    def test_email_rate_limit(self, patched_authenticate):
+        """Test attempts on one email are limited, before hashing."""
+        for _ in range(3):
+            self.login(password="wrong")
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", res)
+        self.assertEqual(patched_authenticate.call_count, 3)
+
+        res = self.login(email="other@example.com")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_email_rate_limit_ignores_case(self, patched_authenticate):
+        """Test changing the case of the email doesn't reset the limit."""
+        for email in ("user@example.com", "USER@example.com", " User@example.com"):  # noqa
+            self.login(email=email, password="wrong")
+
+        res = self.login(email="uSeR@example.com")
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_ip_rate_limit(self, patched_authenticate):
+        """Test attempts from one IP are limited, whatever the email."""
+        for i in range(5):
+            self.login(email=f"user{i}@example.com")
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.client.defaults["REMOTE_ADDR"] = "10.0.0.2"
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -3,11 +3,14 @@ Tests for the user API.
 """
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.testing import QueryAssertionsMixin
+
 
 # 'create' is the name of the url to call
 CREATE_USER_URL = reverse("user:create")
@@ -20,12 +23,15 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
-class PublicUserApiTests(TestCase):
+class PublicUserApiTests(QueryAssertionsMixin, TestCase):
     """Test the public features of the user API."""
 
     def setUp(self):
         # Set up the API test client to simulate requests in test cases
         self.client = APIClient()
+        # Login attempts and recent logins of previous tests.
+        caches["throttle"].clear()
+        caches["default"].clear()
 
     def test_create_user_success(self):
         """Test creating a user is successful."""
@@ -35,7 +41,8 @@ class PublicUserApiTests(TestCase):
             "name": "Test Name",
         }
         # Create an user with the payload information.
-        res = self.client.post(CREATE_USER_URL, payload)
+        with self.assertMaxQueries(2):
+            res = self.client.post(CREATE_USER_URL, payload)
         # Test res success code
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
@@ -53,7 +60,8 @@ class PublicUserApiTests(TestCase):
         }
         # This is equivalent to: `create_user(email='test@example.com', password='testpass123', name='Test Name')`  # noqa
         create_user(**payload)
-        res = self.client.post(CREATE_USER_URL, payload)
+        with self.assertMaxQueries(1):
+            res = self.client.post(CREATE_USER_URL, payload)
 
         # Checks we get a bad request, because this is the expected behavior.  # noqa
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -87,7 +95,8 @@ class PublicUserApiTests(TestCase):
             "email": user_details["email"],
             "password": user_details["password"],
         }
-        res = self.client.post(TOKEN_URL, payload)
+        with self.assertMaxQueries(5):
+            res = self.client.post(TOKEN_URL, payload)
 
         self.assertIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -97,7 +106,8 @@ class PublicUserApiTests(TestCase):
         create_user(email="test@example.com", password="goodpass")
 
         payload = {"email": "test@example.com", "password": "badpass"}
-        res = self.client.post(TOKEN_URL, payload)
+        with self.assertMaxQueries(1):
+            res = self.client.post(TOKEN_URL, payload)
 
         self.assertNotIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -120,7 +130,7 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateApiUserTests(TestCase):
+class PrivateApiUserTests(QueryAssertionsMixin, TestCase):
     """Test API requests that require authentication."""
 
     def setUp(self):
@@ -133,7 +143,8 @@ class PrivateApiUserTests(TestCase):
     def test_retrieve_profile_success(self):
         """Test retrieving profile for logged in user."""
         # The user is already authenticated in setUp
-        res = self.client.get(ME_URL)
+        with self.assertMaxQueries(0):
+            res = self.client.get(ME_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(
@@ -154,7 +165,8 @@ class PrivateApiUserTests(TestCase):
 
         payload = {"name": "Updated name", "password": "newpassword123"}
 
-        res = self.client.patch(ME_URL, payload)
+        with self.assertMaxQueries(2):
+            res = self.client.patch(ME_URL, payload)
 
         # First refresh user object to have the latest data.
         self.user.refresh_from_db()
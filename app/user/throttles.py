@@ -0,0 +1,49 @@
+"""
+Rate limits of the login (token) API.
+
+Every login attempt hashes a password, even for unknown emails (the
+auth backend hashes anyway so timing doesn't tell them apart). Limits
+per client IP and per email reject storms before any hashing, so they
+can't take all the workers. Attempts are counted in the "throttle"
+cache, which the processes serving the app share (core/checks.py).
+"""
+import hashlib
+
+from django.core.cache import caches
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    """Count login attempts in the throttle cache."""
+
+    cache = caches["throttle"]
+
+
+class LoginIPRateThrottle(LoginRateThrottle):
+    """Login attempts per client IP, see NUM_PROXIES behind proxies."""
+
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class LoginEmailRateThrottle(LoginRateThrottle):
+    """Login attempts per email, from any IP."""
+
+    scope = "login_email"
+
+    def get_cache_key(self, request, view):
+        data = request.data if hasattr(request.data, "get") else {}
+        email = data.get("email")
+        if not isinstance(email, str) or not email.strip():
+            # Rejected by the serializer, without hashing.
+            return None
+
+        # Emails aren't valid cache keys for every backend.
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
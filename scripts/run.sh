@@ -0,0 +1,11 @@
+#!/bin/sh
+# Production entry point: prepare the database and static files, then
+# serve with gunicorn (settings in app/gunicorn.conf.py).
+
+set -e
+
+python manage.py wait_for_db
+python manage.py collectstatic --noinput
+python manage.py migrate
+
+exec gunicorn --config gunicorn.conf.py